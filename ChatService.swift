@@ -11,6 +11,9 @@ class ChatService: ObservableObject {
     // CHANGE THIS URL TO YOUR SERVER'S ADDRESS
     private let baseURL = "http://192.168.1.123:5000"  // Use YOUR actual IP
     
+    // Keeps this device's signup separate from everyone else's on the server
+    private var sessionID: String?
+    
     struct ChatRequest: Codable {
         let message: String
     }
@@ -18,6 +21,7 @@ class ChatService: ObservableObject {
     struct ChatResponse: Codable {
         let response: String
         let action: String? // Optional - only present when signup is complete
+        let session_id: String?
     }
     
     func sendMessage(_ message: String) async throws -> ChatResponse {
@@ -28,6 +32,9 @@ class ChatService: ObservableObject {
         var request = URLRequest(url: url)
         request.httpMethod = "POST"
         request.setValue("application/json", forHTTPHeaderField: "Content-Type")
+        if let sessionID = sessionID {
+            request.setValue(sessionID, forHTTPHeaderField: "X-Session-ID")
+        }
         
         let chatRequest = ChatRequest(message: message)
         request.httpBody = try JSONEncoder().encode(chatRequest)
@@ -43,14 +50,83 @@ class ChatService: ObservableObject {
         }
         
         let chatResponse = try JSONDecoder().decode(ChatResponse.self, from: data)
+        sessionID = chatResponse.session_id ?? sessionID
         return chatResponse
     }
+    
+    /// Same as sendMessage, but calls onToken as Glow types. Returns the final
+    /// response (with the launch_app action) once the server's "done" event arrives.
+    func streamMessage(_ message: String, onToken: @escaping (String) -> Void) async throws -> ChatResponse {
+        guard let url = URL(string: "\(baseURL)/chat/stream") else {
+            throw ChatError.invalidURL
+        }
+        
+        var request = URLRequest(url: url)
+        request.httpMethod = "POST"
+        request.setValue("application/json", forHTTPHeaderField: "Content-Type")
+        request.setValue("text/event-stream", forHTTPHeaderField: "Accept")
+        if let sessionID = sessionID {
+            request.setValue(sessionID, forHTTPHeaderField: "X-Session-ID")
+        }
+        
+        let chatRequest = ChatRequest(message: message)
+        request.httpBody = try JSONEncoder().encode(chatRequest)
+        
+        let (bytes, response) = try await URLSession.shared.bytes(for: request)
+        
+        guard let httpResponse = response as? HTTPURLResponse else {
+            throw ChatError.invalidResponse
+        }
+        
+        guard httpResponse.statusCode == 200 else {
+            throw ChatError.serverError(httpResponse.statusCode)
+        }
+        
+        struct TokenEvent: Codable {
+            let token: String
+        }
+        
+        struct ErrorEvent: Codable {
+            let error: String
+            let session_id: String?
+        }
+        
+        // Each event is an optional "event:" line, then its "data:" line
+        var event: String?
+        for try await line in bytes.lines {
+            if line.isEmpty {
+                event = nil  // End of an event
+            } else if line.hasPrefix("event: ") {
+                event = String(line.dropFirst("event: ".count))
+            } else if line.hasPrefix("data: ") {
+                let data = Data(line.dropFirst("data: ".count).utf8)
+                switch event {
+                case "done":
+                    let chatResponse = try JSONDecoder().decode(ChatResponse.self, from: data)
+                    sessionID = chatResponse.session_id ?? sessionID
+                    return chatResponse
+                case "error":
+                    // e.g. the chat was updated from another request - the same body as /chat's 409
+                    let errorEvent = try JSONDecoder().decode(ErrorEvent.self, from: data)
+                    sessionID = errorEvent.session_id ?? sessionID
+                    throw ChatError.streamError(errorEvent.error)
+                default:
+                    let tokenEvent = try JSONDecoder().decode(TokenEvent.self, from: data)
+                    onToken(tokenEvent.token)
+                }
+                event = nil
+            }
+        }
+        
+        throw ChatError.invalidResponse
+    }
 }
 
 enum ChatError: Error, LocalizedError {
     case invalidURL
     case invalidResponse
     case serverError(Int)
+    case streamError(String)  // An "event: error" from /chat/stream, with the server's message
     case networkError
     
     var errorDescription: String? {
@@ -61,6 +137,8 @@ enum ChatError: Error, LocalizedError {
             return "Invalid response from server"
         case .serverError(let code):
             return "Server error: \(code)"
+        case .streamError(let message):
+            return message
         case .networkError:
             return "Network connection error"
         }
@@ -0,0 +1,169 @@
+# ann_index.py - Approximate nearest-neighbour search for large profile sets
+import json
+import os
+import time
+
+import numpy as np
+
+from embedding_codec import normalize_rows
+
+ASSIGN_CHUNK = 16384  # Rows scored against the centroids at a time
+
+
+class IVFIndex:
+    """Inverted-file index over unit-length vectors (cosine similarity).
+
+    Vectors are clustered by spherical k-means into `nlist` cells. A query
+    is compared against the cell centroids and only the `nprobe` closest
+    cells are scanned exactly, so search cost is roughly nprobe / nlist of a
+    brute-force scan. Raise nprobe for recall, lower it for speed - see
+    recall_at_k() to measure the trade-off.
+
+    Each cell's vectors are stored contiguously, as one (ids, vectors)
+    tuple that add() replaces whole. Saved indexes are plain .npy files that
+    load memory-mapped, and add() works after loading.
+    """
+
+    def __init__(self, centroids, nprobe=16):
+        self.centroids = np.ascontiguousarray(centroids, dtype=np.float32)
+        self.nprobe = nprobe
+        nlist, dim = self.centroids.shape
+        self._cells = [(np.empty(0, dtype=np.int64), np.empty((0, dim), dtype=np.float32)) for _ in range(nlist)]
+
+    @property
+    def nlist(self):
+        return self.centroids.shape[0]
+
+    @property
+    def dim(self):
+        return self.centroids.shape[1]
+
+    def __len__(self):
+        return sum(len(ids) for ids, _ in self._cells)
+
+    def ids(self):
+        """Every indexed id (in cell order)"""
+        return np.concatenate([np.empty(0, dtype=np.int64)] + [ids for ids, _ in self._cells])
+
+    @classmethod
+    def train(cls, vectors, nlist=None, iterations=15, sample_size=None, nprobe=16, seed=0):
+        """Learn cell centroids from (a sample of) unit-length vectors.
+
+        nlist defaults to ~sqrt(n), the usual balance between centroid
+        comparisons and cell scans.
+        """
+        rng = np.random.default_rng(seed)
+        n = len(vectors)
+        nlist = min(nlist or max(1, int(np.sqrt(n))), n)
+        sample_size = min(n, sample_size or nlist * 64)
+        sample = vectors[np.sort(rng.choice(n, sample_size, replace=False))].astype(np.float32)
+
+        centroids = sample[rng.choice(sample_size, nlist, replace=False)]
+        for _ in range(iterations):
+            assignment = cls._nearest(sample, centroids)
+            order = np.argsort(assignment, kind='stable')
+            cells, starts = np.unique(assignment[order], return_index=True)
+            sums = np.zeros_like(centroids)
+            sums[cells] = np.add.reduceat(sample[order], starts, axis=0)
+            # Re-seed empty cells from random points so no centroid is wasted
+            empty = np.ones(nlist, dtype=bool)
+            empty[cells] = False
+            sums[empty] = sample[rng.choice(sample_size, int(empty.sum()), replace=False)]
+            centroids = normalize_rows(sums).astype(np.float32)
+
+        return cls(centroids, nprobe=nprobe)
+
+    @staticmethod
+    def _nearest(vectors, centroids):
+        """Index of the most similar centroid for each row"""
+        assignment = np.empty(len(vectors), dtype=np.int64)
+        for start in range(0, len(vectors), ASSIGN_CHUNK):
+            block = vectors[start:start + ASSIGN_CHUNK]
+            assignment[start:start + ASSIGN_CHUNK] = np.argmax(block @ centroids.T, axis=1)
+        return assignment
+
+    def add(self, ids, vectors):
+        """Insert unit-length vectors; only the cells they land in are touched"""
+        if not len(ids):
+            return
+        ids = np.asarray(ids, dtype=np.int64)
+        vectors = np.asarray(vectors, dtype=np.float32)
+        assignment = self._nearest(vectors, self.centroids)
+        order = np.argsort(assignment, kind='stable')
+        cells, starts = np.unique(assignment[order], return_index=True)
+        for cell, rows in zip(cells, np.split(order, starts[1:])):
+            # One assignment swaps ids and vectors together, so a concurrent
+            # search reads the old cell or the new one, never a mix
+            cell_ids, cell_vectors = self._cells[cell]
+            self._cells[cell] = (np.concatenate([cell_ids, ids[rows]]),
+                                 np.concatenate([cell_vectors, vectors[rows]]))
+
+    def search(self, query, k, nprobe=None):
+        """(ids, scores) of the approximate top-k for a unit-length query, best first"""
+        nprobe = min(nprobe or self.nprobe, self.nlist)
+        centroid_scores = self.centroids @ query
+        probe = np.argpartition(centroid_scores, -nprobe)[-nprobe:]
+
+        candidate_ids, candidate_scores = [], []
+        for cell in probe:
+            cell_ids, cell_vectors = self._cells[cell]  # One read: ids and vectors of the same version
+            if not len(cell_ids):
+                continue
+            scores = cell_vectors @ query
+            if len(scores) > k:
+                keep = np.argpartition(scores, -k)[-k:]
+                cell_ids, scores = cell_ids[keep], scores[keep]
+            candidate_ids.append(cell_ids)
+            candidate_scores.append(scores)
+
+        if not candidate_ids:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        ids = np.concatenate(candidate_ids)
+        scores = np.concatenate(candidate_scores)
+        k = min(k, len(scores))
+        top = np.argpartition(scores, -k)[-k:]
+        top = top[np.argsort(-scores[top])]
+        return ids[top], scores[top]
+
+    def save(self, path):
+        """Write the index as a directory of .npy files"""
+        os.makedirs(path, exist_ok=True)
+        cells = list(self._cells)  # A consistent snapshot if add() runs meanwhile
+        arrays = {
+            'centroids.npy': self.centroids,
+            'cell_sizes.npy': np.array([len(ids) for ids, _ in cells], dtype=np.int64),
+            'ids.npy': np.concatenate([ids for ids, _ in cells]),
+            'vectors.npy': np.concatenate([vectors for _, vectors in cells])
+        }
+        # Write-then-rename: an index loaded from these files may still be
+        # memory-mapping them, and truncating a mapped file corrupts it
+        for name, array in arrays.items():
+            with open(os.path.join(path, name + '.tmp'), 'wb') as f:
+                np.save(f, array)
+            os.replace(os.path.join(path, name + '.tmp'), os.path.join(path, name))
+        with open(os.path.join(path, 'meta.json'), 'w') as f:
+            json.dump({"nprobe": self.nprobe, "saved_at": time.time()}, f)
+
+    @classmethod
+    def load(cls, path, mmap=True):
+        """Load a saved index; with mmap the cell data stays on disk until used"""
+        mode = 'r' if mmap else None
+        with open(os.path.join(path, 'meta.json')) as f:
+            meta = json.load(f)
+        index = cls(np.load(os.path.join(path, 'centroids.npy')), nprobe=meta["nprobe"])
+        bounds = np.cumsum(np.load(os.path.join(path, 'cell_sizes.npy')))[:-1]
+        ids = np.split(np.load(os.path.join(path, 'ids.npy'), mmap_mode=mode), bounds)
+        vectors = np.split(np.load(os.path.join(path, 'vectors.npy'), mmap_mode=mode), bounds)
+        index._cells = list(zip(ids, vectors))
+        return index
+
+
+def recall_at_k(index, ids, vectors, queries, k=10, nprobe=None):
+    """Share of the exact top-k (by brute force over vectors) that the index
+    also returns, averaged over the queries"""
+    hits = 0
+    for query in queries:
+        exact = ids[np.argpartition(vectors @ query, -k)[-k:]]
+        approximate, _ = index.search(query, k, nprobe=nprobe)
+        hits += len(np.intersect1d(exact, approximate))
+    return hits / (k * len(queries))
@@ -1,35 +1,172 @@
 # app.py - Your Flask app
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify, stream_with_context
 from glowBrain import GlowAgent
-from embedding_service import matcher
+from availability_index import get_availability_index
+from conversation_memory import count_tokens
+from database import get_engine
+from embedding_service import get_matcher
+from glow_logging import configure_logging, get_logger
+from session_pool import GlowSessionPool
+from session_store import SessionConflict, make_session_store
+from contextlib import closing
+import metrics
+import json
 import os
+import socket
+import threading
+import time
+import uuid
 from dotenv import load_dotenv
 
 # Load environment variables FIRST
 load_dotenv()
+configure_logging()
+log = get_logger(__name__)
 
 app = Flask(__name__)
 
-# Create Glow (only once when app starts)
-glow = GlowAgent(openai_api_key=os.getenv("OPENAI_API_KEY"))
+# Nothing slow happens at import: the DB, the matcher and the LLM clients are
+# all built on first use, and start_warm_up() builds them in the background
+# once the server is listening.
+WARM_UP_STEPS = (
+    ("database", get_engine),
+    ("availability_index", lambda: get_availability_index().warm()),
+    ("matcher", get_matcher),
+    ("agent", lambda: GlowAgent(openai_api_key=os.getenv("OPENAI_API_KEY"))),
+    ("tokenizer", lambda: count_tokens("warm up")),
+)
+
+def warm_up():
+    """Build what a first request would otherwise wait for. Steps that fail
+    (e.g. no network) are logged and left to be retried on first use."""
+    for name, step in WARM_UP_STEPS:
+        start = time.perf_counter()
+        try:
+            step()
+            log.info("warm_up_step", step=name, seconds=round(time.perf_counter() - start, 3))
+        except Exception:
+            log.exception("warm_up_failed", step=name)
+
+def _wait_for_port(port, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=0.5).close()
+            return
+        except OSError:
+            time.sleep(0.1)
+
+def start_warm_up(port=None):
+    """warm_up() in a background thread - after `port` accepts connections,
+    if given. GLOW_WARM_UP=0 turns it off."""
+    if os.getenv("GLOW_WARM_UP", "1").lower() in ("0", "false", "no", "off"):
+        return
+    
+    def run():
+        if port:
+            _wait_for_port(port)
+        warm_up()
+    
+    threading.Thread(target=run, name="warm-up", daemon=True).start()
+
+SESSION_HEADER = "X-Session-ID"
+SESSION_COOKIE = "glow_session"
+
+SESSION_TTL = int(os.getenv("GLOW_SESSION_TTL", 1800))
+
+# One Glow per chat session, so every signup has its own state and memory.
+# Set GLOW_SESSION_STORE=sqlite when running more than one worker process.
+sessions = GlowSessionPool(
+    agent_factory=lambda: GlowAgent(openai_api_key=os.getenv("OPENAI_API_KEY")),
+    store=make_session_store(ttl=SESSION_TTL),
+    max_sessions=int(os.getenv("GLOW_MAX_SESSIONS", 1000)),
+    idle_ttl=SESSION_TTL
+)
+
+CONFLICT_MESSAGE = "This chat was updated from somewhere else - please send that again"
+
+
+def get_session_id():
+    """Session id from the header (native app) or cookie (web), else a new one"""
+    session_id = request.headers.get(SESSION_HEADER) or request.cookies.get(SESSION_COOKIE)
+    if not session_id or len(session_id) > 128:
+        session_id = uuid.uuid4().hex
+    return session_id
 
 @app.route('/')
 def health_check():
     return "Glow is running! 🌟", 200
 
+def chat_payload(glow_response, session_id):
+    """JSON body for a finished chat turn (shared by /chat and /chat/stream)"""
+    payload = {"response": glow_response, "session_id": session_id}
+
+    # Check if signup is complete
+    if "launching the app" in glow_response.lower():
+        payload["action"] = "launch_app"  # Tell your frontend to switch to contentview
+        sessions.discard(session_id)
+
+    return payload
+
+def attach_session(response, session_id):
+    response.headers[SESSION_HEADER] = session_id
+    response.set_cookie(SESSION_COOKIE, session_id, httponly=True, samesite="Lax")
+    return response
+
+def sse_event(data, event=None):
+    """Format one server-sent event"""
+    message = f"event: {event}\n" if event else ""
+    return message + f"data: {json.dumps(data)}\n\n"
+
 @app.route('/chat', methods=['POST'])
 def chat_with_glow():
     user_message = request.json.get('message')
-    glow_response = glow.chat(user_message)
-    
-    # Check if signup is complete
-    if "launching the app" in glow_response.lower():
-        return jsonify({
-            "response": glow_response,
-            "action": "launch_app"  # Tell your frontend to switch to contentview
-        })
-    
-    return jsonify({"response": glow_response})
+    session_id = get_session_id()
+
+    try:
+        with sessions.session(session_id) as glow:
+            glow_response = glow.chat(user_message)
+    except SessionConflict:
+        log.warning("session_conflict", session_id=session_id)
+        return attach_session(jsonify({"error": CONFLICT_MESSAGE, "session_id": session_id}), session_id), 409
+
+    return attach_session(jsonify(chat_payload(glow_response, session_id)), session_id)
+
+@app.route('/chat/stream', methods=['POST'])
+def stream_chat_with_glow():
+    """Same as /chat, but streams Glow's reply token by token as SSE.
+
+    Sends `data: {"token": ...}` events while the reply is generated, then a
+    final `event: done` whose data is exactly the /chat JSON body. If the
+    session was changed concurrently by another request the stream ends with
+    `event: error` instead (the /chat 409 body).
+    """
+    user_message = request.json.get('message')
+    session_id = get_session_id()
+
+    def generate():
+        glow_response = None
+        try:
+            # closing() finishes the turn before the session is saved, even if
+            # the client hangs up mid-stream
+            with sessions.session(session_id) as glow, closing(glow.stream_chat(user_message)) as turn:
+                for kind, text in turn:
+                    if kind == "token":
+                        yield sse_event({"token": text})
+                    else:
+                        glow_response = text
+        except SessionConflict:
+            log.warning("session_conflict", session_id=session_id)
+            yield sse_event({"error": CONFLICT_MESSAGE, "session_id": session_id}, event="error")
+            return
+        # Only after the session is saved, so the client's next turn sees this one
+        if glow_response is not None:
+            yield sse_event(chat_payload(glow_response, session_id), event="done")
+
+    response = Response(stream_with_context(generate()), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'  # Don't let proxies buffer the stream
+    return attach_session(response, session_id)
 
 @app.route('/api/dating-matches', methods=['POST'])
 def get_dating_matches():
@@ -40,17 +177,100 @@ def get_dating_matches():
             return jsonify({"error": "No vent text provided"}), 400
         
         # Get matches using vector similarity
-        matches = matcher.find_matches(vent_text)
+        matches = get_matcher().find_matches(vent_text)
         
         return jsonify({
             "matches": matches,
             "message": "Found your perfect matches based on your vibe! ✨"
         })
     
-    except Exception as e:
-        print(f"Dating matches error: {e}")
+    except Exception:
+        log.exception("dating_matches_error")
         return jsonify({"error": "Failed to find matches"}), 500
 
+class InvalidVentText(ValueError):
+    """A batch line that isn't a vent text; index is its position in the batch"""
+
+    def __init__(self, index, message):
+        super().__init__(message)
+        self.index = index
+
+def _ndjson_vent_texts(invalid):
+    """Vent texts of an NDJSON batch body (one JSON string or {"vent_text": ...}
+    per line), read line by line, so a huge upload is never held in memory at
+    once. An object without a vent_text counts as a blank text.
+
+    A bad line ends the batch: it is yielded as None (no text) and its
+    InvalidVentText goes into `invalid`. The matcher reads a chunk ahead, so
+    raising instead would cost the lines before it their results."""
+    index = 0
+    for line in request.stream:
+        if not line.strip():
+            continue
+        try:
+            item = json.loads(line)
+        except ValueError:
+            invalid.append(InvalidVentText(index, "line is not valid JSON"))
+            yield None
+            return
+        text = item.get('vent_text') or '' if isinstance(item, dict) else item
+        if not isinstance(text, str):
+            invalid.append(InvalidVentText(index, "each line must be a JSON string or an object with a string vent_text"))
+            yield None
+            return
+        yield text
+        index += 1
+
+@app.route('/api/dating-matches/batch', methods=['POST'])
+def get_dating_matches_batch():
+    """Matches for many vent texts in one call, streamed back as NDJSON: one
+    {"index": i, "matches": [...]} line per text, in order. A failure stops
+    the stream with an {"index": i, "error": ...} line. Blank texts get no
+    matches; a JSON body that isn't {"vent_texts": [strings]} is a 400, and
+    so is an NDJSON line that isn't a vent text - as the error line, once
+    every line before it has its matches."""
+    top_k = request.args.get('top_k', 6, type=int)
+    invalid = []  # InvalidVentText of the line that ended an NDJSON batch
+    if request.mimetype == 'application/x-ndjson':
+        vent_texts = _ndjson_vent_texts(invalid)
+    else:
+        body = request.json
+        vent_texts = body.get('vent_texts') or [] if isinstance(body, dict) else None
+        if not isinstance(vent_texts, list) or not all(isinstance(text, str) for text in vent_texts):
+            return jsonify({"error": "body must be an object whose vent_texts is a list of strings"}), 400
+    
+    def generate():
+        done = 0
+        try:
+            for matches in get_matcher().find_matches_batch(vent_texts, top_k=top_k):
+                if invalid and invalid[0].index == done:
+                    yield json.dumps({"index": done, "error": str(invalid[0])}) + "\n"
+                    return
+                yield json.dumps({"index": done, "matches": matches}) + "\n"
+                done += 1
+        except Exception:
+            log.exception("dating_matches_batch_error", index=done)
+            yield json.dumps({"index": done, "error": "Failed to find matches"}) + "\n"
+    
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+@app.route('/api/dating-matches/conversation/<int:conversation_id>')
+def get_conversation_matches(conversation_id):
+    """Matches for an already stored conversation, from the offline
+    precompute (precompute_matches.py) - no embedding call, no scan"""
+    top_k = request.args.get('top_k', 6, type=int)
+    matches = get_matcher().conversation_matches(conversation_id, top_k=top_k)
+    if matches is None:
+        return jsonify({"error": "No precomputed matches for this conversation"}), 404
+    return jsonify({"conversation_id": conversation_id, "matches": matches})
+
+@app.route('/metrics')
+def prometheus_metrics():
+    """Prometheus scrape target - see metrics.py for what's collected"""
+    body, content_type = metrics.render()
+    return Response(body, mimetype=content_type)
+
 if __name__ == '__main__':
     port = int(os.environ.get('PORT', 5000))
+    start_warm_up(port)
     app.run(host='0.0.0.0', port=port, debug=False)
@@ -0,0 +1,185 @@
+# availability_index.py - Answer "is this username/email taken?" without a DB query
+import hashlib
+import math
+import os
+import threading
+import time
+
+import numpy as np
+from sqlalchemy import func, or_, update
+
+from database import SessionLocal, User
+from glow_logging import get_logger
+
+log = get_logger(__name__)
+
+
+def normalize(value):
+    """Case-insensitive key: "Maya " and "maya" are the same username"""
+    return value.replace('\xa0', '').strip().casefold()
+
+
+class BloomFilter:
+    """Fixed-size Bloom filter: no false negatives, about `error_rate` false
+    positives at `capacity` items (more past that)"""
+
+    def __init__(self, capacity, error_rate=0.01):
+        self.capacity = max(capacity, 1)
+        self.size = max(64, math.ceil(-self.capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / self.capacity * math.log(2)))
+        self.bits = np.zeros((self.size + 7) // 8, dtype=np.uint8)
+        self.count = 0
+
+    def _positions(self, key):
+        # Double hashing: k positions from two 64-bit halves of one digest
+        digest = hashlib.blake2b(key.encode('utf-8'), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        return [(h1 + i * h2) % self.size for i in range(self.hashes)]
+
+    def add(self, key):
+        for position in self._positions(key):
+            self.bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, key):
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self._positions(key))
+
+
+class AvailabilityIndex:
+    """Taken usernames and emails, kept in memory.
+
+    A value that isn't in the index is free - no DB query. For the set a
+    value that is in it is taken, also without a query; for the Bloom filter
+    it may be a false positive, so it's confirmed against the users table
+    through the indexed username_key/email_key columns. `kind` is "set", or
+    "bloom" for user tables too big to hold every name.
+
+    Users saved by other worker processes are picked up by an incremental
+    catch-up (rows with a higher id) at most every `refresh_interval`
+    seconds; in between, the unique constraints on users still stop a
+    duplicate at save time. Until warm() has finished, lookups go to the DB.
+    warm() also fills in the key columns of users saved before they existed.
+    """
+
+    def __init__(self, kind="set", refresh_interval=30, bloom_error_rate=0.01):
+        self.kind = kind
+        self.refresh_interval = refresh_interval
+        self.bloom_error_rate = bloom_error_rate
+        self.ready = False
+        self._usernames = self._new_filter(0)
+        self._emails = self._new_filter(0)
+        self._max_id = 0
+        self._refreshed_at = 0.0
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            kind=os.getenv("GLOW_AVAILABILITY_INDEX", "set"),
+            refresh_interval=float(os.getenv("GLOW_AVAILABILITY_REFRESH", 30))
+        )
+
+    def _new_filter(self, users):
+        if self.kind == "bloom":
+            # Room to grow; rebuilt by warm() once it fills up
+            return BloomFilter(max(2 * users, 100000), self.bloom_error_rate)
+        return set()
+
+    def warm(self):
+        """(Re)load every username and email from the users table"""
+        start = time.perf_counter()
+        db = SessionLocal()
+        try:
+            total = db.query(func.count(User.id)).scalar()
+            usernames, emails = self._new_filter(total), self._new_filter(total)
+            max_id = 0
+            missing_keys = []
+            rows = db.query(User.id, User.username, User.email, User.username_key, User.email_key).yield_per(10000)
+            for user_id, username, email, username_key, email_key in rows:
+                self._add(usernames, emails, username, email)
+                max_id = max(max_id, user_id)
+                keys = {"username_key": normalize(username) if username else None,
+                        "email_key": normalize(email) if email else None}
+                if (username_key, email_key) != (keys["username_key"], keys["email_key"]):
+                    missing_keys.append(dict(keys, id=user_id))
+            for first in range(0, len(missing_keys), 1000):
+                db.execute(update(User), missing_keys[first:first + 1000])
+                db.commit()
+        finally:
+            db.close()
+
+        with self._lock:
+            self._usernames, self._emails, self._max_id = usernames, emails, max_id
+            self._refreshed_at = time.monotonic()
+            self.ready = True
+        log.info("availability_index_warm", kind=self.kind, users=total, keys_filled=len(missing_keys),
+                 seconds=round(time.perf_counter() - start, 3))
+
+    def add_user(self, username, email):
+        """Record a user that was just saved"""
+        with self._lock:
+            self._add(self._usernames, self._emails, username, email)
+
+    def username_taken(self, username):
+        return self._taken(self._usernames, User.username_key, User.username, username)
+
+    def email_taken(self, email):
+        return self._taken(self._emails, User.email_key, User.email, email)
+
+    def _taken(self, index, key_column, column, value):
+        key = normalize(value)
+        if self.ready:
+            self._catch_up()
+            if key not in index:
+                return False
+            if self.kind == "set":
+                return True  # A set has no false positives
+        db = SessionLocal()
+        try:
+            # Both sides are indexed; the exact match covers rows warm() hasn't given a key yet
+            found = db.query(User.id).filter(or_(key_column == key, column == value.replace('\xa0', '').strip()))
+            return found.first() is not None
+        finally:
+            db.close()
+
+    def _catch_up(self):
+        """Pull in users other processes saved since we last looked"""
+        if time.monotonic() - self._refreshed_at < self.refresh_interval:
+            return
+        if self.kind == "bloom" and self._usernames.count > self._usernames.capacity:
+            self.warm()  # Full filters drift toward all-positive
+            return
+        with self._lock:
+            if time.monotonic() - self._refreshed_at < self.refresh_interval:
+                return  # Another thread just did it
+            self._refreshed_at = time.monotonic()
+            max_id = self._max_id
+        db = SessionLocal()
+        try:
+            rows = db.query(User.id, User.username, User.email).filter(User.id > max_id).all()
+        finally:
+            db.close()
+        with self._lock:
+            for user_id, username, email in rows:
+                self._add(self._usernames, self._emails, username, email)
+                self._max_id = max(self._max_id, user_id)
+
+    @staticmethod
+    def _add(usernames, emails, username, email):
+        if username:
+            usernames.add(normalize(username))
+        if email:
+            emails.add(normalize(email))
+
+
+_index = None
+_index_lock = threading.Lock()
+
+def get_availability_index():
+    """Process-wide AvailabilityIndex (not warmed - call warm() at startup)"""
+    global _index
+    with _index_lock:
+        if _index is None:
+            _index = AvailabilityIndex.from_env()
+        return _index
@@ -0,0 +1,52 @@
+# bench_agent_turn.py - Per-turn overhead of GlowAgent.chat with a stubbed LLM
+#
+# Compares the old behaviour (rebuild prompt + agent + executor every turn)
+# with the shared executor that takes signup state as prompt variables.
+# The LLM is a FakeListChatModel, so this runs offline and only measures our
+# own overhead. Usage: python bench_agent_turn.py [turns]
+import contextlib
+import io
+import sys
+import time
+
+from langchain_core.language_models import FakeListChatModel
+
+import glowBrain
+from glowBrain import GlowAgent, build_agent_executor
+
+MESSAGES = ["hey", "archita", "archu", "supersecret123", "archita@example.com"]
+
+
+def run_turns(agent, turns, rebuild_each_turn):
+    fake_llm = FakeListChatModel(responses=["omg hiii bestie ✨"])
+    start = time.perf_counter()
+    for i in range(turns):
+        if rebuild_each_turn:
+            # What chat() used to do via _setup_agent() on every turn
+            agent.agent_executor = build_agent_executor(fake_llm)
+        agent.chat(MESSAGES[i % len(MESSAGES)])
+    return (time.perf_counter() - start) / turns
+
+
+def main():
+    turns = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    fake_llm = FakeListChatModel(responses=["omg hiii bestie ✨"])
+    glowBrain._agent_executors["bench"] = build_agent_executor(fake_llm)
+
+    results = {}
+    for label, rebuild in (("before (rebuild per turn)", True), ("after (shared executor)", False)):
+        # The tool-calling path - the one that used to rebuild per turn
+        agent = GlowAgent(openai_api_key="bench", fast_validation=False)
+        # Silence any verbose executor output (GLOW_AGENT_VERBOSE)
+        with contextlib.redirect_stdout(io.StringIO()):
+            run_turns(agent, 5, rebuild)  # warm-up
+            results[label] = run_turns(agent, turns, rebuild)
+
+    for label, seconds in results.items():
+        print(f"{label:28s} {seconds * 1000:8.3f} ms/turn")
+    before, after = results.values()
+    print(f"{'speedup':28s} {before / after:8.2f}x")
+
+
+if __name__ == "__main__":
+    main()
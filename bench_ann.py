@@ -0,0 +1,98 @@
+# bench_ann.py - IVF index latency and recall@k against exact search
+#
+# Generates clustered synthetic unit vectors (real embeddings are clustered;
+# uniform random vectors are the worst case for any ANN method), builds an
+# IVFIndex, round-trips it through save/load, and reports per-query latency
+# and recall@k for each nprobe. Pinned to one BLAS thread to match a single
+# CPU core.
+#
+#   python bench_ann.py --profiles 1000000 --dim 256 --nprobe 4,8,16,32
+#
+# Memory is profiles x dim x 4 bytes twice over (matrix + index), so 1M x 1536
+# needs ~12 GB; use a reduced --dim to try million-scale on a small box.
+import os
+
+os.environ.setdefault("OPENBLAS_NUM_THREADS", "1")
+os.environ.setdefault("OMP_NUM_THREADS", "1")
+os.environ.setdefault("MKL_NUM_THREADS", "1")
+
+import argparse
+import json
+import tempfile
+import time
+
+import numpy as np
+
+from ann_index import IVFIndex, recall_at_k
+from embedding_codec import normalize_rows
+
+
+def synthetic_embeddings(n, dim, clusters=2000, spread=0.6, seed=0):
+    """Unit vectors scattered around random topic centres. The centres depend
+    only on dim and clusters, so calls with different seeds (e.g. profiles and
+    queries) draw from the same topics."""
+    centres = normalize_rows(np.random.default_rng(dim).standard_normal((clusters, dim)).astype(np.float32))
+    rng = np.random.default_rng(seed)
+    vectors = np.empty((n, dim), dtype=np.float32)
+    for start in range(0, n, 100000):
+        stop = min(n, start + 100000)
+        noise = rng.standard_normal((stop - start, dim)).astype(np.float32) * (spread / np.sqrt(dim))
+        vectors[start:stop] = centres[rng.integers(0, clusters, stop - start)] + noise
+    return normalize_rows(vectors).astype(np.float32)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the IVF profile index")
+    parser.add_argument('--profiles', type=int, default=1000000)
+    parser.add_argument('--dim', type=int, default=256)
+    parser.add_argument('--nlist', type=int, default=None, help="default ~sqrt(profiles)")
+    parser.add_argument('--nprobe', default='4,8,16,32')
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('--k', type=int, default=10)
+    parser.add_argument('--output', help="write results as JSON here")
+    args = parser.parse_args()
+
+    vectors = synthetic_embeddings(args.profiles, args.dim)
+    ids = np.arange(1, args.profiles + 1, dtype=np.int64)
+    queries = synthetic_embeddings(args.queries, args.dim, seed=1)
+
+    start = time.perf_counter()
+    index = IVFIndex.train(vectors, nlist=args.nlist)
+    index.add(ids, vectors)
+    build_seconds = time.perf_counter() - start
+
+    with tempfile.TemporaryDirectory() as path:
+        index.save(path)
+        start = time.perf_counter()
+        index = IVFIndex.load(path, mmap=False)
+        load_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for query in queries:
+        np.argpartition(vectors @ query, -args.k)[-args.k:]
+    exact_ms = (time.perf_counter() - start) / len(queries) * 1000
+
+    print(f"{args.profiles} profiles x {args.dim} dims, nlist={index.nlist}: "
+          f"build {build_seconds:.1f}s, load {load_seconds:.2f}s, exact scan {exact_ms:.2f} ms/query")
+
+    results = {"profiles": args.profiles, "dim": args.dim, "nlist": index.nlist,
+               "build_seconds": build_seconds, "load_seconds": load_seconds,
+               "exact_ms": exact_ms, "nprobe": []}
+    for nprobe in (int(value) for value in args.nprobe.split(',')):
+        latencies = []
+        for query in queries:
+            start = time.perf_counter()
+            index.search(query, args.k, nprobe=nprobe)
+            latencies.append((time.perf_counter() - start) * 1000)
+        recall = recall_at_k(index, ids, vectors, queries, k=args.k, nprobe=nprobe)
+        p50, p99 = np.percentile(latencies, [50, 99])
+        print(f"  nprobe={nprobe:4d}  p50 {p50:6.2f} ms  p99 {p99:6.2f} ms  recall@{args.k} {recall:.3f}")
+        results["nprobe"].append({"nprobe": nprobe, "p50_ms": p50, "p99_ms": p99, "recall": recall})
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
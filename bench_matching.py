@@ -0,0 +1,238 @@
+# bench_matching.py - Stage-by-stage timings for EmbeddingMatcher.find_matches
+#
+# For each profile count, fills a throwaway SQLite DB with synthetic profiles
+# (clustered unit vectors, see bench_ann.synthetic_embeddings), stubs out the
+# OpenAI calls so nothing leaves the machine, and times each stage of a match
+# on its own:
+#
+#   db_load       refresh_profiles(full=True): read, decode, build the matrix
+#   scoring       similarity of every profile against the query
+#   top_k         picking the best rows out of those scores
+#   rerank        full-vector rescore (only with --storage/--coarse-dimensions)
+#   results       building the profile dicts
+#   json          serialising the /api/dating-matches response body
+#   find_matches  the whole call, end to end
+#   find_matches_batch  find_matches_batch over every query, per query
+#
+# Results are written as JSON tagged with the git commit. Pass --compare with
+# a file from an earlier commit to see what got slower.
+#
+#   python bench_matching.py --sizes 1000,100000,1000000 --output bench_matching.json
+#   python bench_matching.py --compare bench_matching.json
+#
+# The DB and matrix take profiles x dim x 4 bytes each, so 1M x 1536 needs
+# ~6 GB of RAM and as much disk; use a reduced --dim on a small box.
+import os
+
+os.environ.setdefault("OPENBLAS_NUM_THREADS", "1")
+os.environ.setdefault("OMP_NUM_THREADS", "1")
+os.environ.setdefault("MKL_NUM_THREADS", "1")
+os.environ.setdefault("OPENAI_API_KEY", "offline")
+
+import argparse
+import json
+import subprocess
+import tempfile
+import time
+import zlib
+from datetime import datetime, timezone
+
+import numpy as np
+
+from bench_ann import synthetic_embeddings
+from embedding_codec import encode_embedding
+from embedding_service import EmbeddingMatcher, top_rows
+
+INSERT_CHUNK = 100000
+STAGES = ('scoring', 'top_k', 'rerank', 'results', 'json', 'find_matches', 'find_matches_batch')
+OCCUPATIONS = ["Software Engineer", "Barista", "Nurse", "Chef", "Teacher", "Photographer", "Climber"]
+TRAITS = ["Gentle", "Creative", "Funny", "Loyal", "Adventurous", "Calm", "Curious", "Driven"]
+EMOJIS = ["☕️", "🧗", "🎸", "📚", "🌱", "🍳", "📷"]
+
+
+class OfflineMatcher(EmbeddingMatcher):
+    """EmbeddingMatcher whose embeddings come from a lookup table (or a
+    deterministic synthetic vector) instead of OpenAI"""
+
+    def __init__(self, db_path, dim, known=None, **options):
+        self.dim = dim
+        self.known = known or {}
+        super().__init__(db_path, **options)
+
+    def get_embedding(self, text):
+        if text not in self.known:
+            self.known[text] = synthetic_embeddings(1, self.dim, seed=zlib.crc32(text.encode()))[0]
+        return self.known[text]
+
+    def get_embeddings(self, texts, **options):
+        return [self.get_embedding(text) for text in texts]
+
+
+def synthetic_profile_rows(start, count, dim, seed):
+    """(name, description, embedding blob, profile json) rows for guy_profiles"""
+    rng = np.random.default_rng(seed)
+    vectors = synthetic_embeddings(count, dim, seed=seed)
+    rows = []
+    for offset, vector in enumerate(vectors):
+        number = start + offset
+        occupation = OCCUPATIONS[rng.integers(len(OCCUPATIONS))]
+        profile = {
+            "age": int(rng.integers(21, 36)),
+            "occupation": occupation,
+            "personality": f"Synthetic profile #{number}",
+            "traits": [TRAITS[i] for i in rng.choice(len(TRAITS), 4, replace=False)],
+            "compatibility_score": 90,
+            "emoji": EMOJIS[rng.integers(len(EMOJIS))]
+        }
+        description = f"{occupation} number {number}, " + ", ".join(profile["traits"]).lower()
+        rows.append((f"Guy {number}", description, encode_embedding(vector), json.dumps(profile)))
+    return rows
+
+
+def fill_profiles(matcher, count, dim):
+    """Insert `count` synthetic profiles straight into the matcher's DB"""
+    for chunk, start in enumerate(range(0, count, INSERT_CHUNK)):
+        rows = synthetic_profile_rows(start, min(INSERT_CHUNK, count - start), dim, seed=100 + chunk)
+        with matcher.db.transaction() as conn:
+            conn.executemany('''
+                INSERT INTO guy_profiles (name, description, embedding, profile_data)
+                VALUES (?, ?, ?, ?)
+            ''', rows)
+
+
+def summarize(samples):
+    p50, p99 = np.percentile(samples, [50, 99])
+    return {"p50_ms": float(p50), "p99_ms": float(p99), "mean_ms": float(np.mean(samples))}
+
+
+def bench_size(count, args):
+    queries = synthetic_embeddings(args.queries, args.dim, seed=1)
+    known = {f"vent {i}": query for i, query in enumerate(queries)}
+
+    with tempfile.TemporaryDirectory() as path:
+        db_path = os.path.join(path, 'bench.db')
+        matcher = OfflineMatcher(db_path, args.dim, known, storage=args.storage,
+                                 coarse_dimensions=args.coarse_dimensions, rerank_factor=args.rerank_factor)
+        fill_profiles(matcher, count, args.dim)
+        db_bytes = sum(os.path.getsize(os.path.join(path, name)) for name in os.listdir(path))
+
+        load_seconds = []
+        for _ in range(args.load_repeats):
+            start = time.perf_counter()
+            matcher.refresh_profiles(full=True)
+            load_seconds.append(time.perf_counter() - start)
+
+        index = matcher.profile_index
+        shortlist = args.k if index.exact else args.k * matcher.rerank_factor
+        timings = {stage: [] for stage in STAGES}
+        for query in queries:
+            start = time.perf_counter()
+            scores = index.scores(index.project(query))
+            scored = time.perf_counter()
+            rows, top_scores = top_rows(scores, shortlist)
+            picked = time.perf_counter()
+            if not index.exact:
+                rows, top_scores = matcher._rerank(index, rows, query)
+            reranked = time.perf_counter()
+            matches = index.matches(rows[:args.k], top_scores[:args.k])
+            built = time.perf_counter()
+            json.dumps({"matches": matches, "message": "Found your perfect matches based on your vibe! ✨"})
+            serialized = time.perf_counter()
+
+            timings['scoring'].append((scored - start) * 1000)
+            timings['top_k'].append((picked - scored) * 1000)
+            timings['rerank'].append((reranked - picked) * 1000)
+            timings['results'].append((built - reranked) * 1000)
+            timings['json'].append((serialized - built) * 1000)
+
+        for text in known:
+            start = time.perf_counter()
+            matcher.find_matches(text, top_k=args.k)
+            timings['find_matches'].append((time.perf_counter() - start) * 1000)
+
+        for _ in range(3):
+            start = time.perf_counter()
+            for _ in matcher.find_matches_batch(list(known), top_k=args.k):
+                pass
+            timings['find_matches_batch'].append((time.perf_counter() - start) * 1000 / len(known))
+
+        matcher.conversation_log.close()
+        matcher.db.close()
+
+    return {
+        "profiles": len(index.ids),
+        "db_bytes": db_bytes,
+        "bytes_per_profile": index.bytes_per_profile,
+        "db_load_s": float(np.median(load_seconds)),
+        "stages": {stage: summarize(samples) for stage, samples in timings.items()}
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def print_result(result):
+    print(f"{result['profiles']} profiles: db_load {result['db_load_s'] * 1000:.1f} ms, "
+          f"{result['bytes_per_profile']} B/profile in memory, {result['db_bytes'] / 1e6:.1f} MB on disk")
+    for stage, stats in result['stages'].items():
+        print(f"  {stage:18s} p50 {stats['p50_ms']:8.3f} ms  p99 {stats['p99_ms']:8.3f} ms")
+
+
+def compare(previous, current, tolerance):
+    """Print p50 changes against an earlier run, flagging slowdowns over tolerance"""
+    before = {result['profiles']: result for result in previous['results']}
+    print(f"\nvs {previous.get('commit') or 'previous run'} (flagging > {tolerance:.0%} slower):")
+    for result in current['results']:
+        old = before.get(result['profiles'])
+        if old is None:
+            continue
+        pairs = [('db_load', old['db_load_s'] * 1000, result['db_load_s'] * 1000)]
+        pairs += [(stage, old['stages'][stage]['p50_ms'], stats['p50_ms'])
+                  for stage, stats in result['stages'].items() if stage in old['stages']]
+        for stage, was, now in pairs:
+            ratio = now / was if was else 1.0
+            flag = " ⚠️" if ratio > 1 + tolerance else ""
+            print(f"  {result['profiles']:8d} {stage:13s} {was:8.3f} -> {now:8.3f} ms ({ratio:5.2f}x){flag}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark find_matches stage by stage, offline")
+    parser.add_argument('--sizes', default='1000,100000,1000000', help="comma-separated profile counts")
+    parser.add_argument('--dim', type=int, default=1536)
+    parser.add_argument('--queries', type=int, default=100)
+    parser.add_argument('--k', type=int, default=6)
+    parser.add_argument('--storage', default='float32', help="float32, float16 or int8")
+    parser.add_argument('--coarse-dimensions', type=int, default=None)
+    parser.add_argument('--rerank-factor', type=int, default=4)
+    parser.add_argument('--load-repeats', type=int, default=3)
+    parser.add_argument('--output', help="write results as JSON here")
+    parser.add_argument('--compare', help="earlier --output file to compare against")
+    parser.add_argument('--tolerance', type=float, default=0.2, help="slowdown flagged by --compare")
+    args = parser.parse_args()
+
+    report = {
+        "commit": git_commit(),
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "config": {key: value for key, value in vars(args).items() if key not in ('output', 'compare', 'tolerance')},
+        "results": []
+    }
+    for count in (int(value) for value in args.sizes.split(',')):
+        result = bench_size(count, args)
+        print_result(result)
+        report["results"].append(result)
+
+    if args.compare:
+        with open(args.compare) as f:
+            compare(json.load(f), report, args.tolerance)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,79 @@
+# bench_password_hashing.py - Request-thread latency while signups hash passwords
+#
+# Runs a light request (a few ms of pure-Python work, like rendering a chat
+# turn) over and over on one thread while N other threads hash passwords back
+# to back, as concurrent signups would. Compares hashing inline on the request
+# threads with PasswordService's process pool; the light request's p50/p99
+# should stay where it is with no signups at all.
+#
+#   python bench_password_hashing.py --signups 0 4 16 --workers 2
+import argparse
+import statistics
+import threading
+import time
+
+from passwords import PasswordService, hasher_from_env
+
+
+def light_request():
+    start = time.perf_counter()
+    sum(i * i for i in range(50000))
+    return time.perf_counter() - start
+
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+def run(service, signups, duration):
+    stop = time.monotonic() + duration
+    hashes = []
+
+    def signup_loop():
+        while time.monotonic() < stop:
+            start = time.perf_counter()
+            service.hash("supersecret123")
+            hashes.append(time.perf_counter() - start)
+
+    threads = [threading.Thread(target=signup_loop) for _ in range(signups)]
+    for thread in threads:
+        thread.start()
+    latencies = []
+    while time.monotonic() < stop:
+        latencies.append(light_request())
+        time.sleep(0.005)
+    for thread in threads:
+        thread.join()
+
+    return {
+        "request_p50_ms": statistics.median(latencies) * 1000,
+        "request_p99_ms": percentile(latencies, 0.99) * 1000,
+        "hashes_per_s": len(hashes) / duration,
+        "hash_p50_ms": statistics.median(hashes) * 1000 if hashes else 0.0
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark request latency under concurrent password hashing")
+    parser.add_argument('--signups', type=int, nargs='+', default=[0, 4, 16], help="concurrent signups to try")
+    parser.add_argument('--workers', type=int, default=2, help="hashing processes for the pool")
+    parser.add_argument('--duration', type=float, default=5.0, help="seconds per run")
+    args = parser.parse_args()
+
+    hasher = hasher_from_env()  # GLOW_PASSWORD_HASH etc.
+    print(f"{hasher.name} {hasher.params()}")
+    modes = {"inline": PasswordService(hasher, workers=0), f"pool({args.workers})": PasswordService(hasher, workers=args.workers)}
+    modes[f"pool({args.workers})"].hash("warm up the pool")
+
+    print(f"{'mode':10s} {'signups':>7s} {'req p50 ms':>11s} {'req p99 ms':>11s} {'hashes/s':>9s} {'hash p50 ms':>12s}")
+    for label, service in modes.items():
+        for signups in args.signups:
+            result = run(service, signups, args.duration)
+            print(f"{label:10s} {signups:7d} {result['request_p50_ms']:11.2f} {result['request_p99_ms']:11.2f} "
+                  f"{result['hashes_per_s']:9.1f} {result['hash_p50_ms']:12.1f}")
+        service.close()
+
+
+if __name__ == '__main__':
+    main()
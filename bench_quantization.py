@@ -0,0 +1,78 @@
+# bench_quantization.py - Memory / latency / accuracy of each storage mode
+#
+# For float32, float16 and int8 profile matrices, reports bytes per profile,
+# per-query latency (quantized scan + top-k + float32 re-rank of the
+# shortlist) and top-k overlap with exact float32 cosine search, with and
+# without the re-rank. In the service the re-rank reads the shortlist's
+# stored vectors from SQLite; here they come from the in-memory float32
+# matrix, so latencies exclude that small fetch.
+#
+#   python bench_quantization.py --profiles 100000 --dim 1536
+import argparse
+import json
+import time
+
+import numpy as np
+
+from bench_ann import synthetic_embeddings
+from quantization import STORAGE_MODES, quantize, quantized_scores
+
+
+def top_k(scores, k):
+    top = np.argpartition(scores, -k)[-k:]
+    return top[np.argsort(-scores[top])]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark quantized embedding storage")
+    parser.add_argument('--profiles', type=int, default=100000)
+    parser.add_argument('--dim', type=int, default=1536)
+    parser.add_argument('--queries', type=int, default=50)
+    parser.add_argument('--k', type=int, default=6)
+    parser.add_argument('--rerank-factor', type=int, default=4)
+    parser.add_argument('--output', help="write results as JSON here")
+    args = parser.parse_args()
+
+    vectors = synthetic_embeddings(args.profiles, args.dim)
+    queries = synthetic_embeddings(args.queries, args.dim, seed=1)
+    exact = [set(top_k(vectors @ query, args.k)) for query in queries]
+
+    results = []
+    print(f"{args.profiles} profiles x {args.dim} dims, top-{args.k}, shortlist {args.k * args.rerank_factor}")
+    for mode in STORAGE_MODES:
+        data, scales = quantize(vectors, mode)
+        bytes_per_profile = data.itemsize * args.dim + (scales.itemsize if scales is not None else 0)
+
+        latencies, overlap_raw, overlap_reranked = [], 0, 0
+        for query, truth in zip(queries, exact):
+            start = time.perf_counter()
+            scores = quantized_scores(data, scales, query)
+            shortlist = top_k(scores, args.k * args.rerank_factor)
+            if mode != 'float32':
+                shortlist = shortlist[np.argsort(-(vectors[shortlist] @ query))]
+            found = shortlist[:args.k]
+            latencies.append((time.perf_counter() - start) * 1000)
+
+            overlap_raw += len(truth & set(top_k(scores, args.k)))
+            overlap_reranked += len(truth & set(found))
+
+        total = args.k * len(queries)
+        row = {
+            "mode": mode,
+            "bytes_per_profile": bytes_per_profile,
+            "p50_ms": float(np.percentile(latencies, 50)),
+            "overlap_without_rerank": overlap_raw / total,
+            "overlap_with_rerank": overlap_reranked / total
+        }
+        results.append(row)
+        print(f"  {mode:8s} {bytes_per_profile:6d} B/profile  p50 {row['p50_ms']:7.2f} ms  "
+              f"top-{args.k} overlap {row['overlap_without_rerank']:.3f} raw, "
+              f"{row['overlap_with_rerank']:.3f} re-ranked")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
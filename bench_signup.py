@@ -0,0 +1,150 @@
+# bench_signup.py - LLM calls and wall-clock time for one complete signup
+#
+# Walks a full signup (greeting -> name -> username -> password -> email ->
+# verification code) twice: with the model calling the validation tools
+# itself, and with the fast path that validates locally and makes one LLM
+# call per turn. The LLM is a scripted fake that sleeps --llm-latency seconds
+# per call (roughly a GPT-4o round trip), so the run is offline and the time
+# difference comes from the number of calls. Tools run for real against the
+# app DB; only the email hand-off is stubbed. A third run repeats the fast path
+# with a response cache warmed by a few earlier signups.
+#
+#   python bench_signup.py --llm-latency 1.2
+import argparse
+import json
+import random
+import time
+import uuid
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.language_models import FakeMessagesListChatModel
+from langchain_core.messages import AIMessage
+
+import tools
+from database import SessionLocal, User
+from glowBrain import GlowAgent, build_agent_executor, build_reply_chain
+from response_cache import ResponseCache
+
+FAST_REPLIES = ["okayyy bestie ✨ next!", "slayyy 💅 keep going", "periodt 👑 what's next"]
+
+sent_codes = {}  # email -> last code "sent" (only a hash is in the DB)
+
+
+class SlowFakeChatModel(FakeMessagesListChatModel):
+    latency: float = 0.0
+
+    def _generate(self, *args, **kwargs):
+        time.sleep(self.latency)
+        return super()._generate(*args, **kwargs)
+
+
+class CallCounter(BaseCallbackHandler):
+    def __init__(self):
+        self.calls = 0
+
+    def on_chat_model_start(self, serialized, messages, **kwargs):
+        self.calls += 1
+
+
+def function_call(tool, **arguments):
+    return AIMessage(content="", additional_kwargs={
+        "function_call": {"name": tool, "arguments": json.dumps(arguments)}
+    })
+
+
+def latest_code(email):
+    return sent_codes[email]
+
+
+def user_saved(username):
+    db = SessionLocal()
+    try:
+        return db.query(User).filter(User.username == username).first() is not None
+    finally:
+        db.close()
+
+
+def signup_turns(user):
+    """(message, scripted replies for the tool-calling path) per turn. The
+    replies are a function so the verification code can be read once sent."""
+    email = f"{user}@example.com"
+    return [
+        ("hey", lambda: [AIMessage(content="heyyy bestie ✨ what's your name?")]),
+        ("maya", lambda: [AIMessage(content="hi maya! pick a username 💅")]),
+        (user, lambda: [
+            function_call("check_username_available", username=user),
+            AIMessage(content="that username is available, great choice! now a password")
+        ]),
+        ("supersecret123", lambda: [
+            function_call("validate_password_strength", password="supersecret123"),
+            AIMessage(content="strong password queen! what's your email?")
+        ]),
+        (email, lambda: [
+            function_call("validate_email_format", email=email),
+            function_call("generate_and_send_verification_code", email=email),
+            AIMessage(content="code sent! check your email 💌")
+        ]),
+        (lambda: latest_code(email), lambda: [
+            function_call("verify_code", email=email, entered_code=latest_code(email)),
+            AIMessage(content="verified!! 👑")
+        ]),
+        # The tool-calling path only saves on the turn after verification
+        ("yay", lambda: [
+            function_call("save_user_to_database", name="maya", username=user, email=email),
+            AIMessage(content="saved successfully - launching the app! 🚀")
+        ])
+    ]
+
+
+def run_signup(fast, latency, cache=None):
+    user = f"bench{uuid.uuid4().hex[:10]}"
+    llm = SlowFakeChatModel(responses=[AIMessage(content="")], latency=latency)
+    agent = GlowAgent(openai_api_key="bench", fast_validation=fast)
+    agent.agent_executor = build_agent_executor(llm)
+    agent.reply_chain = build_reply_chain(llm)
+    agent.response_cache = cache
+    counter = CallCounter()
+
+    start = time.perf_counter()
+    for message, replies in signup_turns(user):
+        if agent.signup_state["step"] == "complete" and fast:
+            break
+        if fast:
+            llm.responses = [AIMessage(content=random.choice(FAST_REPLIES))]
+        else:
+            llm.responses = replies()
+        llm.i = 0
+        agent.chat(message() if callable(message) else message, callbacks=[counter])
+    elapsed = time.perf_counter() - start
+
+    return {"llm_calls": counter.calls, "seconds": elapsed, "finished": user_saved(user)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark a full signup, tool calls vs fast path")
+    parser.add_argument('--llm-latency', type=float, default=1.0, help="seconds per fake LLM call")
+    parser.add_argument('--warm-signups', type=int, default=8, help="signups run to warm the cache")
+    args = parser.parse_args()
+
+    # Offline: pretend the verification email always goes out
+    tools.queue_verification_email = lambda to_email, code: sent_codes.__setitem__(to_email, code) or True
+
+    results = {
+        "before (model calls tools)": run_signup(False, args.llm_latency),
+        "after (local validation)": run_signup(True, args.llm_latency)
+    }
+    cache = ResponseCache(variants=len(FAST_REPLIES))
+    for _ in range(args.warm_signups):
+        run_signup(True, 0, cache)
+    results["after + warm response cache"] = run_signup(True, args.llm_latency, cache)
+
+    for label, result in results.items():
+        print(f"{label:30s} {result['llm_calls']:3d} LLM calls  {result['seconds']:6.2f}s"
+              f"{'' if result['finished'] else '  (signup did not finish!)'}")
+    before, after, cached = results.values()
+    print(f"{'speedup':30s} {before['seconds'] / after['seconds']:8.2f}x "
+          f"({before['seconds'] / cached['seconds']:.2f}x with the cache)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,112 @@
+# bench_startup.py - How long `import app` takes, and where the time goes
+#
+# Imports app.py in fresh interpreters (warm-up off, so only the import is
+# measured) under `python -X importtime`, and reports:
+#
+#   import_s          wall-clock time of `import app`
+#   first_request_s   GET / through the test client right after the import
+#   packages          self time summed per top-level package, slowest first
+#   modules           slowest modules by cumulative import time
+#
+# Results are written as JSON tagged with the git commit; --compare flags a
+# startup that got slower than an earlier run.
+#
+#   python bench_startup.py --output bench_startup.json
+#   python bench_startup.py --compare bench_startup.json
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+from collections import defaultdict
+from datetime import datetime, timezone
+
+from bench_matching import git_commit
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+CHILD = """
+import json, time
+start = time.perf_counter()
+import app
+imported = time.perf_counter()
+app.app.test_client().get('/')
+print(json.dumps({"import_s": imported - start, "first_request_s": time.perf_counter() - imported}))
+"""
+
+
+def parse_importtime(stderr):
+    """[(module, self µs, cumulative µs)] from -X importtime output"""
+    modules = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        modules.append((name.strip(), int(self_us), int(cumulative_us)))
+    return modules
+
+
+def run_once():
+    env = dict(os.environ, GLOW_WARM_UP="0")
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', CHILD], cwd=HERE, env=env,
+                            capture_output=True, text=True, check=True)
+    timings = json.loads(result.stdout.strip().splitlines()[-1])
+    return timings, parse_importtime(result.stderr)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Profile the import time of app.py")
+    parser.add_argument('--repeats', type=int, default=3)
+    parser.add_argument('--top', type=int, default=15, help="modules/packages to list")
+    parser.add_argument('--output', help="write results as JSON here")
+    parser.add_argument('--compare', help="earlier --output file to compare against")
+    parser.add_argument('--tolerance', type=float, default=0.2, help="slowdown flagged by --compare")
+    args = parser.parse_args()
+
+    runs = [run_once() for _ in range(args.repeats)]
+    import_s = statistics.median(timings["import_s"] for timings, _ in runs)
+    first_request_s = statistics.median(timings["first_request_s"] for timings, _ in runs)
+
+    # Module breakdown from the median run
+    _, modules = sorted(runs, key=lambda run: run[0]["import_s"])[len(runs) // 2]
+    packages = defaultdict(int)
+    for name, self_us, _ in modules:
+        packages[name.split('.')[0]] += self_us
+
+    report = {
+        "commit": git_commit(),
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "import_s": import_s,
+        "first_request_s": first_request_s,
+        "packages": [{"package": name, "self_ms": us / 1000}
+                     for name, us in sorted(packages.items(), key=lambda item: -item[1])[:args.top]],
+        "modules": [{"module": name, "cumulative_ms": cumulative / 1000}
+                    for name, _, cumulative in sorted(modules, key=lambda item: -item[2])[:args.top]]
+    }
+
+    print(f"import app: {import_s * 1000:.0f} ms, first request: {first_request_s * 1000:.1f} ms "
+          f"(median of {args.repeats})")
+    print("slowest packages (self time):")
+    for entry in report["packages"]:
+        print(f"  {entry['package']:30s} {entry['self_ms']:8.1f} ms")
+    print("slowest modules (cumulative):")
+    for entry in report["modules"]:
+        print(f"  {entry['module']:45s} {entry['cumulative_ms']:8.1f} ms")
+
+    if args.compare:
+        with open(args.compare) as f:
+            previous = json.load(f)
+        print(f"\nvs {previous.get('commit') or 'previous run'} (flagging > {args.tolerance:.0%} slower):")
+        for key in ('import_s', 'first_request_s'):
+            was, now = previous[key] * 1000, report[key] * 1000
+            ratio = now / was if was else 1.0
+            flag = " ⚠️" if ratio > 1 + args.tolerance else ""
+            print(f"  {key:16s} {was:8.1f} -> {now:8.1f} ms ({ratio:5.2f}x){flag}")
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
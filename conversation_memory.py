@@ -0,0 +1,125 @@
+# conversation_memory.py - Chat history that stays within a token budget
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage
+
+from glow_logging import get_logger
+
+log = get_logger(__name__)
+
+MESSAGE_OVERHEAD_TOKENS = 4  # Role and separators the chat format adds per message
+
+# Summaries are LLM calls; a couple of threads keeps them off request threads
+_summarizer_pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix="summarizer")
+
+_encoding = None
+
+def count_tokens(text):
+    """Tokens in text by the gpt-4o tokenizer, or ~4 characters per token if
+    the tokenizer can't be loaded (it is downloaded on first use)"""
+    global _encoding
+    if _encoding is None:
+        try:
+            import tiktoken
+            _encoding = tiktoken.encoding_for_model("gpt-4o")
+        except Exception as e:
+            log.warning("tokenizer_unavailable", error=str(e))
+            _encoding = False
+    if _encoding:
+        return len(_encoding.encode(text, disallowed_special=()))
+    return len(text) // 4 + 1
+
+
+class ConversationMemory:
+    """Chat history for one session.
+
+    Without a summarizer it's a plain buffer of every message. With one, the
+    last `keep_turns` turns always stay verbatim, and once the verbatim part
+    passes `token_budget` the older turns are folded into a running summary
+    by a background thread. The turn that triggered it doesn't wait: until
+    the summary lands, those turns are simply still sent verbatim.
+
+    `summarize(summary, messages)` returns the new summary text.
+    """
+
+    def __init__(self, summarize=None, token_budget=1500, keep_turns=4):
+        self.summarize = summarize
+        self.token_budget = token_budget
+        self.keep_turns = keep_turns
+        self.summary = ""
+        self.turns = []  # (HumanMessage, AIMessage, tokens), oldest first
+        self._pending = None  # Future of the in-flight summary
+        self._lock = threading.Lock()
+
+    @property
+    def messages(self):
+        """History to put in the prompt: summary first, then the verbatim turns"""
+        with self._lock:
+            messages = [SystemMessage(content=f"Summary of the conversation so far: {self.summary}")] if self.summary else []
+            for human, ai, _ in self.turns:
+                messages += [human, ai]
+        return messages
+
+    def token_count(self):
+        with self._lock:
+            summary_tokens = count_tokens(self.summary) + MESSAGE_OVERHEAD_TOKENS if self.summary else 0
+            return summary_tokens + sum(tokens for _, _, tokens in self.turns)
+
+    def save_context(self, user_input, output):
+        tokens = count_tokens(user_input) + count_tokens(output) + 2 * MESSAGE_OVERHEAD_TOKENS
+        with self._lock:
+            self.turns.append((HumanMessage(content=user_input), AIMessage(content=output), tokens))
+            self._schedule()
+
+    def dump(self):
+        """JSON-able snapshot (an in-flight summary isn't included)"""
+        with self._lock:
+            return {
+                "summary": self.summary,
+                "turns": [[human.content, ai.content, tokens] for human, ai, tokens in self.turns]
+            }
+
+    def load(self, snapshot):
+        with self._lock:
+            self.summary = snapshot["summary"]
+            self.turns = [
+                (HumanMessage(content=human), AIMessage(content=ai), tokens)
+                for human, ai, tokens in snapshot["turns"]
+            ]
+            self._schedule()
+
+    def wait(self):
+        """Block until any in-flight summary has been applied"""
+        pending = self._pending
+        if pending is not None:
+            pending.result()
+
+    def _overflow(self):
+        """How many of the oldest turns should be folded into the summary"""
+        if self.summarize is None or len(self.turns) <= self.keep_turns:
+            return 0
+        if sum(tokens for _, _, tokens in self.turns) <= self.token_budget:
+            return 0
+        return len(self.turns) - self.keep_turns
+
+    def _schedule(self):
+        """Start a summary if one is due and none is running (caller holds the lock)"""
+        count = self._overflow()
+        if count and self._pending is None:
+            self._pending = _summarizer_pool.submit(self._fold, self.summary, self.turns[:count])
+
+    def _fold(self, summary, turns):
+        try:
+            new_summary = self.summarize(summary, [message for human, ai, _ in turns for message in (human, ai)])
+        except Exception:
+            log.exception("summary_failed", turns=len(turns))
+            new_summary = None
+
+        with self._lock:
+            self._pending = None
+            if new_summary:
+                # Turns are only ever appended, so the folded ones are still first
+                self.summary = new_summary
+                del self.turns[:len(turns)]
+                self._schedule()
@@ -1,31 +1,50 @@
 # database.py - This is like building Glow's filing cabinet
-from sqlalchemy import create_engine, Column, Integer, String, Boolean, DateTime
+from sqlalchemy import create_engine, event, inspect, text, Column, Integer, String, Boolean, DateTime, Index
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from datetime import datetime
 import hashlib
 import os
+import threading
+import time
+from metrics import SQLITE_SECONDS
 
 Base = declarative_base()
 
 class User(Base):
     __tablename__ = 'users'
+    __table_args__ = (
+        # Case-insensitive "is it taken?" lookups (availability_index.normalize)
+        Index('ix_users_username_key', 'username_key'),
+        Index('ix_users_email_key', 'email_key'),
+    )
     
     id = Column(Integer, primary_key=True)
     name = Column(String(100))
     username = Column(String(50), unique=True) # This makes sure no duplicates!
     password_hash = Column(String(200)) # We store password safely
     email = Column(String(100), unique=True)
+    username_key = Column(String(50))  # normalize(username) - casefolded in Python, SQL lower() can't match it
+    email_key = Column(String(100))    # normalize(email)
     verified = Column(Boolean, default=False)
     created_at = Column(DateTime, default=datetime.utcnow)
 
 class VerificationCode(Base):
     __tablename__ = 'verification_codes'
+    __table_args__ = (
+        # verify: email + hash lookup (and delete-by-email uses the prefix)
+        Index('ix_verification_codes_email_hash', 'email', 'code_hash'),
+        # purge: range scan over what has expired
+        Index('ix_verification_codes_expires_at', 'expires_at'),
+    )
     
     id = Column(Integer, primary_key=True)
     email = Column(String(100))
-    code = Column(String(10))
+    code = Column(String(10))  # Legacy plaintext codes - new ones only store code_hash
+    code_hash = Column(String(64))  # See verification_codes.py
     created_at = Column(DateTime, default=datetime.utcnow)
+    expires_at = Column(DateTime)  # Set to now once used, so purge only looks at this
+    email_status = Column(String(10))  # "sent"/"failed" once the code email is done - read by every worker
     used = Column(Boolean, default=False)
 
 # Create the database (like building the filing cabinet)
@@ -37,6 +56,70 @@ if DATABASE_URL.startswith('sqlite:///') and not DATABASE_URL.startswith('sqlite
     # Make sure SQLite file is in a writable directory
     DATABASE_URL = 'sqlite:////tmp/glow_app.db'
 
-engine = create_engine(DATABASE_URL)
-Base.metadata.create_all(engine)
-SessionLocal = sessionmaker(bind=engine)
\ No newline at end of file
+_engine = None
+_engine_lock = threading.Lock()
+
+def _instrument(engine):
+    """Time every statement (the app DB is SQLite locally, so it shares the metric)"""
+    @event.listens_for(engine, "before_cursor_execute")
+    def _start_timer(conn, cursor, statement, parameters, context, executemany):
+        context._glow_query_start = time.perf_counter()
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _observe_query(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - context._glow_query_start
+        op = "read" if statement.lstrip()[:6].upper() == "SELECT" else "write"
+        SQLITE_SECONDS.labels("app", op).observe(elapsed)
+
+def migrate_schema(engine):
+    """Bring tables that already exist up to the models: add missing columns
+    (nullable, no default) and create missing indexes. create_all() only
+    creates whole tables, so without this older databases never get new
+    columns. Safe to run on every start."""
+    inspector = inspect(engine)
+    added = []
+    with engine.begin() as conn:
+        for table in Base.metadata.sorted_tables:
+            if not inspector.has_table(table.name):
+                continue
+            existing = {column['name'] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name not in existing:
+                    column_type = column.type.compile(dialect=engine.dialect)
+                    conn.execute(text(f'ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}'))
+                    added.append(f'{table.name}.{column.name}')
+        for table in Base.metadata.sorted_tables:
+            for index in table.indexes:
+                index.create(conn, checkfirst=True)
+    return added
+
+def get_engine():
+    """The app DB engine, connected and with its tables created/migrated on
+    first use rather than at import - a DB that's down or slow then fails a
+    request instead of the whole boot"""
+    global _engine
+    if _engine is None:
+        with _engine_lock:
+            if _engine is None:
+                engine = create_engine(DATABASE_URL)
+                _instrument(engine)
+                Base.metadata.create_all(engine)
+                migrate_schema(engine)
+                SessionLocal.configure(bind=engine)
+                _engine = engine
+    return _engine
+
+class _LazySessionmaker(sessionmaker):
+    """sessionmaker that sets up the engine the first time a session is made"""
+
+    def __call__(self, **local_kw):
+        get_engine()
+        return super().__call__(**local_kw)
+
+SessionLocal = _LazySessionmaker()
+
+def __getattr__(name):
+    # `from database import engine` keeps working, lazily
+    if name == "engine":
+        return get_engine()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
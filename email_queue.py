@@ -0,0 +1,250 @@
+# email_queue.py - Send emails off the request path over a reused SMTP connection
+import heapq
+import itertools
+import os
+import queue
+import smtplib
+import ssl
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+from glow_logging import get_logger
+from metrics import EMAIL_QUEUE_DEPTH, SMTP_SECONDS
+
+log = get_logger(__name__)
+
+
+class EmailDispatcher:
+    """Background sender for outgoing email.
+
+    submit() queues a message and returns a job id at once; a worker thread
+    sends it over an SMTP connection it keeps logged in between emails
+    (reconnecting when the server has dropped it or it sat idle for longer
+    than `idle_timeout`). Failed sends are retried with exponential backoff,
+    `max_attempts` times in total. Delivery status is kept per job and per
+    recipient address in this process; pass submit() an `on_done` callback
+    to record the final status somewhere other processes can see it.
+    """
+
+    _STOP = object()
+
+    def __init__(self, host, port, username=None, password=None, starttls=True,
+                 max_attempts=4, backoff=2.0, idle_timeout=60, timeout=20, max_jobs=10000):
+        self.host = host
+        self.port = port
+        self.username = username
+        self.password = password
+        self.starttls = starttls
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.idle_timeout = idle_timeout
+        self.timeout = timeout
+        self.max_jobs = max_jobs
+
+        self._queue = queue.Queue()
+        self._retries = []  # heap of (due, seq, job) waiting out their backoff
+        self._seq = itertools.count()
+        self._jobs = OrderedDict()  # job id -> status dict, oldest first
+        self._latest = {}           # recipient -> latest job id
+        self._lock = threading.Lock()
+        self._done = threading.Condition(self._lock)
+
+        self._server = None
+        self._last_used = 0.0
+        self._thread = threading.Thread(target=self._run, name="email-dispatcher", daemon=True)
+        self._thread.start()
+
+    @classmethod
+    def from_env(cls):
+        """Dispatcher for GLOW_SMTP_HOST/PORT (Gmail by default) logged in as
+        GLOW_EMAIL. GLOW_SMTP_STARTTLS=0 for a plain local stand-in such as
+        fake_smtp_server.py."""
+        return cls(
+            host=os.getenv("GLOW_SMTP_HOST", "smtp.gmail.com"),
+            port=int(os.getenv("GLOW_SMTP_PORT", 587)),
+            username=_clean(os.getenv("GLOW_EMAIL")),
+            password=_clean(os.getenv("GLOW_EMAIL_PASSWORD")),
+            starttls=os.getenv("GLOW_SMTP_STARTTLS", "1").lower() not in ("0", "false", "no", "off"),
+            max_attempts=int(os.getenv("GLOW_SMTP_MAX_ATTEMPTS", 4))
+        )
+
+    def submit(self, to_email, message, on_done=None):
+        """Queue an email.message.Message for to_email; returns the job id.
+        on_done(status) is called from the sender thread once the email is
+        "sent" or has "failed" for good."""
+        job_id = uuid.uuid4().hex
+        with self._lock:
+            self._jobs[job_id] = {"status": "queued", "to": to_email, "attempts": 0, "error": None}
+            self._latest[to_email] = job_id
+            while len(self._jobs) > self.max_jobs:
+                _, old = self._jobs.popitem(last=False)
+                if self._latest.get(old["to"]) not in self._jobs:
+                    self._latest.pop(old["to"], None)
+        self._queue.put({"id": job_id, "to": to_email, "message": message, "attempt": 0, "on_done": on_done})
+        EMAIL_QUEUE_DEPTH.inc()
+        return job_id
+
+    def status(self, job_id):
+        """"queued", "sending", "retrying", "sent" or "failed"; None if unknown"""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return job["status"] if job else None
+
+    def status_for(self, to_email):
+        """Status of the latest email to this address (None if none was sent
+        from this process)"""
+        with self._lock:
+            job = self._jobs.get(self._latest.get(to_email))
+            return job["status"] if job else None
+
+    def wait(self, job_id, timeout=None):
+        """Block until the job is sent or has failed; returns its status"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._done:
+            while self._jobs.get(job_id, {}).get("status") not in ("sent", "failed", None):
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    break
+                self._done.wait(remaining)
+            job = self._jobs.get(job_id)
+            return job["status"] if job else None
+
+    def close(self):
+        """Stop after the queued emails (pending retries are dropped)"""
+        self._queue.put(self._STOP)
+        self._thread.join()
+
+    def _set_status(self, job, status, error=None):
+        with self._done:
+            entry = self._jobs.get(job["id"])
+            if entry is not None:
+                entry.update(status=status, attempts=job["attempt"], error=error)
+            self._done.notify_all()
+
+    def _next_job(self):
+        """Next email to send: a retry whose backoff is over, else the queue"""
+        now = time.monotonic()
+        if self._retries and self._retries[0][0] <= now:
+            return heapq.heappop(self._retries)[2]
+        wait = min(self._retries[0][0] - now, 1.0) if self._retries else 1.0
+        try:
+            return self._queue.get(timeout=wait)
+        except queue.Empty:
+            self._disconnect_if_idle()
+            return None
+
+    def _run(self):
+        while True:
+            job = self._next_job()
+            if job is self._STOP:
+                break
+            if job is not None:
+                self._deliver(job)
+        self._disconnect()
+
+    def _deliver(self, job):
+        job["attempt"] += 1
+        self._set_status(job, "sending")
+        start = time.perf_counter()
+        try:
+            self._send(job["to"], job["message"])
+        except Exception as e:
+            SMTP_SECONDS.labels("failed").observe(time.perf_counter() - start)
+            self._recover(e)
+            if _is_transient(e) and job["attempt"] < self.max_attempts:
+                delay = self.backoff * 2 ** (job["attempt"] - 1)
+                log.warning("email_retry", attempt=job["attempt"], delay=delay, error=str(e))
+                self._set_status(job, "retrying", str(e))
+                heapq.heappush(self._retries, (time.monotonic() + delay, next(self._seq), job))
+                return
+            log.error("email_failed", attempts=job["attempt"], error=str(e))
+            self._finish(job, "failed", str(e))
+        else:
+            SMTP_SECONDS.labels("sent").observe(time.perf_counter() - start)
+            self._finish(job, "sent")
+        EMAIL_QUEUE_DEPTH.dec()
+
+    def _finish(self, job, status, error=None):
+        self._set_status(job, status, error)
+        if job["on_done"] is not None:
+            try:
+                job["on_done"](status)
+            except Exception:
+                log.exception("email_on_done_failed", status=status)
+
+    def _send(self, to_email, message):
+        if self._server is not None:
+            try:
+                self._server.send_message(message, self.username or message["From"], [to_email])
+                self._last_used = time.monotonic()
+                return
+            except smtplib.SMTPServerDisconnected:
+                # The server closed the connection we kept - not this email's fault
+                self._disconnect()
+        self._connect()
+        self._server.send_message(message, self.username or message["From"], [to_email])
+        self._last_used = time.monotonic()
+
+    def _connect(self):
+        server = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+        try:
+            if self.starttls:
+                server.starttls(context=ssl.create_default_context())
+            if self.username and self.password:
+                server.login(self.username, self.password)
+        except Exception:
+            server.close()
+            raise
+        self._server = server
+
+    def _recover(self, error):
+        """Keep the connection when only this message was refused"""
+        if self._server is not None and isinstance(error, (smtplib.SMTPResponseException, smtplib.SMTPRecipientsRefused)):
+            try:
+                self._server.rset()
+                return
+            except Exception:
+                pass
+        self._disconnect()
+
+    def _disconnect_if_idle(self):
+        if self._server is not None and time.monotonic() - self._last_used > self.idle_timeout:
+            self._disconnect()
+
+    def _disconnect(self):
+        if self._server is None:
+            return
+        try:
+            self._server.quit()
+        except Exception:
+            self._server.close()
+        self._server = None
+
+
+def _is_transient(error):
+    """Worth another try: the network or server hiccuped (4xx). A 5xx answer -
+    bad recipient, rejected login or message - fails the email straight away."""
+    if isinstance(error, smtplib.SMTPRecipientsRefused):
+        return all(code < 500 for code, _ in error.recipients.values())
+    if isinstance(error, smtplib.SMTPResponseException):
+        return error.smtp_code < 500
+    return isinstance(error, OSError)  # Includes the other SMTPExceptions
+
+
+def _clean(value):
+    """Credentials pasted with non-breaking spaces still work"""
+    return value.replace('\xa0', '').strip() if value else value
+
+
+_dispatcher = None
+_dispatcher_lock = threading.Lock()
+
+def get_dispatcher():
+    """Process-wide EmailDispatcher, started on first use"""
+    global _dispatcher
+    with _dispatcher_lock:
+        if _dispatcher is None:
+            _dispatcher = EmailDispatcher.from_env()
+        return _dispatcher
@@ -0,0 +1,151 @@
+# embedding_cache.py - Don't pay for the same embedding twice
+import hashlib
+import re
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+
+from embedding_codec import encode_embedding, decode_embedding
+
+SELECT_BATCH = 500  # Stay well under SQLite's bound-parameter limit
+
+
+def normalize_text(text):
+    """Collapse differences that don't change what a text means for matching:
+    unicode forms, letter case and runs of whitespace"""
+    text = unicodedata.normalize('NFKC', text).casefold()
+    return re.sub(r'\s+', ' ', text).strip()
+
+
+def cache_key(model, dimensions, text):
+    """Content address of an embedding request"""
+    payload = f"{model}\x00{dimensions or ''}\x00{normalize_text(text)}"
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class EmbeddingCache:
+    """Two-tier embedding cache: a bounded in-process LRU in front of a
+    persistent SQLite table, both evicting least recently used entries.
+
+    Keys come from cache_key(), so identical or near-identical texts (same
+    text after normalize_text) share one entry and survive restarts.
+    """
+
+    def __init__(self, db, max_memory_entries=10000, max_disk_entries=200000):
+        self.db = db  # SQLitePool
+        self.max_memory_entries = max_memory_entries
+        self.max_disk_entries = max_disk_entries
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self.counters = {
+            "memory_hits": 0,
+            "disk_hits": 0,
+            "misses": 0,
+            "memory_evictions": 0,
+            "disk_evictions": 0
+        }
+        self.setup_database()
+
+    def setup_database(self):
+        with self.db.transaction() as conn:
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS embedding_cache (
+                    key TEXT PRIMARY KEY,  -- sha256 of model, dimensions, normalized text
+                    embedding BLOB,
+                    last_used REAL
+                )
+            ''')
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_embedding_cache_last_used ON embedding_cache (last_used)')
+            # Upper bound on rows; only recounted when it says we might be over the cap
+            self._disk_entries = conn.execute('SELECT COUNT(*) FROM embedding_cache').fetchone()[0]
+
+    def _remember(self, key, vector):
+        """Put an entry in the memory tier (caller holds the lock)"""
+        self._memory[key] = vector
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_memory_entries:
+            self._memory.popitem(last=False)
+            self.counters["memory_evictions"] += 1
+
+    def get(self, key):
+        """Cached vector for key, or None"""
+        return self.get_many([key]).get(key)
+
+    def put(self, key, vector):
+        """Cache vector under key; returns it as a read-only float32 array"""
+        return self.put_many([(key, vector)])[key]
+
+    def get_many(self, keys):
+        """{key: vector} for every key that's cached"""
+        found = {}
+        with self._lock:
+            for key in keys:
+                vector = self._memory.get(key)
+                if vector is not None:
+                    self._memory.move_to_end(key)
+                    found[key] = vector
+            self.counters["memory_hits"] += len(found)
+
+        remaining = list({key for key in keys if key not in found})
+        disk_rows = []
+        if remaining:
+            with self.db.transaction() as conn:
+                for start in range(0, len(remaining), SELECT_BATCH):
+                    batch = remaining[start:start + SELECT_BATCH]
+                    placeholders = ','.join('?' * len(batch))
+                    disk_rows += conn.execute(
+                        f'SELECT key, embedding FROM embedding_cache WHERE key IN ({placeholders})', batch
+                    ).fetchall()
+                if disk_rows:
+                    now = time.time()
+                    conn.executemany('UPDATE embedding_cache SET last_used = ? WHERE key = ?',
+                                     [(now, key) for key, _ in disk_rows])
+
+        with self._lock:
+            for key, blob in disk_rows:
+                found[key] = decode_embedding(blob)
+                self._remember(key, found[key])
+            self.counters["disk_hits"] += len(disk_rows)
+            self.counters["misses"] += len(remaining) - len(disk_rows)
+        return found
+
+    def put_many(self, items):
+        """Store (key, vector) pairs in one transaction; returns {key: vector}"""
+        stored = {key: decode_embedding(encode_embedding(vector)) for key, vector in items}
+        with self._lock:
+            for key, vector in stored.items():
+                self._remember(key, vector)
+
+        now = time.time()
+        with self.db.transaction() as conn:
+            conn.executemany('''
+                INSERT OR REPLACE INTO embedding_cache (key, embedding, last_used)
+                VALUES (?, ?, ?)
+            ''', [(key, encode_embedding(vector), now) for key, vector in stored.items()])
+            self._disk_entries += len(stored)
+            if self._disk_entries > self.max_disk_entries:
+                self._trim_disk(conn)
+        return stored
+
+    def _trim_disk(self, conn):
+        """Drop the least recently used rows once the table is over its cap"""
+        self._disk_entries = conn.execute('SELECT COUNT(*) FROM embedding_cache').fetchone()[0]
+        excess = self._disk_entries - self.max_disk_entries
+        if excess > 0:
+            conn.execute('''
+                DELETE FROM embedding_cache WHERE key IN (
+                    SELECT key FROM embedding_cache ORDER BY last_used LIMIT ?
+                )
+            ''', (excess,))
+            self._disk_entries -= excess
+            with self._lock:
+                self.counters["disk_evictions"] += excess
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self.counters)
+            stats["memory_entries"] = len(self._memory)
+        lookups = stats["memory_hits"] + stats["disk_hits"] + stats["misses"]
+        stats["hit_rate"] = (stats["memory_hits"] + stats["disk_hits"]) / lookups if lookups else 0.0
+        return stats
@@ -0,0 +1,41 @@
+# embedding_codec.py - Compact binary format for stored embeddings
+import json
+import struct
+
+import numpy as np
+
+# Embeddings are stored as BLOBs: an 8-byte header (magic, format version,
+# dtype code, dimension) followed by the raw little-endian vector. The header
+# keeps the data 8-byte aligned so np.frombuffer can view it without copying.
+EMBEDDING_HEADER = struct.Struct('<2sBBI')
+EMBEDDING_MAGIC = b'GE'
+EMBEDDING_VERSION = 1
+EMBEDDING_DTYPES = {1: np.dtype('<f4'), 2: np.dtype('<f2'), 3: np.dtype('i1')}
+EMBEDDING_DTYPE_CODES = {dtype: code for code, dtype in EMBEDDING_DTYPES.items()}
+
+def encode_embedding(vector, dtype='<f4'):
+    """Pack a vector into the binary embedding format"""
+    vector = np.asarray(vector, dtype=dtype)
+    header = EMBEDDING_HEADER.pack(EMBEDDING_MAGIC, EMBEDDING_VERSION,
+                                   EMBEDDING_DTYPE_CODES[vector.dtype], vector.shape[0])
+    return header + vector.tobytes()
+
+def decode_embedding(value):
+    """Read-only view of a stored embedding.
+
+    Rows that haven't been migrated yet still hold JSON text; those are parsed
+    the slow way so the service keeps working during a migration.
+    """
+    if isinstance(value, str):
+        return np.array(json.loads(value), dtype=np.float32)
+    magic, version, dtype_code, dimension = EMBEDDING_HEADER.unpack_from(value)
+    if magic != EMBEDDING_MAGIC or version != EMBEDDING_VERSION:
+        raise ValueError("Not a stored embedding")
+    return np.frombuffer(value, dtype=EMBEDDING_DTYPES[dtype_code],
+                         count=dimension, offset=EMBEDDING_HEADER.size)
+
+def normalize_rows(matrix):
+    """L2-normalize each row so a dot product is the cosine similarity"""
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
@@ -1,242 +1,712 @@
 # embedding_service.py - Fast vector matching for dating
 import openai
 import numpy as np
-from sklearn.metrics.pairwise import cosine_similarity
 import json
 import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
+from itertools import islice
 import os
 from dotenv import load_dotenv
+from ann_index import IVFIndex
+from embedding_codec import encode_embedding, decode_embedding, normalize_rows
+from embedding_cache import EmbeddingCache, cache_key
+from glow_logging import get_logger
+from metrics import EMBEDDING_SECONDS
+from precomputed_matches import PrecomputedMatches
+from profile_import import read_profiles
+from quantization import quantize, dequantize, quantized_scores
+from sqlite_pool import SQLitePool
+from write_behind import WriteBehindQueue
+
+log = get_logger(__name__)
 
 load_dotenv()
 openai.api_key = os.getenv("OPENAI_API_KEY")
 
+DATING_DB_PATH = os.getenv("DATING_DB_PATH", "dating_embeddings.db")
+SEED_PROFILES_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'seed_profiles.jsonl')
+
+# Hot-path statements, kept as constants so each pooled connection prepares them once
+INSERT_CONVERSATION_SQL = 'INSERT INTO girl_conversations (vent_text, embedding) VALUES (?, ?)'
+SELECT_NEW_PROFILES_SQL = 'SELECT id, name, embedding, profile_data FROM guy_profiles WHERE id > ? ORDER BY id'
+MAX_PROFILE_ID_SQL = 'SELECT MAX(id) FROM guy_profiles'
+
+# OpenAI's per-request limits for the embeddings endpoint: 2048 inputs and
+# ~300k tokens. Tokens are estimated at 4 characters each, with headroom.
+MAX_BATCH_INPUTS = 2048
+MAX_BATCH_CHARS = 800000
+
+# Tables whose stored embeddings reembed() rewrites, with the column embedded
+EMBEDDED_TABLES = (('guy_profiles', 'description'), ('girl_conversations', 'vent_text'))
+
+def _env_int(name):
+    value = os.getenv(name)
+    return int(value) if value else None
+
+def _chunked(iterable, size):
+    iterator = iter(iterable)
+    while chunk := list(islice(iterator, size)):
+        yield chunk
+
+def _batches(texts, batch_size, max_chars=MAX_BATCH_CHARS):
+    """Split texts into request-sized batches, capped by count and length"""
+    batch, chars = [], 0
+    for text in texts:
+        if batch and (len(batch) >= batch_size or chars + len(text) > max_chars):
+            yield batch
+            batch, chars = [], 0
+        batch.append(text)
+        chars += len(text)
+    if batch:
+        yield batch
+
+def migrate_embeddings_to_blob(db_path=DATING_DB_PATH, batch_size=1000):
+    """Convert JSON-text embeddings to the binary format, in place.
+
+    Safe to re-run: only rows still stored as text are touched. Returns the
+    number of rows converted per table.
+    """
+    conn = sqlite3.connect(db_path)
+    cursor = conn.cursor()
+    converted = {}
+    
+    for table in ('girl_conversations', 'guy_profiles'):
+        converted[table] = 0
+        while True:
+            cursor.execute(f'''
+                SELECT id, embedding FROM {table}
+                WHERE typeof(embedding) = 'text' LIMIT ?
+            ''', (batch_size,))
+            rows = cursor.fetchall()
+            if not rows:
+                break
+            cursor.executemany(f'UPDATE {table} SET embedding = ? WHERE id = ?', [
+                (encode_embedding(json.loads(embedding)), row_id) for row_id, embedding in rows
+            ])
+            conn.commit()
+            converted[table] += len(rows)
+    
+    # Give the space freed by the text encoding back to the filesystem
+    conn.execute('VACUUM')
+    conn.close()
+    return converted
+
+def top_rows(scores, k):
+    """Positions and values of the k highest scores, best first"""
+    k = min(k, len(scores))
+    if k < len(scores):
+        top = np.argpartition(scores, -k)[-k:]
+    else:
+        top = np.arange(len(scores))
+    top = top[np.argsort(-scores[top])]
+    return top, scores[top]
+
+def top_rows_per_query(scores, k):
+    """top_rows for each row of a (queries, profiles) score matrix: (positions,
+    values), both (queries, k), best first"""
+    k = min(k, scores.shape[1])
+    if k < scores.shape[1]:
+        top = np.argpartition(scores, -k, axis=1)[:, -k:]
+    else:
+        top = np.broadcast_to(np.arange(scores.shape[1]), scores.shape).copy()
+    values = np.take_along_axis(scores, top, axis=1)
+    order = np.argsort(-values, axis=1)
+    return np.take_along_axis(top, order, axis=1), np.take_along_axis(values, order, axis=1)
+
+class ProfileIndex:
+    """Immutable snapshot of every guy profile, ready for vectorized scoring"""
+
+    def __init__(self, ids, matrix, profiles, scales=None, storage='float32', dimensions=None):
+        self.ids = ids            # int64 row ids from guy_profiles
+        self.matrix = matrix      # contiguous, one unit-length row per profile, in `storage` dtype
+        self.scales = scales      # per-row scales for int8 storage, else None
+        self.profiles = profiles  # (name, profile dict) per row
+        self.storage = storage
+        self.dimensions = dimensions  # leading dims kept per row, None for all
+
+    @classmethod
+    def empty(cls, storage='float32', dimensions=None):
+        data, scales = quantize(np.empty((0, 0), dtype=np.float32), storage)
+        return cls(np.empty(0, dtype=np.int64), data, [], scales, storage, dimensions)
+
+    @property
+    def exact(self):
+        """False when scores are only approximate and need a full-vector rescore"""
+        return self.storage == 'float32' and self.dimensions is None
+
+    def project(self, vectors):
+        """Vectors as this index stores them: cut to the leading `dimensions`
+        and renormalized (text-embedding-3 vectors stay meaningful truncated)"""
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if self.dimensions is None:
+            return vectors
+        vectors = vectors[..., :self.dimensions]
+        if vectors.ndim == 1:
+            return vectors / (np.linalg.norm(vectors) or 1.0)
+        return normalize_rows(vectors).astype(np.float32, copy=False)
+
+    @property
+    def last_id(self):
+        return int(self.ids[-1]) if len(self.ids) else 0
+
+    @property
+    def bytes_per_profile(self):
+        row_bytes = self.matrix.itemsize * (self.matrix.shape[1] if self.matrix.ndim == 2 else 0)
+        return row_bytes + (self.scales.itemsize if self.scales is not None else 0)
+
+    def vectors(self, rows=slice(None)):
+        """float32 rows (approximate for float16/int8 storage)"""
+        return dequantize(self.matrix[rows], None if self.scales is None else self.scales[rows])
+
+    def extended(self, rows):
+        """New snapshot with rows of (id, name, embedding, profile_data) appended"""
+        if not rows:
+            return self
+        ids = np.fromiter((row[0] for row in rows), dtype=np.int64, count=len(rows))
+        vectors = self.project(normalize_rows(np.vstack([decode_embedding(row[2]) for row in rows]).astype(np.float32, copy=False)))
+        matrix, scales = quantize(vectors, self.storage)
+        profiles = [(row[1], json.loads(row[3])) for row in rows]
+        if len(self.ids):
+            matrix = np.vstack([self.matrix, matrix])
+            scales = None if scales is None else np.concatenate([self.scales, scales])
+            ids = np.concatenate([self.ids, ids])
+            profiles = self.profiles + profiles
+        return ProfileIndex(ids, np.ascontiguousarray(matrix), profiles, scales, self.storage, self.dimensions)
+
+    def scores(self, query):
+        """Cosine score of every profile against a (projected) unit-length query"""
+        if not len(self.ids):
+            return np.empty(0, dtype=np.float32)
+        return quantized_scores(self.matrix, self.scales, query)
+
+    def score_matrix(self, queries):
+        """(queries, profiles) cosine scores for unit-length (projected) query rows"""
+        if not len(self.ids):
+            return np.empty((len(queries), 0), dtype=np.float32)
+        return np.ascontiguousarray(quantized_scores(self.matrix, self.scales, queries.T).T)
+
+    def top_k(self, query, k):
+        """Row positions and cosine scores of the k best profiles, best first"""
+        return top_rows(self.scores(query), k)
+
+    def rows_for_ids(self, ids):
+        """Row positions of profile ids (ids are ascending), plus a mask of
+        the ids this snapshot actually has"""
+        rows = np.searchsorted(self.ids, ids)
+        found = rows < len(self.ids)
+        found[found] = self.ids[rows[found]] == ids[found]
+        return rows, found
+
+    def matches(self, rows, scores):
+        """Profile dicts for scored rows, as find_matches returns them"""
+        matches = []
+        for row, similarity in zip(rows, scores):
+            name, profile = self.profiles[row]
+            profile = dict(profile)
+            similarity = float(similarity)
+            
+            # Update compatibility score based on similarity
+            profile['compatibility_score'] = int(similarity * 100)
+            profile['name'] = name
+            profile['similarity_score'] = similarity
+            
+            matches.append(profile)
+        return matches
+
 class EmbeddingMatcher:
-    def __init__(self):
+    def __init__(self, db_path=DATING_DB_PATH, storage=None, rerank_factor=4,
+                 embedding_dimensions=None, coarse_dimensions=None):
+        # Every method borrows pooled connections instead of opening the file
+        self.db = SQLitePool(db_path)
+        
+        # Profile embeddings live in memory; the DB is only read when it changes.
+        # float16/int8 storage halves/quarters that memory, and coarse_dimensions
+        # keeps only each vector's leading dims (renormalized). Either way the
+        # shortlist of top_k * rerank_factor candidates is re-scored against
+        # the full float32 vectors stored in the DB.
+        self.storage = storage or os.getenv("GLOW_EMBEDDING_STORAGE", "float32")
+        self.coarse_dimensions = coarse_dimensions or _env_int("GLOW_COARSE_DIMENSIONS")
+        self.rerank_factor = rerank_factor
+        self.profile_index = ProfileIndex.empty(self.storage, self.coarse_dimensions)
+        self._refresh_lock = threading.Lock()
+        
+        # Optional approximate search for very large profile sets (see enable_ann)
+        self.ann_index = None
+        self.ann_index_path = os.getenv("GLOW_ANN_INDEX")
+        self.ann_nprobe = int(os.getenv("GLOW_ANN_NPROBE", 16))
+        
+        # Offline top-k per stored conversation (see precompute_matches.py)
+        self.precomputed = None
+        self.precomputed_path = os.getenv("GLOW_PRECOMPUTED_MATCHES")
+        
+        self.embedding_model = "text-embedding-3-small"  # Fastest model
+        # Shortened vectors (the model's `dimensions` parameter) for everything
+        # stored; change it on an existing DB with reembed()
+        self.embedding_dimensions = embedding_dimensions or _env_int("GLOW_EMBEDDING_DIMENSIONS")
+        self.embedding_cache = EmbeddingCache(self.db)
         self.setup_database()
         
+        # Conversations are logged in the background, off the matching path
+        self.conversation_log = WriteBehindQueue(self.db, INSERT_CONVERSATION_SQL)
+        
     def setup_database(self):
         """Create tables for conversations and guy profiles"""
-        conn = sqlite3.connect('dating_embeddings.db')
-        cursor = conn.cursor()
-        
-        # Table for girl conversations
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS girl_conversations (
-                id INTEGER PRIMARY KEY,
-                vent_text TEXT,
-                embedding TEXT,  -- JSON string of vector
-                timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
-            )
-        ''')
-        
-        # Table for guy profiles with pre-computed embeddings
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS guy_profiles (
-                id INTEGER PRIMARY KEY,
-                name TEXT,
-                description TEXT,  -- Full personality description
-                embedding TEXT,    -- JSON string of vector
-                profile_data TEXT  -- JSON string of full profile
-            )
-        ''')
-        
-        conn.commit()
-        conn.close()
+        with self.db.transaction() as conn:
+            cursor = conn.cursor()
+            
+            # Table for girl conversations
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS girl_conversations (
+                    id INTEGER PRIMARY KEY,
+                    vent_text TEXT,
+                    embedding BLOB,  -- Binary vector, see encode_embedding
+                    timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
+                )
+            ''')
+            
+            # Table for guy profiles with pre-computed embeddings
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS guy_profiles (
+                    id INTEGER PRIMARY KEY,
+                    name TEXT,
+                    description TEXT,  -- Full personality description
+                    embedding BLOB,    -- Binary vector, see encode_embedding
+                    profile_data TEXT  -- JSON string of full profile
+                )
+            ''')
         
         # Pre-populate guy profiles if empty
         self.populate_guy_profiles()
+        self.refresh_profiles(full=True)
+        if self.ann_index_path:
+            self.enable_ann(self.ann_index_path, nprobe=self.ann_nprobe)
+        if self.precomputed_path and os.path.exists(os.path.join(self.precomputed_path, 'meta.json')):
+            self.load_precomputed(self.precomputed_path)
+    
+    def load_precomputed(self, path):
+        """Serve conversation_matches from the output of a precompute run"""
+        self.precomputed = PrecomputedMatches(path)
+
+    def refresh_profiles(self, full=False):
+        """Load guy profiles into the in-memory matrix.
+
+        By default only rows added since the last refresh are read. Pass
+        full=True after editing or deleting existing profiles.
+        """
+        with self._refresh_lock:
+            index = ProfileIndex.empty(self.storage, self.coarse_dimensions) if full else self.profile_index
+
+            with self.db.connection() as conn:
+                rows = conn.execute(SELECT_NEW_PROFILES_SQL, (index.last_id,)).fetchall()
+
+            # Swap in a new snapshot; requests already scoring keep the old one
+            self.profile_index = index.extended(rows)
+            
+            if self.ann_index is not None:
+                if full:
+                    # Keep the trained cells, re-file every profile
+                    self.ann_index = IVFIndex(self.ann_index.centroids, nprobe=self.ann_index.nprobe)
+                    self.ann_index.add(self.profile_index.ids, self.profile_index.vectors())
+                elif rows:
+                    new_rows = slice(-len(rows), None)
+                    self.ann_index.add(self.profile_index.ids[new_rows], self.profile_index.vectors(new_rows))
+    
+    def enable_ann(self, path=None, nlist=None, nprobe=16, rebuild=False):
+        """Serve find_matches from an IVF index instead of a full scan.
+        
+        Loads the index saved at `path` (catching up on profiles added since)
+        or trains a new one on the current profiles and saves it there.
+        Search cost is about nprobe / nlist of the exact scan.
+        """
+        with self._refresh_lock:
+            index = self.profile_index
+            if path and not rebuild and os.path.isdir(path):
+                ann_index = IVFIndex.load(path)
+                ann_index.nprobe = nprobe
+                indexed_ids = ann_index.ids()
+                new_rows = index.ids > (indexed_ids.max() if len(indexed_ids) else 0)
+            else:
+                ann_index = IVFIndex.train(index.vectors(), nlist=nlist, nprobe=nprobe)
+                new_rows = slice(None)
+            ann_index.add(index.ids[new_rows], index.vectors(new_rows))
+            if path:
+                ann_index.save(path)
+            self.ann_index = ann_index
+
+    def _refresh_if_changed(self):
+        """Pick up newly inserted profiles (MAX(id) is a cheap index lookup)"""
+        with self.db.connection() as conn:
+            max_id = conn.execute(MAX_PROFILE_ID_SQL).fetchone()[0] or 0
+
+        if max_id > self.profile_index.last_id:
+            self.refresh_profiles()
     
     def get_embedding(self, text):
-        """Get embedding from OpenAI API - FAST!"""
+        """Get embedding for text - cached, so each distinct text hits OpenAI once"""
+        start = time.perf_counter()
+        key = cache_key(self.embedding_model, self.embedding_dimensions, text)
+        embedding = self.embedding_cache.get(key)
+        if embedding is not None:
+            EMBEDDING_SECONDS.labels("cache").observe(time.perf_counter() - start)
+            return embedding
+        
+        try:
+            options = {"dimensions": self.embedding_dimensions} if self.embedding_dimensions else {}
+            response = openai.embeddings.create(
+                model=self.embedding_model,
+                input=text,
+                **options
+            )
+            embedding = self.embedding_cache.put(key, response.data[0].embedding)
+            EMBEDDING_SECONDS.labels("api").observe(time.perf_counter() - start)
+            return embedding
+        except Exception as e:
+            EMBEDDING_SECONDS.labels("error").observe(time.perf_counter() - start)
+            log.error("embedding_error", error=str(e))
+            return None
+    
+    def get_embeddings(self, texts, batch_size=512, concurrency=4):
+        """Embeddings for many texts at once, in the same order (None on failure).
+        
+        Cached texts are served from the cache; the rest are de-duplicated and
+        sent in size-capped batches with at most `concurrency` requests in
+        flight.
+        """
+        keys = [cache_key(self.embedding_model, self.embedding_dimensions, text) for text in texts]
+        found = self.embedding_cache.get_many(keys)
+        
+        missing = {}
+        for key, text in zip(keys, texts):
+            if key not in found:
+                missing.setdefault(key, text)
+        
+        batches = list(_batches(list(missing.values()), min(batch_size, MAX_BATCH_INPUTS)))
+        with ThreadPoolExecutor(max_workers=max(1, concurrency)) as pool:
+            for batch, embeddings in zip(batches, pool.map(self._embed_batch, batches)):
+                if embeddings is None:
+                    continue
+                batch_keys = [cache_key(self.embedding_model, self.embedding_dimensions, text) for text in batch]
+                found.update(self.embedding_cache.put_many(zip(batch_keys, embeddings)))
+        
+        return [found.get(key) for key in keys]
+    
+    def _embed_batch(self, texts):
+        """One embeddings request for a list of texts"""
+        start = time.perf_counter()
         try:
+            options = {"dimensions": self.embedding_dimensions} if self.embedding_dimensions else {}
             response = openai.embeddings.create(
-                model="text-embedding-3-small",  # Fastest model
-                input=text
+                model=self.embedding_model,
+                input=texts,
+                **options
             )
-            return response.data[0].embedding
+            EMBEDDING_SECONDS.labels("batch").observe(time.perf_counter() - start)
+            return [item.embedding for item in sorted(response.data, key=lambda item: item.index)]
         except Exception as e:
-            print(f"Embedding error: {e}")
+            EMBEDDING_SECONDS.labels("error").observe(time.perf_counter() - start)
+            log.error("embedding_batch_error", texts=len(texts), error=str(e))
             return None
     
     def save_girl_conversation(self, vent_text):
         """Save girl's venting and create embedding"""
         # Get embedding
         embedding = self.get_embedding(vent_text)
-        if not embedding:
+        if embedding is None:
             return None
             
         # Save to database
-        conn = sqlite3.connect('dating_embeddings.db')
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-            INSERT INTO girl_conversations (vent_text, embedding)
-            VALUES (?, ?)
-        ''', (vent_text, json.dumps(embedding)))
-        
-        conversation_id = cursor.lastrowid
-        conn.commit()
-        conn.close()
+        with self.db.transaction() as conn:
+            cursor = conn.execute(INSERT_CONVERSATION_SQL, (vent_text, encode_embedding(embedding)))
+            conversation_id = cursor.lastrowid
         
         return conversation_id
     
     def populate_guy_profiles(self):
         """Pre-populate guy profiles with embeddings"""
-        conn = sqlite3.connect('dating_embeddings.db')
-        cursor = conn.cursor()
-        
         # Check if already populated
-        cursor.execute('SELECT COUNT(*) FROM guy_profiles')
-        if cursor.fetchone()[0] > 0:
-            conn.close()
+        with self.db.connection() as conn:
+            populated = conn.execute('SELECT COUNT(*) FROM guy_profiles').fetchone()[0] > 0
+        if populated:
             return
         
-        guys = [
-            {
-                "name": "Adrian",
-                "description": "UX Designer and barista who loves coffee culture, gentle and nurturing personality, understands busy schedules from hackathons and studying, creative problem solver, brings aesthetic coffee during late night work sessions, emotionally supportive but gives space for independence, soft spoken with feminine energy, values work-life balance",
-                "profile": {
-                    "age": 24,
-                    "occupation": "UX Designer & Part-time Barista",
-                    "personality": "Soft-spoken creative with a nurturing side",
-                    "traits": ["Gentle", "Creative", "Understanding", "Feminine energy"],
-                    "compatibility_score": 94,
-                    "emoji": "☕️"
-                }
-            },
-            {
-                "name": "Marcus",
-                "description": "Software engineer and yoga instructor, tech-savvy with zen mindful energy, understands coding and development work, provides calming presence after stressful days, debugging partner and massage therapist, balanced masculine and feminine energy, career focused but wellness oriented",
-                "profile": {
-                    "age": 26,
-                    "occupation": "Software Engineer & Yoga Instructor", 
-                    "personality": "Tech-savvy with a zen, caring nature",
-                    "traits": ["Intelligent", "Calm", "Supportive", "Tech-savvy"],
-                    "compatibility_score": 92,
-                    "emoji": "🧘‍♂️"
-                }
-            },
-            {
-                "name": "Jamie",
-                "description": "Art student and plant parent, artistic soul with nurturing gentle spirit, soft boy aesthetic with caring heart, creates peaceful plant-filled spaces, intuitive about mental health needs, prefers slower pace than career driven lifestyle, values emotional connection over ambition",
-                "profile": {
-                    "age": 23,
-                    "occupation": "Art Student & Plant Parent",
-                    "personality": "Artistic soul with a nurturing, gentle spirit", 
-                    "traits": ["Artistic", "Nurturing", "Gentle", "Intuitive"],
-                    "compatibility_score": 88,
-                    "emoji": "🌱"
-                }
-            },
-            {
-                "name": "Kai",
-                "description": "Product manager and weekend chef, organized achiever with soft caring side, matches ambition but provides balance, meal prepping supportive partner, celebrates wins with homemade treats, career focused with work-life balance, understanding of busy schedules",
-                "profile": {
-                    "age": 25,
-                    "occupation": "Product Manager & Weekend Chef",
-                    "personality": "Organized achiever with a soft, caring side",
-                    "traits": ["Ambitious", "Caring", "Organized", "Supportive"],
-                    "compatibility_score": 90,
-                    "emoji": "👨‍🍳"
-                }
-            },
-            {
-                "name": "River",
-                "description": "Music producer and vintage collector, creative dreamer with old soul and gentle heart, soft indie boy vibe with caring energy, creates playlists for study sessions, calms stressed minds through music, artistic muse and emotional support, flexible creative schedule",
-                "profile": {
-                    "age": 22,
-                    "occupation": "Music Producer & Vintage Collector",
-                    "personality": "Creative dreamer with an old soul and gentle heart",
-                    "traits": ["Creative", "Gentle", "Artistic", "Empathetic"],
-                    "compatibility_score": 86,
-                    "emoji": "🎵"
-                }
-            },
-            {
-                "name": "Elliot",
-                "description": "Therapist and weekend photographer, emotionally intelligent with calming presence, trained to understand and support others, gentle feminine energy with emotional intelligence, handles independent personalities perfectly, values deep connections and mental health, professional helper",
-                "profile": {
-                    "age": 27,
-                    "occupation": "Therapist & Weekend Photographer",
-                    "personality": "Emotionally intelligent with a calming presence",
-                    "traits": ["Emotionally intelligent", "Supportive", "Gentle", "Understanding"],
-                    "compatibility_score": 95,
-                    "emoji": "📸"
-                }
-            },
-            {
-                "name": "Arjun",
-                "description": "Traditional alpha male bodybuilder and crypto bro, extremely masculine dominant personality, expects women to be submissive and traditional, obsessed with gym culture and protein shakes, dismissive of independent career women, believes men should lead relationships, toxic masculinity energy, hates when women are busy with work, wants traditional housewife who cooks and cleans, aggressive competitive nature, zero emotional intelligence, thinks femininity in men is weakness",
-                "profile": {
-                    "age": 28,
-                    "occupation": "Personal Trainer & Crypto Investor",
-                    "personality": "Ultra-masculine alpha male with traditional views",
-                    "traits": ["Dominant", "Traditional", "Aggressive", "Inflexible"],
-                    "compatibility_score": 5,
-                    "emoji": "💪"
-                }
-            }
-        ]
-        
-        # Create embeddings for each guy
-        for guy in guys:
-            embedding = self.get_embedding(guy["description"])
-            if embedding:
-                cursor.execute('''
+        self.import_profiles(read_profiles(SEED_PROFILES_PATH))
+        log.info("seed_profiles_populated")
+    
+    def import_profiles(self, profiles, chunk_size=4096, batch_size=512, concurrency=4):
+        """Embed and insert profiles ({"name", "description", "profile"} dicts).
+        
+        Profiles are handled chunk_size at a time: the chunk's descriptions are
+        embedded in batched, concurrent requests, then the chunk is inserted in
+        one executemany transaction. Returns counts of imported/failed rows.
+        """
+        result = {"imported": 0, "failed": 0}
+        for chunk in _chunked(profiles, chunk_size):
+            # Embed before opening the write transaction - the embedding cache
+            # writes to the same database
+            embeddings = self.get_embeddings(
+                [guy["description"] for guy in chunk],
+                batch_size=batch_size,
+                concurrency=concurrency
+            )
+            rows = [
+                (guy["name"], guy["description"], encode_embedding(embedding), json.dumps(guy["profile"]))
+                for guy, embedding in zip(chunk, embeddings) if embedding is not None
+            ]
+            
+            with self.db.transaction() as conn:
+                conn.executemany('''
                     INSERT INTO guy_profiles (name, description, embedding, profile_data)
                     VALUES (?, ?, ?, ?)
-                ''', (
-                    guy["name"],
-                    guy["description"], 
-                    json.dumps(embedding),
-                    json.dumps(guy["profile"])
-                ))
+                ''', rows)
+            
+            result["imported"] += len(rows)
+            result["failed"] += len(chunk) - len(rows)
+        
+        self.refresh_profiles()
+        return result
+    
+    def reembed(self, dimensions, chunk_size=4096, batch_size=512, concurrency=4):
+        """Re-embed every stored profile and conversation at `dimensions`
+        (None for the model default), then reload the profile matrix.
+        
+        Rows are rewritten chunk_size at a time in id order. Until the job
+        finishes a live matcher's re-rank skips rows still at the old size,
+        so run it off-peak or against a copy. Returns updated/failed counts
+        per table.
+        """
+        self.conversation_log.flush()
+        self.embedding_dimensions = dimensions
+        result = {}
+        for table, column in EMBEDDED_TABLES:
+            counts = {"updated": 0, "failed": 0}
+            last_id = 0
+            while True:
+                with self.db.connection() as conn:
+                    rows = conn.execute(
+                        f'SELECT id, {column} FROM {table} WHERE id > ? ORDER BY id LIMIT ?',
+                        (last_id, chunk_size)
+                    ).fetchall()
+                if not rows:
+                    break
+                last_id = rows[-1][0]
+                
+                # Blank text can't be embedded (and would fail its whole batch)
+                rows = [row for row in rows if row[1]]
+                embeddings = self.get_embeddings([row[1] for row in rows], batch_size=batch_size, concurrency=concurrency)
+                updates = [
+                    (encode_embedding(embedding), row[0])
+                    for row, embedding in zip(rows, embeddings) if embedding is not None
+                ]
+                with self.db.transaction() as conn:
+                    conn.executemany(f'UPDATE {table} SET embedding = ? WHERE id = ?', updates)
+                
+                counts["updated"] += len(updates)
+                counts["failed"] += len(rows) - len(updates)
+            result[table] = counts
         
-        conn.commit()
-        conn.close()
-        print("✅ Guy profiles populated with embeddings!")
+        # The ANN cells were trained on the old vectors, so retrain them
+        ann_index, self.ann_index = self.ann_index, None
+        self.refresh_profiles(full=True)
+        if ann_index is not None:
+            self.enable_ann(self.ann_index_path, nprobe=ann_index.nprobe, rebuild=True)
+        return result
+    
+    def ranking_quality(self, sample_size=100, top_k=6, chunk_size=65536):
+        """How much of the exact top-k find_matches returns, for a random
+        sample of stored conversations.
+        
+        Exact means brute force over the full stored float32 vectors, streamed
+        from the DB chunk_size rows at a time - an offline check, too slow for
+        the request path. Use it to pick coarse_dimensions, storage and
+        rerank_factor.
+        """
+        index = self.profile_index
+        with self.db.connection() as conn:
+            queries = [
+                decode_embedding(row[0]) for row in conn.execute(
+                    'SELECT embedding FROM girl_conversations ORDER BY RANDOM() LIMIT ?', (sample_size,)
+                )
+            ]
+        dim = len(queries[0]) if queries else 0
+        queries = [query for query in queries if len(query) == dim]
+        if not queries or not len(index.ids):
+            return {"queries": 0, "overlap": None}
+        queries = normalize_rows(np.vstack(queries).astype(np.float32))
+        
+        # Running exact top-k per query, merged chunk by chunk
+        best_ids = np.empty((len(queries), 0), dtype=np.int64)
+        best_scores = np.empty((len(queries), 0), dtype=np.float32)
+        with self.db.connection() as conn:
+            cursor = conn.execute('SELECT id, embedding FROM guy_profiles WHERE id <= ? ORDER BY id', (index.last_id,))
+            while rows := cursor.fetchmany(chunk_size):
+                rows = [(row[0], decode_embedding(row[1])) for row in rows]
+                rows = [row for row in rows if len(row[1]) == dim]
+                if not rows:
+                    continue
+                ids = np.array([row[0] for row in rows], dtype=np.int64)
+                vectors = normalize_rows(np.vstack([row[1] for row in rows]).astype(np.float32))
+                scores = np.hstack([best_scores, queries @ vectors.T])
+                ids = np.hstack([best_ids, np.broadcast_to(ids, (len(queries), len(ids)))])
+                keep = np.argsort(-scores, axis=1)[:, :top_k]
+                best_ids = np.take_along_axis(ids, keep, axis=1)
+                best_scores = np.take_along_axis(scores, keep, axis=1)
+        
+        hits = 0
+        for query, exact in zip(queries, best_ids):
+            rows, _ = self._search(index, query, top_k)
+            hits += len(np.intersect1d(exact, index.ids[rows]))
+        return {"queries": len(queries), "overlap": hits / (len(queries) * top_k)}
+    
+    def _search(self, index, query, top_k):
+        """Top-k row positions in `index` for a unit-length query - approximate
+        when an ANN index is on, and re-scored with the full stored vectors
+        when the matrix is quantized or truncated"""
+        exact = index.exact
+        shortlist = top_k if exact else top_k * self.rerank_factor
+        coarse_query = index.project(query)
+        
+        ann_index = self.ann_index
+        if ann_index is None:
+            rows, scores = index.top_k(coarse_query, shortlist)
+        else:
+            ids, scores = ann_index.search(coarse_query, shortlist)
+            # The ANN index can be a refresh ahead of this snapshot
+            rows, known = index.rows_for_ids(ids)
+            rows, scores = rows[known], scores[known]
+        
+        if not exact:
+            rows, scores = self._rerank(index, rows, query)
+        return rows[:top_k], scores[:top_k]
+    
+    def _stored_embeddings(self, ids):
+        """{id: embedding blob} of the guy_profiles rows with these ids"""
+        ids = [int(profile_id) for profile_id in ids]
+        if not ids:
+            return {}
+        placeholders = ','.join('?' * len(ids))
+        with self.db.connection() as conn:
+            return dict(conn.execute(
+                f'SELECT id, embedding FROM guy_profiles WHERE id IN ({placeholders})', ids
+            ).fetchall())
+    
+    def _rerank(self, index, rows, query, stored=None):
+        """Re-score candidate rows with their full-precision stored embeddings
+        (`stored` can pass in blobs already fetched by _stored_embeddings)"""
+        if not len(rows):
+            return rows, np.empty(0, dtype=np.float32)
+        ids = index.ids[rows]
+        if stored is None:
+            stored = self._stored_embeddings(ids)
+        
+        vectors = [decode_embedding(stored[int(profile_id)]) if int(profile_id) in stored else None for profile_id in ids]
+        # Rows a running reembed() hasn't reached yet have the old size - skip them
+        present = np.array([vector is not None and len(vector) == len(query) for vector in vectors], dtype=bool)
+        rows = rows[present]
+        if not len(rows):
+            return rows, np.empty(0, dtype=np.float32)
+        vectors = normalize_rows(np.vstack([vector for vector, keep in zip(vectors, present) if keep]).astype(np.float32))
+        scores = vectors @ query
+        order = np.argsort(-scores)
+        return rows[order], scores[order]
     
     def find_matches(self, vent_text, top_k=6):
         """Find best matches using cosine similarity"""
-        # Save conversation and get embedding
-        conversation_id = self.save_girl_conversation(vent_text)
-        if not conversation_id:
+        # Get girl's embedding
+        girl_embedding = self.get_embedding(vent_text)
+        if girl_embedding is None:
             return []
         
-        # Get girl's embedding
-        conn = sqlite3.connect('dating_embeddings.db')
-        cursor = conn.cursor()
+        # Save conversation - queued, committed in batches by a background thread
+        self.conversation_log.put((vent_text, encode_embedding(girl_embedding)))
+        
+        # Score every guy in one matrix-vector product (rows are unit length)
+        self._refresh_if_changed()
+        index = self.profile_index
+        query = girl_embedding / (np.linalg.norm(girl_embedding) or 1.0)
+        top, scores = self._search(index, query, top_k)
         
-        cursor.execute('SELECT embedding FROM girl_conversations WHERE id = ?', (conversation_id,))
-        girl_embedding = json.loads(cursor.fetchone()[0])
+        # Already sorted by similarity, best first
+        return index.matches(top, scores)
+
+    def conversation_matches(self, conversation_id, top_k=6):
+        """Precomputed matches for a stored conversation, or None when there
+        are none (no precompute loaded, or the conversation is newer than it).
+        Profiles deleted since the run are skipped."""
+        precomputed = self.precomputed
+        if precomputed is None:
+            return None
+        found = precomputed.get(conversation_id, top_k)
+        if found is None:
+            return None
+        ids, scores = found
+        self._refresh_if_changed()
+        index = self.profile_index
+        rows, known = index.rows_for_ids(ids)
+        return index.matches(rows[known], scores[known])
+    
+    def find_matches_batch(self, vent_texts, top_k=6, chunk_size=128):
+        """find_matches for many texts: yields one match list per text, in order
+        ([] where the embedding failed, or the text is blank or not a string).
         
-        # Get all guy embeddings
-        cursor.execute('SELECT name, embedding, profile_data FROM guy_profiles')
-        guys = cursor.fetchall()
-        conn.close()
+        Texts are handled chunk_size at a time: one batched embeddings call,
+        one matrix-matrix product against every profile and a top-k per row,
+        so memory stays at chunk_size x profiles scores however many texts
+        come in. With an ANN index on, each text is searched separately.
+        """
+        self._refresh_if_changed()
+        index = self.profile_index
+        shortlist = top_k if index.exact else top_k * self.rerank_factor
         
-        matches = []
-        for name, embedding_str, profile_str in guys:
-            guy_embedding = json.loads(embedding_str)
-            profile = json.loads(profile_str)
+        for chunk in _chunked(vent_texts, chunk_size):
+            results = [[] for _ in chunk]
+            # Blank text can't be embedded (and would fail its whole batch)
+            texts = [position for position, text in enumerate(chunk) if isinstance(text, str) and text.strip()]
+            embeddings = self.get_embeddings([chunk[position] for position in texts]) if texts else []
+            vectors = {position: embedding for position, embedding in zip(texts, embeddings) if embedding is not None}
+            embedded = list(vectors)
+            if not embedded:
+                yield from results
+                continue
             
-            # Calculate cosine similarity
-            similarity = cosine_similarity(
-                [girl_embedding], 
-                [guy_embedding]
-            )[0][0]
+            for position in embedded:
+                self.conversation_log.put((chunk[position], encode_embedding(vectors[position])))
+            queries = normalize_rows(np.vstack([vectors[position] for position in embedded]).astype(np.float32))
             
-            # Update compatibility score based on similarity
-            profile['compatibility_score'] = int(similarity * 100)
-            profile['name'] = name
-            profile['similarity_score'] = similarity
+            if self.ann_index is not None:
+                candidates = [self._search(index, query, top_k) for query in queries]
+            else:
+                top, top_scores = top_rows_per_query(index.score_matrix(index.project(queries)), shortlist)
+                candidates = list(zip(top, top_scores))
+                if not index.exact:
+                    # One DB read for every shortlist in the chunk
+                    stored = self._stored_embeddings(np.unique(index.ids[top]))
+                    candidates = [self._rerank(index, rows, query, stored) for (rows, _), query in zip(candidates, queries)]
             
-            matches.append(profile)
-        
-        # Sort by similarity and return top matches
-        matches.sort(key=lambda x: x['similarity_score'], reverse=True)
-        return matches[:top_k]
+            for position, (rows, scores) in zip(embedded, candidates):
+                results[position] = index.matches(rows[:top_k], scores[:top_k])
+            yield from results
+
+# Global instance, created on first use: building it creates tables, may seed
+# profiles through the embeddings API and loads every profile into memory,
+# none of which should happen just because the module was imported
+_matcher = None
+_matcher_lock = threading.Lock()
+
+def get_matcher():
+    """The process-wide EmbeddingMatcher (callers racing the first call wait
+    for the one build; a failed build is retried by the next call)"""
+    global _matcher
+    if _matcher is None:
+        with _matcher_lock:
+            if _matcher is None:
+                _matcher = EmbeddingMatcher()
+    return _matcher
 
-# Global instance
-matcher = EmbeddingMatcher() 
\ No newline at end of file
+def __getattr__(name):
+    # `from embedding_service import matcher` keeps working, lazily
+    if name == "matcher":
+        return get_matcher()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,82 @@
+# fake_embeddings_server.py - Local stand-in for the OpenAI embeddings API
+#
+# Returns deterministic pseudo-random unit vectors (same text -> same vector),
+# so imports and matching can be exercised offline and without cost:
+#
+#   python fake_embeddings_server.py --port 8089 --latency 0.2 &
+#   OPENAI_BASE_URL=http://127.0.0.1:8089/v1 OPENAI_API_KEY=fake \
+#       python profile_import.py profiles.jsonl
+import argparse
+import base64
+import hashlib
+import json
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+
+def fake_embedding(text, dimensions):
+    seed = int.from_bytes(hashlib.sha256(text.encode('utf-8')).digest()[:8], 'little')
+    vector = np.random.default_rng(seed).standard_normal(dimensions).astype(np.float32)
+    return vector / np.linalg.norm(vector)
+
+
+class FakeEmbeddingsHandler(BaseHTTPRequestHandler):
+    latency = 0.0
+    requests_served = 0
+
+    def do_POST(self):
+        if not self.path.rstrip('/').endswith('/embeddings'):
+            self.send_error(404)
+            return
+
+        body = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+        texts = body['input'] if isinstance(body['input'], list) else [body['input']]
+        dimensions = body.get('dimensions') or 1536
+        time.sleep(self.latency)
+        if any(not isinstance(text, str) or not text for text in texts):
+            # Like the real API: one empty input fails the whole request
+            self.send_error(400, "'$.input' is invalid")
+            return
+
+        data = []
+        for index, text in enumerate(texts):
+            vector = fake_embedding(text, dimensions)
+            if body.get('encoding_format') == 'base64':
+                embedding = base64.b64encode(vector.tobytes()).decode('ascii')
+            else:
+                embedding = vector.tolist()
+            data.append({"object": "embedding", "index": index, "embedding": embedding})
+
+        FakeEmbeddingsHandler.requests_served += 1
+        payload = json.dumps({
+            "object": "list",
+            "data": data,
+            "model": body.get('model'),
+            "usage": {"prompt_tokens": 0, "total_tokens": 0}
+        }).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        pass  # Keep the console quiet during bulk imports
+
+
+def serve(host='127.0.0.1', port=8089, latency=0.0):
+    FakeEmbeddingsHandler.latency = latency
+    server = ThreadingHTTPServer((host, port), FakeEmbeddingsHandler)
+    print(f"Fake embeddings API on http://{host}:{server.server_port}/v1")
+    server.serve_forever()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Fake OpenAI embeddings server")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8089)
+    parser.add_argument('--latency', type=float, default=0.0, help="seconds to wait per request")
+    args = parser.parse_args()
+    serve(args.host, args.port, args.latency)
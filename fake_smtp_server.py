@@ -0,0 +1,104 @@
+# fake_smtp_server.py - Local stand-in for the SMTP server verification codes go through
+#
+# Speaks just enough SMTP (EHLO, AUTH, MAIL, RCPT, DATA) for smtplib, accepts
+# any login, and prints each message it receives. --fail-rate answers that
+# share of messages with a temporary 451 error to exercise retries, and
+# --reject rejects recipients containing that text with a permanent 550.
+#
+#   python fake_smtp_server.py --port 2525 --latency 0.3 &
+#   GLOW_SMTP_HOST=127.0.0.1 GLOW_SMTP_PORT=2525 GLOW_SMTP_STARTTLS=0 \
+#       GLOW_EMAIL=glow@example.com GLOW_EMAIL_PASSWORD=x python app.py
+import argparse
+import random
+import socketserver
+import time
+
+
+class FakeSMTPHandler(socketserver.StreamRequestHandler):
+    latency = 0.0
+    fail_rate = 0.0
+    reject = None
+    quiet = False
+    connections = 0
+    messages = []
+
+    def reply(self, line):
+        self.wfile.write(line.encode('ascii') + b'\r\n')
+
+    def handle(self):
+        type(self).connections += 1
+        self.reply("220 fake-smtp ready")
+        recipients = []
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            command = line.decode('utf-8', 'replace').strip()
+            verb = command.split(' ', 1)[0].upper()
+
+            if verb == "EHLO":
+                self.reply("250-fake-smtp")
+                self.reply("250-AUTH PLAIN LOGIN")
+                self.reply("250 8BITMIME")
+            elif verb == "HELO":
+                self.reply("250 fake-smtp")
+            elif verb == "AUTH":
+                self.reply("235 2.7.0 accepted")
+            elif verb == "MAIL":
+                recipients = []
+                self.reply("250 OK")
+            elif verb == "RCPT":
+                if self.reject and self.reject in command:
+                    self.reply("550 5.1.1 no such user")
+                else:
+                    recipients.append(command.split(':', 1)[1].strip(' <>'))
+                    self.reply("250 OK")
+            elif verb == "DATA":
+                self.reply("354 go ahead")
+                body = []
+                for data_line in iter(self.rfile.readline, b''):
+                    if data_line in (b'.\r\n', b'.\n'):
+                        break
+                    body.append(data_line)
+                time.sleep(self.latency)
+                if random.random() < self.fail_rate:
+                    self.reply("451 4.3.0 try again later")
+                    continue
+                type(self).messages.append((recipients, b''.join(body)))
+                if not self.quiet:
+                    print(f"mail for {', '.join(recipients)} ({sum(map(len, body))} bytes, "
+                          f"connection #{self.connections})", flush=True)
+                self.reply("250 OK queued")
+            elif verb in ("RSET", "NOOP"):
+                self.reply("250 OK")
+            elif verb == "QUIT":
+                self.reply("221 bye")
+                return
+            else:
+                self.reply("502 command not implemented")
+
+
+class FakeSMTPServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local SMTP stand-in")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=2525)
+    parser.add_argument('--latency', type=float, default=0.0, help="seconds to wait before accepting each message")
+    parser.add_argument('--fail-rate', type=float, default=0.0, help="share of messages answered with a temporary error")
+    parser.add_argument('--reject', help="permanently reject recipients containing this text")
+    args = parser.parse_args()
+
+    FakeSMTPHandler.latency = args.latency
+    FakeSMTPHandler.fail_rate = args.fail_rate
+    FakeSMTPHandler.reject = args.reject
+    with FakeSMTPServer((args.host, args.port), FakeSMTPHandler) as server:
+        print(f"Fake SMTP server on {args.host}:{args.port}", flush=True)
+        server.serve_forever()
+
+
+if __name__ == '__main__':
+    main()
@@ -1,24 +1,323 @@
 # glow_agent.py - Glow's brain (COMPLETELY REWRITTEN)
 from langchain.agents import create_openai_functions_agent, AgentExecutor
 from langchain.prompts import ChatPromptTemplate, MessagesPlaceholder
-from langchain.memory import ConversationBufferMemory
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.output_parsers import StrOutputParser
 from langchain_openai import ChatOpenAI
-from tools import glow_tools
+from tools import (glow_tools, check_username_available, validate_password_strength,
+                   validate_email_format, generate_and_send_verification_code, verify_code,
+                   save_user_to_database, verification_email_status, email_registered, current_signup)
+from conversation_memory import ConversationMemory
+from glow_logging import get_logger
+from response_cache import PLACEHOLDERS, ResponseCache, normalize_input
+from passwords import get_password_service
+from metrics import LLM_SECONDS, LLM_TOKENS, PROMPT_TOKENS, STAGE_SECONDS, TOOL_SECONDS
 import json
+import os
+import queue
 import re
+import threading
+import time
+import uuid
 
-class GlowAgent:
-    def __init__(self, openai_api_key: str):
-        self.llm = ChatOpenAI(
+log = get_logger(__name__)
+
+def _env_flag(name, default=""):
+    return os.getenv(name, default).lower() in ("1", "true", "yes")
+
+# LangChain's step-by-step console trace; slow and unstructured, so opt-in
+AGENT_VERBOSE = _env_flag("GLOW_AGENT_VERBOSE")
+
+# Validate signup input in Python and hand the model the result, instead of
+# letting it call the tools itself - one LLM call per turn instead of 2-3
+FAST_VALIDATION = _env_flag("GLOW_FAST_VALIDATION", "1")
+
+# "summary" keeps the last GLOW_MEMORY_KEEP_TURNS turns verbatim and folds older
+# ones into a running summary once history passes GLOW_MEMORY_TOKEN_BUDGET;
+# "buffer" sends the whole conversation every turn
+MEMORY_MODE = os.getenv("GLOW_MEMORY", "summary")
+MEMORY_TOKEN_BUDGET = int(os.getenv("GLOW_MEMORY_TOKEN_BUDGET", 1500))
+MEMORY_KEEP_TURNS = int(os.getenv("GLOW_MEMORY_KEEP_TURNS", 4))
+
+# The system prompt is a template: signup state goes in as variables at invoke
+# time, so the prompt, agent and executor only need to be built once
+SYSTEM_PROMPT = """
+        You are GLOW, the ultimate hype-bestie chatbot with MAJOR personality! You're like that chaotic but wise best friend who hypes everyone up while keeping them on track. Think baddie leo energy meets supportive bestie vibes.
+
+        🌟 YOUR PERSONALITY:
+        - Use Gen Z slang: "bestie", "girly pop", "babe", "queen", "slay", "periodt", "no cap", "fr fr"
+        - Be nonchalant but supportive - sassy but never mean
+        - Use girly Gen Z emojis: 💅, ✨, 🔥, 💖, 👑, 🌟, ⚡, 🦋
+        - Keep responses engaging and fun but focused
+        - Remember EVERYTHING from our conversation - you have perfect memory!
+
+                 📋 SIGNUP FLOW - FOLLOW THIS EXACTLY (DO NOT SKIP OR REORDER):
+         {signup_flow}
+         
+         🚨 CRITICAL: NEVER ask for multiple things at once! ONE STEP AT A TIME!
+
+        🎯 CURRENT STATE:
+        - Step: {current_step}
+        - Name: {name}
+        - Username: {username}
+        - Password: {password}  
+        - Email: {email}
+        - Verification sent: {verification_code_sent}
+        - Verification email delivery: {verification_email}
+        - Verified: {verified}
+
+        🧪 ALREADY CHECKED THIS TURN (trust this, don't re-check it):
+        {checked}
+
+        ⚠️ CRITICAL RULES:
+        {rules}
+
+        🚨 EDGE CASES:
+        - Username taken → "oop bestie that username is taken! try another one that screams YOU ✨"
+        - Password too short → "babe your password needs to be at least 6 characters! make it strong but memorable 💪"
+        - Invalid email → "hmm that email doesn't look right queen, double check it? 📧"
+        - Wrong verification code → "not quite right babe! check your email and try again 💌"
+
+        💫 NEXT ACTION NEEDED:
+        {next_action}
+        """
+
+# The flow and rules parts of SYSTEM_PROMPT: the agent validates with tool
+# calls, while on the fast path the validators already ran and the reply
+# chain has no tools - telling it to call them only gets tool calls narrated
+AGENT_INSTRUCTIONS = {
+    "signup_flow": """1. Introduction → Ask for NAME ONLY
+         2. Got name → Ask for USERNAME ONLY (check availability with tool)
+         3. Username available → Ask for PASSWORD ONLY (validate with tool)
+         4. Password valid → Ask for EMAIL ONLY (validate with tool)
+         5. Email valid → Send verification code (use tool)
+         6. Code verified → Save to database → Launch app!""",
+    "rules": """- NEVER ask for info you already have
+        - ALWAYS validate each input properly using tools
+        - If validation fails, give specific feedback and ask again
+        - Keep track of attempts: username({username_attempts}), password({password_attempts}), email({email_attempts}), verification({verification_attempts})
+        - When you get a valid email, IMMEDIATELY call generate_and_send_verification_code tool
+        - Stay in character but be helpful with errors"""
+}
+
+FAST_INSTRUCTIONS = {
+    "signup_flow": """1. Introduction → Ask for NAME ONLY
+         2. Got name → Ask for USERNAME ONLY
+         3. Username available → Ask for PASSWORD ONLY
+         4. Password valid → Ask for EMAIL ONLY
+         5. Email valid → A verification code gets emailed to them
+         6. Code verified → Their account is saved → Launch app!""",
+    "rules": """- NEVER ask for info you already have
+        - Every check (username, password, email, code) is done for you - the results are under ALREADY CHECKED
+        - You can't run checks or send emails yourself, so never say you're checking or sending something
+        - If a check failed, give specific feedback and ask again
+        - Keep track of attempts: username({username_attempts}), password({password_attempts}), email({email_attempts}), verification({verification_attempts})
+        - Stay in character but be helpful with errors"""
+}
+
+def _build_response_cache():
+    """Process-wide cache of fast-path replies (GLOW_RESPONSE_CACHE=0 turns it off)"""
+    if not _env_flag("GLOW_RESPONSE_CACHE", "1"):
+        return None
+    embed = None
+    if _env_flag("GLOW_RESPONSE_CACHE_SEMANTIC"):
+        def embed(text):
+            from embedding_service import get_matcher  # Only pulled in when asked for
+            return get_matcher().get_embedding(text)
+    return ResponseCache(
+        variants=int(os.getenv("GLOW_RESPONSE_CACHE_VARIANTS", 3)),
+        ttl=int(os.getenv("GLOW_RESPONSE_CACHE_TTL", 24 * 3600)),
+        max_keys=int(os.getenv("GLOW_RESPONSE_CACHE_KEYS", 5000)),
+        embed=embed
+    )
+
+response_cache = _build_response_cache()
+
+SUMMARY_PROMPT = ChatPromptTemplate.from_messages([
+    ("system", "You keep a running summary of a signup chat between Glow, a hype-bestie "
+               "chatbot, and a user. Merge the new messages into the summary: what the user "
+               "shared, how they talk, and where the signup stands. Under 120 words. Never "
+               "include passwords or verification codes."),
+    ("user", "Summary so far:\n{summary}\n\nNew messages:\n{messages}")
+])
+
+_llms = {}
+_agent_executors = {}
+_reply_chains = {}
+_summarizers = {}
+_cache_lock = threading.RLock()
+
+def _cached(cache, openai_api_key, build):
+    with _cache_lock:
+        value = cache.get(openai_api_key)
+        if value is None:
+            value = cache[openai_api_key] = build()
+        return value
+
+def get_llm(openai_api_key: str):
+    return _cached(_llms, openai_api_key, lambda: ChatOpenAI(
+        api_key=openai_api_key,
+        model="gpt-4o",  # UPGRADED TO GPT-4o
+        temperature=0.9,  # More creative and personality-filled
+        # Always stream: invoke() only fires on_llm_new_token (what /chat/stream
+        # forwards) for streaming models, and the final message is the same
+        streaming=True,
+        stream_usage=True  # Token usage still comes back, on the last chunk
+    ))
+
+def get_agent_executor(openai_api_key: str):
+    """Build the LLM, agent and executor once per process (per API key)"""
+    return _cached(_agent_executors, openai_api_key, lambda: build_agent_executor(get_llm(openai_api_key)))
+
+def get_reply_chain(openai_api_key: str):
+    """Tool-free prompt -> LLM chain for fast-validation turns, built once per key"""
+    return _cached(_reply_chains, openai_api_key, lambda: build_reply_chain(get_llm(openai_api_key)))
+
+def get_summarizer(openai_api_key: str):
+    """(summary, messages) -> new summary, on a small model (GLOW_SUMMARY_MODEL)"""
+    def build():
+        llm = ChatOpenAI(
             api_key=openai_api_key,
-            model="gpt-4o",  # UPGRADED TO GPT-4o
-            temperature=0.9  # More creative and personality-filled
+            model=os.getenv("GLOW_SUMMARY_MODEL", "gpt-4o-mini"),
+            temperature=0
         )
+        return build_summarizer(llm)
+    return _cached(_summarizers, openai_api_key, build)
+
+def build_summarizer(llm):
+    chain = SUMMARY_PROMPT | llm | StrOutputParser()
+    
+    def summarize(summary, messages):
+        return chain.invoke({
+            "summary": summary or "(nothing yet)",
+            "messages": "\n".join(f"{message.type}: {message.content}" for message in messages)
+        })
+    return summarize
+
+def _build_prompt():
+    return ChatPromptTemplate.from_messages([
+        ("system", SYSTEM_PROMPT),
+        MessagesPlaceholder(variable_name="chat_history"),
+        ("user", "{input}"),
+        MessagesPlaceholder(variable_name="agent_scratchpad")
+    ])
+
+def build_agent_executor(llm):
+    """Wire Glow's prompt and tools into an AgentExecutor.
+
+    Memory is not attached here - each GlowAgent keeps its own and passes
+    chat_history in - so one executor can serve every session.
+    """
+    agent = create_openai_functions_agent(
+        llm=llm,
+        tools=glow_tools,
+        prompt=_build_prompt()
+    )
+    
+    return AgentExecutor(
+        agent=agent,
+        tools=glow_tools,
+        verbose=AGENT_VERBOSE,
+        handle_parsing_errors=True
+    )
+
+def build_reply_chain(llm):
+    """Same prompt, no tools: the validators already ran, the model just talks"""
+    return _build_prompt().partial(agent_scratchpad=[]) | llm | StrOutputParser()
+
+PASSWORD_REDACTED = "[password hidden]"
+
+def _redact(text: str, secret) -> str:
+    """text with every occurrence of secret (any case) blanked out"""
+    if not secret:
+        return text
+    return re.sub(re.escape(secret), PASSWORD_REDACTED, text, flags=re.IGNORECASE)
+
+class _TokenQueueHandler(BaseCallbackHandler):
+    """Hands streamed LLM tokens to another thread"""
+    DONE = object()
+    
+    def __init__(self):
+        self.tokens = queue.Queue()
+    
+    def on_llm_new_token(self, token: str, **kwargs):
+        # Function-call chunks stream as empty content - nothing to show
+        if token:
+            self.tokens.put(token)
+
+class _MetricsHandler(BaseCallbackHandler):
+    """Times every tool and LLM call the agent makes, and counts LLM tokens.
+    Calls made for a chat turn (metadata glow_memory, see GlowAgent.chat)
+    also count their prompt tokens toward glow_turn_prompt_tokens."""
+    
+    def __init__(self):
+        self._started = {}  # run_id -> (start time, label); run ids are unique per call
+        self._turn_calls = {}  # run_id -> memory mode, for chat-turn LLM calls
+    
+    def on_chat_model_start(self, serialized, messages, *, run_id, **kwargs):
+        metadata = kwargs.get("metadata") or {}
+        model = (kwargs.get("invocation_params") or {}).get("model_name") \
+            or metadata.get("ls_model_name") or "unknown"
+        self._started[run_id] = (time.perf_counter(), model)
+        if "glow_memory" in metadata:
+            self._turn_calls[run_id] = metadata["glow_memory"]
+    
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        start, model = self._started.pop(run_id, (None, None))
+        if start is not None:
+            LLM_SECONDS.labels(model).observe(time.perf_counter() - start)
+        memory_mode = self._turn_calls.pop(run_id, None)
+        
+        usage = (response.llm_output or {}).get("token_usage")
+        if usage:
+            prompt, completion = usage.get("prompt_tokens"), usage.get("completion_tokens")
+        else:
+            # Streamed responses carry usage on the message instead
+            message = getattr(response.generations[0][0], "message", None) if response.generations else None
+            usage = getattr(message, "usage_metadata", None) or {}
+            prompt, completion = usage.get("input_tokens"), usage.get("output_tokens")
+        if prompt is not None:
+            LLM_TOKENS.labels("prompt").observe(prompt)
+            if memory_mode is not None:
+                PROMPT_TOKENS.labels(memory_mode).observe(prompt)
+        if completion is not None:
+            LLM_TOKENS.labels("completion").observe(completion)
+    
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        self._started.pop(run_id, None)
+        self._turn_calls.pop(run_id, None)
+    
+    def on_tool_start(self, serialized, input_str, *, run_id, **kwargs):
+        name = (serialized or {}).get("name") or kwargs.get("name") or "unknown"
+        self._started[run_id] = (time.perf_counter(), name)
+    
+    def on_tool_end(self, output, *, run_id, **kwargs):
+        self._observe_tool(run_id, "ok")
+    
+    def on_tool_error(self, error, *, run_id, **kwargs):
+        self._observe_tool(run_id, "error")
+    
+    def _observe_tool(self, run_id, status):
+        start, name = self._started.pop(run_id, (None, None))
+        if start is not None:
+            TOOL_SECONDS.labels(name, status).observe(time.perf_counter() - start)
+
+_metrics_handler = _MetricsHandler()
+
+class GlowAgent:
+    def __init__(self, openai_api_key: str, fast_validation=None):
+        # Shared by every session - built on first use, not per turn
+        self.agent_executor = get_agent_executor(openai_api_key)
+        self.reply_chain = get_reply_chain(openai_api_key)
+        self.fast_validation = FAST_VALIDATION if fast_validation is None else fast_validation
+        self._checked = None  # What the local validators found this turn
+        self.response_cache = response_cache  # Shared across sessions; None to disable
         
-        # Conversation memory - keeps track of everything
-        self.memory = ConversationBufferMemory(
-            memory_key="chat_history",
-            return_messages=True
+        # Conversation memory - recent turns verbatim, older ones summarized
+        self.memory = ConversationMemory(
+            summarize=get_summarizer(openai_api_key) if MEMORY_MODE == "summary" else None,
+            token_budget=MEMORY_TOKEN_BUDGET,
+            keep_turns=MEMORY_KEEP_TURNS
         )
         
         # Signup state tracking - MUCH CLEANER
@@ -27,7 +326,8 @@ class GlowAgent:
             "data": {
                 "name": None,
                 "username": None,
-                "password": None,
+                "password": None,  # As typed - only during the turn it was typed in
+                "password_hash": None,
                 "email": None,
                 "verification_code_sent": False,
                 "verified": False
@@ -39,93 +339,109 @@ class GlowAgent:
                 "verification": 0
             }
         }
-        
-        # Create the agent
-        self._setup_agent()
     
-    def _setup_agent(self):
-        """Setup the agent with current state"""
-        self.prompt = ChatPromptTemplate.from_messages([
-            ("system", self._get_system_prompt()),
-            MessagesPlaceholder(variable_name="chat_history"),
-            ("user", "{input}"),
-            MessagesPlaceholder(variable_name="agent_scratchpad")
-        ])
-        
-        self.agent = create_openai_functions_agent(
-            llm=self.llm,
-            tools=glow_tools,
-            prompt=self.prompt
-        )
-        
-        self.agent_executor = AgentExecutor(
-            agent=self.agent,
-            tools=glow_tools,
-            memory=self.memory,
-            verbose=True,
-            handle_parsing_errors=True
-        )
+    def dump_state(self) -> dict:
+        """Everything that makes this session this session, as plain JSON data.
+        The password is only ever in here hashed (see _protect_password)."""
+        return {"signup": self.signup_state, "memory": self.memory.dump()}
     
-    def _get_system_prompt(self) -> str:
-        current_step = self.signup_state["step"]
+    def load_state(self, state: dict):
+        data = state["signup"]["data"]
+        if "password_hash" not in data:
+            # Saved by an older version, where "password" is either as typed or
+            # a hash with no telling which - scrub it and ask for it again
+            password, data["password"], data["password_hash"] = data["password"], None, None
+            if password:
+                for turn in state["memory"]["turns"]:
+                    turn[0], turn[1] = _redact(turn[0], password), _redact(turn[1], password)
+                if state["signup"]["step"] in ("password", "email", "verification"):
+                    state["signup"]["step"] = "username"
+        self.signup_state = state["signup"]
+        self.memory.load(state["memory"])
+        self._protect_password()
+    
+    def _protect_password(self):
+        """Swap a just-captured plaintext password for its hash, so it never
+        outlives the turn it was typed in - not in the session store, not in
+        the prompt. save_user_to_database reads password_hash from here."""
+        data = self.signup_state["data"]
+        if not data["password"]:
+            return
+        try:
+            data["password_hash"] = get_password_service().hash(data["password"])
+        except Exception:
+            log.exception("password_hash_failed")
+            # Ask for it again rather than keep it in the clear
+            data["password_hash"] = None
+            if self.signup_state["step"] == "password":
+                self.signup_state["step"] = "username"
+        finally:
+            data["password"] = None
+    
+    def _get_prompt_variables(self) -> dict:
+        """Current signup state as values for SYSTEM_PROMPT"""
         data = self.signup_state["data"]
         attempts = self.signup_state["attempts"]
         
-        return f"""
-        You are GLOW, the ultimate hype-bestie chatbot with MAJOR personality! You're like that chaotic but wise best friend who hypes everyone up while keeping them on track. Think baddie leo energy meets supportive bestie vibes.
-
-        🌟 YOUR PERSONALITY:
-        - Use Gen Z slang: "bestie", "girly pop", "babe", "queen", "slay", "periodt", "no cap", "fr fr"
-        - Be nonchalant but supportive - sassy but never mean
-        - Use girly Gen Z emojis: 💅, ✨, 🔥, 💖, 👑, 🌟, ⚡, 🦋
-        - Keep responses engaging and fun but focused
-        - Remember EVERYTHING from our conversation - you have perfect memory!
-
-                 📋 SIGNUP FLOW - FOLLOW THIS EXACTLY (DO NOT SKIP OR REORDER):
-         1. Introduction → Ask for NAME ONLY
-         2. Got name → Ask for USERNAME ONLY (check availability with tool)
-         3. Username available → Ask for PASSWORD ONLY (validate with tool)
-         4. Password valid → Ask for EMAIL ONLY (validate with tool)
-         5. Email valid → Send verification code (use tool)
-         6. Code verified → Save to database → Launch app!
-         
-         🚨 CRITICAL: NEVER ask for multiple things at once! ONE STEP AT A TIME!
-
-        🎯 CURRENT STATE:
-        - Step: {current_step}
-        - Name: {data['name'] or 'NOT SET'}
-        - Username: {data['username'] or 'NOT SET'}
-        - Password: {data['password'] or 'NOT SET'}  
-        - Email: {data['email'] or 'NOT SET'}
-        - Verification sent: {data['verification_code_sent']}
-        - Verified: {data['verified']}
-
-        ⚠️ CRITICAL RULES:
-        - NEVER ask for info you already have
-        - ALWAYS validate each input properly using tools
-        - If validation fails, give specific feedback and ask again
-        - Keep track of attempts: username({attempts['username']}), password({attempts['password']}), email({attempts['email']}), verification({attempts['verification']})
-        - When you get a valid email, IMMEDIATELY call generate_and_send_verification_code tool
-        - Stay in character but be helpful with errors
-
-        🚨 EDGE CASES:
-        - Username taken → "oop bestie that username is taken! try another one that screams YOU ✨"
-        - Password too short → "babe your password needs to be at least 6 characters! make it strong but memorable 💪"
-        - Invalid email → "hmm that email doesn't look right queen, double check it? 📧"
-        - Wrong verification code → "not quite right babe! check your email and try again 💌"
-
-        💫 NEXT ACTION NEEDED:
-        {self._get_next_action()}
-        """
+        return {
+            "current_step": self.signup_state["step"],
+            "name": data["name"] or "NOT SET",
+            "username": data["username"] or "NOT SET",
+            # Never the value, not even hashed: save_user_to_database reads it itself
+            "password": "SET" if data["password"] or data["password_hash"] else "NOT SET",
+            "email": data["email"] or "NOT SET",
+            "verification_code_sent": data["verification_code_sent"],
+            "verified": data["verified"],
+            "verification_email": self._verification_email(),
+            "checked": self._checked or "nothing this turn",
+            **self._instructions(attempts),
+            "next_action": self._get_fast_next_action() if self.fast_validation else self._get_next_action()
+        }
+    
+    def _instructions(self, attempts: dict) -> dict:
+        """The signup_flow and rules prompt variables for this agent's mode"""
+        instructions = FAST_INSTRUCTIONS if self.fast_validation else AGENT_INSTRUCTIONS
+        counts = {f"{field}_attempts": count for field, count in attempts.items()}
+        return {key: text.format(**counts) for key, text in instructions.items()}
+    
+    def _verification_email(self) -> str:
+        """Delivery status of the code email, once one was sent"""
+        data = self.signup_state["data"]
+        if not (data["verification_code_sent"] and data["email"]):
+            return "n/a"
+        status = verification_email_status(data["email"])
+        if status == "failed":
+            return "FAILED - the code never arrived, apologize and ask for their email again"
+        return status or "sent"
+    
+    def _get_fast_next_action(self) -> str:
+        """What to ask for next when validation already happened locally -
+        the step here only says what we're waiting for"""
+        step = self.signup_state["step"]
+        data = self.signup_state["data"]
+        
+        if self._checked:
+            return "React to what was checked above, then ask for the next thing it says."
+        if step == "introduction":
+            return "Give a fun intro about Glow and ask for their name! Don't ask for anything else."
+        elif step == "name":
+            return f"Hi {data['name']}! Ask for their desired username (one word, letters and numbers, 3+ characters)."
+        elif step == "username":
+            return "Ask for a password (at least 6 characters). Don't ask for email yet."
+        elif step == "password":
+            return "Ask for their email address."
+        elif step == "verification":
+            return "Ask them to enter the 6-digit verification code from their email."
+        elif step == "complete":
+            return "Their account is saved - tell them you're launching the app!"
+        else:
+            return f"ERROR: Unknown step '{step}' - restart the flow"
     
     def _get_next_action(self) -> str:
         """Determine what should happen next - FIXED LOGIC"""
         step = self.signup_state["step"]
         data = self.signup_state["data"]
         
-        print(f"🔥 DETERMINING NEXT ACTION for step: '{step}'")
-        print(f"🔥 Current data: {data}")
-        
         if step == "introduction":
             return "Give a fun intro about Glow and ask for their name! Don't ask for anything else."
         elif step == "name":
@@ -143,37 +459,111 @@ class GlowAgent:
         else:
             return f"ERROR: Unknown step '{step}' - restart the flow"
     
-    def chat(self, message: str) -> str:
+    def _loggable_state(self) -> dict:
+        """signup_state with the password masked"""
+        data = self.signup_state["data"]
+        data = dict(data, password="***" if data["password"] else None,
+                    password_hash="***" if data["password_hash"] else None)
+        return dict(self.signup_state, data=data)
+    
+    def chat(self, message: str, callbacks=None) -> str:
         """Main chat function with improved state management"""
+        signup_token = current_signup.set(self.signup_state)  # For the tools, see tools.current_signup
         try:
-            print(f"🔥 GLOW DEBUG - Current state: {self.signup_state}")
-            print(f"🔥 GLOW DEBUG - User message: '{message}'")
+            log.debug("turn_start", state=self._loggable_state())
             
-            # Process the user's input and update state
-            self._process_user_input(message)
+            with STAGE_SECONDS.labels("turn").time():
+                # Process the user's input and update state
+                with STAGE_SECONDS.labels("process_user_input").time():
+                    step_before = self.signup_state["step"]
+                    self._process_user_input(message)
+                    # What was captured, before validation rolls a rejected value back
+                    submitted = dict(self.signup_state["data"])
+                    outcome, self._checked = self._validate_locally(message, step_before) if self.fast_validation else (None, None)
+                
+                # Repetitive fast-path turns can reuse an earlier reply
+                cache_key = None
+                glow_response = None
+                if self.fast_validation and self.response_cache is not None:
+                    with STAGE_SECONDS.labels("response_cache").time():
+                        cache_key = self._response_cache_key(message, step_before, outcome)
+                        glow_response = self.response_cache.get(cache_key, self.signup_state["data"])
+                    if glow_response is not None:
+                        # Streaming callers still get the text, in one piece
+                        for handler in callbacks or []:
+                            handler.on_llm_new_token(glow_response, run_id=uuid.uuid4())
+                
+                if glow_response is None:
+                    # Get Glow's response - the updated state goes in as prompt variables
+                    inputs = {
+                        "input": message,
+                        "chat_history": self.memory.messages,
+                        **self._get_prompt_variables()
+                    }
+                    # Prompt size comes from the API's usage numbers (see _MetricsHandler)
+                    config = {"callbacks": [_metrics_handler, *(callbacks or [])],
+                              "metadata": {"glow_memory": MEMORY_MODE}}
+                    with STAGE_SECONDS.labels("agent_invoke").time():
+                        if self.fast_validation:
+                            glow_response = self.reply_chain.invoke(inputs, config=config)
+                        else:
+                            glow_response = self.agent_executor.invoke(inputs, config=config)["output"]
+                    
+                    if cache_key is not None:
+                        self.response_cache.put(cache_key, glow_response, self.signup_state["data"],
+                                                secrets=self._reply_secrets(message, submitted))
+                
+                # The password as typed stays out of the history (and so the session store)
+                typed = submitted["password"]
+                self.memory.save_context(_redact(message, typed), _redact(glow_response, typed))
+                
+                # Update state based on Glow's actions (the fast path already has)
+                if not self.fast_validation:
+                    with STAGE_SECONDS.labels("process_glow_response").time():
+                        self._process_glow_response(glow_response)
             
-            # Refresh agent with updated state
-            self._setup_agent()
-            
-            # Get Glow's response
-            response = self.agent_executor.invoke({
-                "input": message,
-                "chat_history": self.memory.chat_memory.messages
-            })
-            
-            glow_response = response["output"]
-            
-            # Update state based on Glow's actions
-            self._process_glow_response(glow_response)
-            
-            print(f"🔥 GLOW DEBUG - Final state: {self.signup_state}")
+            log.debug("turn_end", state=self._loggable_state())
             return glow_response
             
-        except Exception as e:
-            print(f"🚨 ERROR: {e}")
-            import traceback
-            traceback.print_exc()
+        except Exception:
+            log.exception("turn_failed", step=self.signup_state["step"])
             return "omg bestie something went wrong on my end! 😭 can you try that again? i promise i'll do better! 💕"
+        
+        finally:
+            self._protect_password()
+            current_signup.reset(signup_token)
+    
+    def stream_chat(self, message: str):
+        """Like chat(), but yields ("token", text) as the LLM streams and then
+        ("done", full_response) once the turn - including state updates - is
+        finished"""
+        handler = _TokenQueueHandler()
+        result = {}
+        
+        def run():
+            try:
+                result["response"] = self.chat(message, callbacks=[handler])
+            except BaseException as e:
+                result["error"] = e
+            finally:
+                handler.tokens.put(_TokenQueueHandler.DONE)
+        
+        worker = threading.Thread(target=run, daemon=True)
+        worker.start()
+        try:
+            while True:
+                token = handler.tokens.get()
+                if token is _TokenQueueHandler.DONE:
+                    break
+                yield "token", token
+        finally:
+            # If the client goes away mid-stream, still let the turn finish so
+            # the caller's session lock isn't released while state is changing
+            worker.join()
+            if "error" in result:
+                raise result["error"]  # Even on close, so the caller doesn't keep a half-done turn
+        
+        yield "done", result["response"]
     
     def _process_user_input(self, message: str):
         """Process user input and update signup state - FIXED LOGIC"""
@@ -181,12 +571,12 @@ class GlowAgent:
         current_step = self.signup_state["step"]
         data = self.signup_state["data"]
         
-        print(f"🔥 PROCESSING INPUT: '{msg}' at step '{current_step}'")
+        log.debug("process_input", step=current_step, length=len(msg))
         
         # Skip obvious greetings/filler - but ONLY if we haven't started collecting info
         skip_patterns = ['hi', 'hello', 'hey', 'sup', 'yo', 'thanks', 'thank you', 'ok', 'okay']
         if current_step == "introduction" and any(pattern in msg.lower() for pattern in skip_patterns) and len(msg.split()) <= 2:
-            print("🔥 Skipping greeting at introduction step")
+            log.debug("input_skipped_greeting", step=current_step)
             return
         
         # STRICT SEQUENTIAL LOGIC - NO JUMPING AROUND
@@ -197,7 +587,7 @@ class GlowAgent:
             if len(msg) > 0 and not any(skip in msg.lower() for skip in skip_patterns):
                 data["name"] = msg
                 self.signup_state["step"] = "name"
-                print(f"🔥 STEP 1 COMPLETE: Name = '{msg}', moving to step 'name'")
+                log.debug("step_complete", step="introduction", next_step="name")
                 return
         
         # STEP 2: Have name -> waiting for USERNAME
@@ -206,7 +596,7 @@ class GlowAgent:
             if len(msg.split()) == 1 and msg.isalnum() and len(msg) >= 3:
                 data["username"] = msg
                 self.signup_state["step"] = "username"
-                print(f"🔥 STEP 2 COMPLETE: Username = '{msg}', moving to step 'username'")
+                log.debug("step_complete", step="name", next_step="username", username=msg)
                 return
         
         # STEP 3: Have username -> waiting for PASSWORD (after validation)
@@ -215,7 +605,7 @@ class GlowAgent:
             if len(msg) >= 6 and not msg.isdigit():  # Not a verification code
                 data["password"] = msg
                 self.signup_state["step"] = "password"
-                print(f"🔥 STEP 3 COMPLETE: Password = '{msg}', moving to step 'password'")
+                log.debug("step_complete", step="username", next_step="password")
                 return
         
         # STEP 4: Have password -> waiting for EMAIL
@@ -228,69 +618,180 @@ class GlowAgent:
                 if email_match:
                     data["email"] = email_match.group()
                     self.signup_state["step"] = "email"
-                    print(f"🔥 STEP 4 COMPLETE: Email = '{email_match.group()}', moving to step 'email'")
+                    log.debug("step_complete", step="password", next_step="email")
                     return
+            elif not self.fast_validation and len(msg) >= 6 and not msg.isdigit():
+                # The agent moves here once the username checks out, so this is
+                # the password (or a stronger one) - kept for save_user_to_database
+                data["password"] = msg
+                log.debug("password_captured", step=current_step)
+                return
         
         # STEP 5: Have email -> waiting for VERIFICATION CODE
         elif current_step == "verification":
             # Looking for 6-digit code
             if msg.isdigit() and len(msg) == 6:
-                print(f"🔥 STEP 5: Verification code attempt = '{msg}'")
+                log.debug("verification_code_entered", step=current_step)
                 # Let the verification tool handle this
                 return
         
-        print(f"🔥 INPUT NOT PROCESSED: '{msg}' at step '{current_step}'")
+        log.debug("input_not_processed", step=current_step)
+    
+    def _response_cache_key(self, message: str, step_before: str, outcome):
+        """What a fast-path reply depends on. When the message was captured as
+        a value (name, username, ...) only the outcome matters, so the value
+        itself stays out of the key."""
+        step = self.signup_state["step"]
+        captured = outcome is not None or step != step_before
+        return (step_before, step, outcome, "" if captured else normalize_input(message))
+    
+    def _reply_secrets(self, message: str, submitted: dict) -> list:
+        """What a cached reply must never contain: the password and code as
+        typed, and any name/username/email validation just rejected - the
+        next user's state has nothing to fill its placeholder back in with,
+        so it would reach them verbatim"""
+        data = self.signup_state["data"]
+        msg = message.strip()
+        secrets = [submitted["password"], msg if msg.isdigit() else None]
+        secrets += [submitted[field] for field in PLACEHOLDERS if submitted[field] != data[field]]
+        return secrets
+    
+    def _run_tool(self, tool, **arguments) -> str:
+        return tool.invoke(arguments, config={"callbacks": [_metrics_handler]})
+    
+    def _validate_locally(self, message: str, step_before: str):
+        """Run the validator for whatever _process_user_input just captured and
+        advance or roll back the step on the result - what the model used to
+        do with tool calls. Returns (outcome code, note for the prompt), both
+        None when nothing was captured."""
+        state = self.signup_state
+        data = state["data"]
+        attempts = state["attempts"]
+        step = state["step"]
+        
+        if step_before == "name" and step == "username":
+            username = data["username"]
+            if self._run_tool(check_username_available, username=username) == "taken":
+                attempts["username"] += 1
+                data["username"] = None
+                state["step"] = "name"
+                log.debug("validation_failed", field="username", attempt=attempts["username"])
+                return "username_taken", f"Username '{username}' is TAKEN. Tell them and ask for a different username."
+            return "username_available", f"Username '{username}' is available. Hype it and ask for a password."
+        
+        if step_before == "username" and step == "password":
+            strength = self._run_tool(validate_password_strength, password=data["password"])
+            if strength != "strong":
+                attempts["password"] += 1
+                data["password"] = None
+                state["step"] = "username"
+                log.debug("validation_failed", field="password", attempt=attempts["password"])
+                reason = "too short (under 6 characters)" if strength == "too_short" else "too weak"
+                return f"password_{strength}", f"Their password is {reason}. Ask for a stronger one."
+            return "password_strong", "Their password is strong. Ask for their email."
+        
+        if step_before == "password" and step == "email":
+            email = data["email"]
+            if self._run_tool(validate_email_format, email=email) != "valid":
+                attempts["email"] += 1
+                data["email"] = None
+                state["step"] = "password"
+                log.debug("validation_failed", field="email", attempt=attempts["email"])
+                return "email_invalid", f"The email '{email}' is invalid. Ask them to double check it."
+            if email_registered(email):
+                attempts["email"] += 1
+                data["email"] = None
+                state["step"] = "password"
+                log.debug("validation_failed", field="email_taken", attempt=attempts["email"])
+                return "email_taken", f"The email '{email}' already has a Glow account. Tell them and ask for a different email."
+            if self._run_tool(generate_and_send_verification_code, email=email) != "sent":
+                data["email"] = None
+                state["step"] = "password"
+                return "code_send_failed", f"The email '{email}' looks fine but sending the code FAILED. Apologize and ask for their email again."
+            data["verification_code_sent"] = True
+            state["step"] = "verification"
+            return "code_sent", f"A 6-digit verification code was just sent to {email}. Tell them to check their email and enter it."
+        
+        if step_before == "verification" and verification_email_status(data["email"]) == "failed":
+            # The background sender gave up on the code email - get a new address
+            email = data["email"]
+            data["email"] = None
+            data["verification_code_sent"] = False
+            state["step"] = "password"
+            return "code_send_failed", f"The verification email to '{email}' could not be delivered. Apologize and ask for their email again."
+        
+        if step_before == "verification" and message.strip().isdigit() and len(message.strip()) == 6:
+            if self._run_tool(verify_code, email=data["email"], entered_code=message.strip()) != "correct":
+                attempts["verification"] += 1
+                log.debug("validation_failed", field="verification", attempt=attempts["verification"])
+                return "code_wrong", "That verification code is wrong. Ask them to check their email and try again."
+            data["verified"] = True
+            saved = self._run_tool(save_user_to_database, name=data["name"], username=data["username"],
+                                   email=data["email"])
+            if saved == "missing_password":
+                state["step"] = "username"
+                return "password_missing", "Their password didn't get saved. Apologize and ask for a password again."
+            if saved != "saved_successfully":
+                # Lost a race for the username since it was checked - pick another
+                data["username"] = None
+                state["step"] = "name"
+                return "username_taken", "Their username got taken while they were signing up. Apologize and ask for a different username."
+            state["step"] = "complete"
+            log.info("signup_finished")
+            return "signup_complete", "The code is correct and their account is saved! Celebrate and tell them you're launching the app."
+        
+        return None, None
     
     def _process_glow_response(self, response: str):
         """Update state based on what Glow did - FIXED LOGIC"""
         response_lower = response.lower()
         current_step = self.signup_state["step"]
         
-        print(f"🔥 PROCESSING GLOW RESPONSE at step '{current_step}': '{response_lower[:100]}...'")
+        log.debug("process_response", step=current_step, length=len(response))
         
         # Handle state transitions based on successful validations
         
         # Username validation success -> move to password step
         if current_step == "username" and ("available" in response_lower or "great choice" in response_lower):
             self.signup_state["step"] = "password"
-            print("🔥 Username approved, moving to password step")
+            log.debug("step_complete", step="username", next_step="password")
         
         # Password validation success -> move to email step  
         elif current_step == "password" and ("strong" in response_lower or "good password" in response_lower):
             self.signup_state["step"] = "email"
-            print("🔥 Password approved, moving to email step")
+            log.debug("step_complete", step="password", next_step="email")
         
         # Email validation success -> move to verification step
         elif current_step == "email" and ("code sent" in response_lower or "sent to" in response_lower or "check your email" in response_lower):
             self.signup_state["step"] = "verification"
             self.signup_state["data"]["verification_code_sent"] = True
-            print("🔥 Email approved and code sent, moving to verification step")
+            log.debug("step_complete", step="email", next_step="verification")
         
         # Verification success -> move to complete step
         elif current_step == "verification" and ("correct" in response_lower or "verified" in response_lower):
             self.signup_state["step"] = "complete"
             self.signup_state["data"]["verified"] = True
-            print("🔥 Verification successful, moving to complete step")
+            log.debug("step_complete", step="verification", next_step="complete")
         
         # Final completion
         elif current_step == "complete" and ("launching" in response_lower or "saved successfully" in response_lower):
-            print("🔥 Signup completely finished!")
+            log.info("signup_finished")
         
         # Handle validation failures - stay in current step
         elif "taken" in response_lower or "already exists" in response_lower:
             self.signup_state["attempts"]["username"] += 1
-            print(f"🔥 Username validation failed, attempt #{self.signup_state['attempts']['username']}")
+            log.debug("validation_failed", field="username", attempt=self.signup_state['attempts']['username'])
         
         elif "short" in response_lower or "weak" in response_lower:
             self.signup_state["attempts"]["password"] += 1
-            print(f"🔥 Password validation failed, attempt #{self.signup_state['attempts']['password']}")
+            log.debug("validation_failed", field="password", attempt=self.signup_state['attempts']['password'])
         
         elif "invalid" in response_lower and "email" in response_lower:
             self.signup_state["attempts"]["email"] += 1
-            print(f"🔥 Email validation failed, attempt #{self.signup_state['attempts']['email']}")
+            log.debug("validation_failed", field="email", attempt=self.signup_state['attempts']['email'])
         
         elif "wrong" in response_lower or "incorrect" in response_lower:
             self.signup_state["attempts"]["verification"] += 1
-            print(f"🔥 Verification failed, attempt #{self.signup_state['attempts']['verification']}")
+            log.debug("validation_failed", field="verification", attempt=self.signup_state['attempts']['verification'])
         
-        print(f"🔥 FINAL STATE after processing response: step='{self.signup_state['step']}'")
\ No newline at end of file
+        log.debug("response_processed", step=self.signup_state['step'])
\ No newline at end of file
@@ -0,0 +1,88 @@
+# glow_logging.py - Leveled, sampled, structured logs
+#
+# Configured from the environment by configure_logging():
+#   GLOW_LOG_LEVEL          DEBUG / INFO / WARNING / ... for Glow's own loggers
+#                           (default INFO); libraries only log warnings and up
+#   GLOW_LOG_FORMAT         json (default) or text
+#   GLOW_LOG_SAMPLE_RATE    share of DEBUG/INFO records kept, 0-1 (default 1);
+#                           warnings and errors are always kept
+#
+# Log with keyword fields instead of formatting strings, so nothing is built
+# for records that are filtered out:
+#   log = get_logger(__name__)
+#   log.debug("step_complete", step="name", next_step="username")
+import json
+import logging
+import os
+import random
+import sys
+import time
+
+_RESERVED = ('exc_info', 'stack_info', 'stacklevel', 'extra')
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line: ts, level, logger, event, then the fields"""
+
+    def format(self, record):
+        entry = {
+            "ts": round(record.created, 3),
+            "level": record.levelname.lower(),
+            "logger": record.name,
+            "event": record.getMessage()
+        }
+        entry.update(getattr(record, "fields", {}))
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+class TextFormatter(logging.Formatter):
+    """Human-readable variant for local development"""
+
+    def format(self, record):
+        fields = " ".join(f"{key}={value!r}" for key, value in getattr(record, "fields", {}).items())
+        line = f"{time.strftime('%H:%M:%S', time.localtime(record.created))} {record.levelname:7s} {record.name}: {record.getMessage()} {fields}"
+        if record.exc_info:
+            line += "\n" + self.formatException(record.exc_info)
+        return line.rstrip()
+
+
+class SampleFilter(logging.Filter):
+    """Keep a random `rate` share of records below WARNING"""
+
+    def __init__(self, rate):
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record):
+        return record.levelno >= logging.WARNING or self.rate >= 1 or random.random() < self.rate
+
+
+class FieldsAdapter(logging.LoggerAdapter):
+    """Turns keyword arguments into structured fields on the record"""
+
+    def process(self, msg, kwargs):
+        fields = {key: kwargs.pop(key) for key in list(kwargs) if key not in _RESERVED}
+        kwargs["extra"] = {**kwargs.get("extra", {}), "fields": fields}
+        return msg, kwargs
+
+
+def get_logger(name):
+    """Logger under the `glow` namespace, which GLOW_LOG_LEVEL controls"""
+    return FieldsAdapter(logging.getLogger(f"glow.{name}"), {})
+
+
+def configure_logging():
+    """Install the handler on the root logger (once) from GLOW_LOG_* settings"""
+    root = logging.getLogger()
+    if any(getattr(handler, "_glow", False) for handler in root.handlers):
+        return
+
+    handler = logging.StreamHandler(sys.stdout)
+    handler._glow = True
+    handler.setFormatter(TextFormatter() if os.getenv("GLOW_LOG_FORMAT", "json") == "text" else JsonFormatter())
+    handler.addFilter(SampleFilter(float(os.getenv("GLOW_LOG_SAMPLE_RATE", 1.0))))
+    root.addHandler(handler)
+    root.setLevel(logging.WARNING)
+    logging.getLogger("glow").setLevel(os.getenv("GLOW_LOG_LEVEL", "INFO").upper())
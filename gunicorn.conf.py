@@ -0,0 +1,29 @@
+# gunicorn.conf.py - Production server settings (see Procfile)
+#
+# Several worker processes share chat sessions through the SQLite session
+# store (GLOW_SESSION_STORE=sqlite), so any worker can serve any turn.
+import os
+import tempfile
+
+bind = f"0.0.0.0:{os.getenv('PORT', 5000)}"
+workers = int(os.getenv("WEB_CONCURRENCY", 2))
+# Turns spend most of their time waiting on the LLM, so threads go a long way
+threads = int(os.getenv("GUNICORN_THREADS", 8))
+worker_class = "gthread"
+timeout = int(os.getenv("GUNICORN_TIMEOUT", 120))  # Streams stay open for a whole LLM reply
+keepalive = 5
+
+# Per-worker metric files, aggregated by metrics.render()
+os.environ.setdefault("PROMETHEUS_MULTIPROC_DIR", tempfile.mkdtemp(prefix="glow-metrics-"))
+
+
+def child_exit(server, worker):
+    from prometheus_client import multiprocess
+    multiprocess.mark_process_dead(worker.pid)
+
+
+def post_worker_init(worker):
+    # The port is already bound by the arbiter: warm this worker's DB,
+    # matcher and LLM clients in the background instead of before serving
+    from app import start_warm_up
+    start_warm_up()
@@ -0,0 +1,74 @@
+# metrics.py - Prometheus metrics for every stage of a Glow request
+#
+# Everything is exported by app.py on /metrics. Histograms are labelled by
+# stage/tool/source so one family covers each kind of work, e.g.
+#   histogram_quantile(0.99, sum by (le, stage) (rate(glow_stage_seconds_bucket[5m])))
+#
+# Under gunicorn each worker has its own registry; set PROMETHEUS_MULTIPROC_DIR
+# (gunicorn.conf.py does) and /metrics aggregates all of them.
+import os
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST, CollectorRegistry, Counter, Gauge, Histogram, generate_latest, multiprocess
+)
+
+# From sub-millisecond cache and SQLite hits up to slow LLM round trips
+LATENCY_BUCKETS = (.0005, .001, .0025, .005, .01, .025, .05, .1, .25, .5, 1, 2.5, 5, 10, 30)
+TOKEN_BUCKETS = (16, 64, 128, 256, 512, 1024, 2048, 4096, 8192, 16384, 32768)
+
+STAGE_SECONDS = Histogram(
+    'glow_stage_seconds', 'Time spent in each stage of a chat turn',
+    ['stage'], buckets=LATENCY_BUCKETS
+)
+TOOL_SECONDS = Histogram(
+    'glow_tool_seconds', 'Run time of each signup tool',
+    ['tool', 'status'], buckets=LATENCY_BUCKETS
+)
+LLM_SECONDS = Histogram(
+    'glow_llm_seconds', 'LLM call latency',
+    ['model'], buckets=LATENCY_BUCKETS
+)
+LLM_TOKENS = Histogram(
+    'glow_llm_tokens', 'Tokens per LLM call',
+    ['kind'], buckets=TOKEN_BUCKETS  # kind: prompt / completion
+)
+PROMPT_TOKENS = Histogram(
+    'glow_turn_prompt_tokens', 'Prompt tokens of each chat-turn LLM call, as reported by the API',
+    ['memory'], buckets=TOKEN_BUCKETS  # memory: buffer / summary
+)
+EMBEDDING_SECONDS = Histogram(
+    'glow_embedding_seconds', 'Embedding lookups, by where the vector came from',
+    ['source'], buckets=LATENCY_BUCKETS  # source: cache / api / batch / error
+)
+SQLITE_SECONDS = Histogram(
+    'glow_sqlite_seconds', 'SQLite reads and writes, including waiting for a connection',
+    ['db', 'op'], buckets=LATENCY_BUCKETS
+)
+SMTP_SECONDS = Histogram(
+    'glow_smtp_send_seconds', 'Verification email sends',
+    ['status'], buckets=LATENCY_BUCKETS
+)
+EMAIL_QUEUE_DEPTH = Gauge(
+    'glow_email_queue_depth', 'Emails waiting to be sent, including ones waiting to retry',
+    multiprocess_mode='livesum'
+)
+
+# Hit rate: sum(rate(glow_response_cache_lookups_total{result!="miss"}[5m]))
+#           / sum(rate(glow_response_cache_lookups_total[5m]))
+RESPONSE_CACHE_LOOKUPS = Counter(
+    'glow_response_cache_lookups', 'Response cache lookups',
+    ['result']  # result: hit / semantic_hit / miss
+)
+RESPONSE_CACHE_SIZE = Gauge(
+    'glow_response_cache_keys', 'Keys held by the response cache',
+    multiprocess_mode='livesum'  # Each worker has its own cache
+)
+
+
+def render():
+    """(body, content type) of the Prometheus text exposition"""
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry), CONTENT_TYPE_LATEST
+    return generate_latest(), CONTENT_TYPE_LATEST
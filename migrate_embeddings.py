@@ -0,0 +1,17 @@
+# migrate_embeddings.py - One-shot conversion of JSON embeddings to binary BLOBs
+# Usage: python migrate_embeddings.py [path/to/dating_embeddings.db]
+# (defaults to $DATING_DB_PATH)
+import os
+import sys
+
+from embedding_service import DATING_DB_PATH, migrate_embeddings_to_blob
+
+db_path = sys.argv[1] if len(sys.argv) > 1 else DATING_DB_PATH
+
+size_before = os.path.getsize(db_path)
+converted = migrate_embeddings_to_blob(db_path)
+size_after = os.path.getsize(db_path)
+
+for table, count in converted.items():
+    print(f"✅ {table}: converted {count} rows")
+print(f"📦 {db_path}: {size_before / 1e6:.2f} MB -> {size_after / 1e6:.2f} MB")
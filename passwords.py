@@ -0,0 +1,193 @@
+# passwords.py - Password hashing off the request threads
+#
+# Stored hashes say how they were made, so the algorithm and its cost can
+# change without breaking existing users:
+#   scrypt$n=16384,r=8,p=1$<salt>$<key>
+#   pbkdf2_sha256$i=600000$<salt>$<key>
+#   <64 hex chars>  - legacy unsalted sha256, upgraded on the next verify
+import base64
+import hashlib
+import hmac
+import multiprocessing
+import os
+import re
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+_LEGACY_SHA256 = re.compile(r'^[0-9a-f]{64}$')
+
+
+def _b64(data):
+    return base64.b64encode(data).decode('ascii').rstrip('=')
+
+
+def _unb64(text):
+    return base64.b64decode(text + '=' * (-len(text) % 4))
+
+
+class PasswordHasher:
+    """One KDF with fixed cost parameters. derive() is what runs in the pool,
+    so hashers must pickle - keep them to plain attributes."""
+
+    name = None
+    limits = {}  # Parameter -> (lowest, highest) a stored hash may use
+
+    @classmethod
+    def from_params(cls, **params):
+        """Hasher with these cost parameters, if they are within limits -
+        a stored hash picks its own cost, and verify() pays it"""
+        for key, value in params.items():
+            if key not in cls.limits:
+                raise ValueError(f"Unknown {cls.name} parameter {key!r}")
+            low, high = cls.limits[key]
+            if not low <= value <= high:
+                raise ValueError(f"{cls.name} {key}={value} is outside {low}..{high}")
+        return cls(**params)
+
+    def derive(self, password, salt):
+        raise NotImplementedError
+
+    def params(self):
+        """Cost parameters as stored in the hash, e.g. {"i": 600000}"""
+        raise NotImplementedError
+
+    def encode(self, salt, key):
+        params = ','.join(f"{key_}={value}" for key_, value in self.params().items())
+        return f"{self.name}${params}${_b64(salt)}${_b64(key)}"
+
+
+class ScryptHasher(PasswordHasher):
+    """Memory-hard: each hash needs 128 * n * r bytes (16 MB at the defaults)"""
+
+    name = "scrypt"
+    limits = {"n": (2 ** 10, 2 ** 17), "r": (1, 16), "p": (1, 4)}
+
+    @classmethod
+    def from_params(cls, **params):
+        n = params.get("n", 2 ** 14)
+        if n & (n - 1):
+            raise ValueError(f"scrypt n={n} is not a power of 2")
+        return super().from_params(**params)
+
+    def __init__(self, n=2 ** 14, r=8, p=1):
+        self.n, self.r, self.p = n, r, p
+
+    def derive(self, password, salt):
+        return hashlib.scrypt(password.encode('utf-8'), salt=salt, n=self.n, r=self.r, p=self.p,
+                              maxmem=256 * self.n * self.r * self.p, dklen=32)
+
+    def params(self):
+        return {"n": self.n, "r": self.r, "p": self.p}
+
+
+class PBKDF2Hasher(PasswordHasher):
+    name = "pbkdf2_sha256"
+    limits = {"i": (10000, 5000000)}
+
+    def __init__(self, i=600000):
+        self.i = i
+
+    def derive(self, password, salt):
+        return hashlib.pbkdf2_hmac('sha256', password.encode('utf-8'), salt, self.i)
+
+    def params(self):
+        return {"i": self.i}
+
+
+HASHERS = {hasher.name: hasher for hasher in (ScryptHasher, PBKDF2Hasher)}
+
+
+def _parse(stored):
+    """(hasher with the stored parameters, salt, key) of a stored hash"""
+    name, params, salt, key = stored.split('$')
+    params = dict(item.split('=') for item in params.split(',')) if params else {}
+    hasher = HASHERS[name].from_params(**{key_: int(value) for key_, value in params.items()})
+    return hasher, _unb64(salt), _unb64(key)
+
+
+def hasher_from_env():
+    """GLOW_PASSWORD_HASH ("scrypt" or "pbkdf2_sha256") with its cost from
+    GLOW_SCRYPT_N / _R / _P or GLOW_PBKDF2_ITERATIONS"""
+    name = os.getenv("GLOW_PASSWORD_HASH", "scrypt")
+    # Held to the same limits as stored hashes, or its own hashes wouldn't verify
+    if name == "scrypt":
+        return ScryptHasher.from_params(n=int(os.getenv("GLOW_SCRYPT_N", 2 ** 14)),
+                                        r=int(os.getenv("GLOW_SCRYPT_R", 8)),
+                                        p=int(os.getenv("GLOW_SCRYPT_P", 1)))
+    if name == "pbkdf2_sha256":
+        return PBKDF2Hasher.from_params(i=int(os.getenv("GLOW_PBKDF2_ITERATIONS", 600000)))
+    raise ValueError(f"Unknown GLOW_PASSWORD_HASH {name!r}, expected one of {sorted(HASHERS)}")
+
+
+class PasswordService:
+    """hash() and verify() for request threads; the KDF itself runs in a
+    pool of `workers` processes, so a burst of signups can't hold the GIL
+    or pile up more than `max_pending` hashes (callers wait for a slot).
+    workers=0 hashes inline - for scripts and debugging."""
+
+    def __init__(self, hasher, workers=2, max_pending=None):
+        self.hasher = hasher
+        self.workers = workers
+        self._slots = threading.BoundedSemaphore(max_pending or max(workers, 1) * 4)
+        self._pool = None
+        self._pool_lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls):
+        return cls(hasher_from_env(), workers=int(os.getenv("GLOW_HASH_WORKERS", 2)))
+
+    def _derive(self, hasher, password, salt):
+        if not self.workers:
+            return hasher.derive(password, salt)
+        with self._slots:
+            return self._get_pool().submit(hasher.derive, password, salt).result()
+
+    def _get_pool(self):
+        with self._pool_lock:
+            if self._pool is None:
+                # spawn, not fork: the app process has threads (and locks) by now
+                self._pool = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context("spawn"))
+            return self._pool
+
+    def hash(self, password):
+        salt = os.urandom(16)
+        return self.hasher.encode(salt, self._derive(self.hasher, password, salt))
+
+    def needs_rehash(self, stored):
+        return not stored.startswith(f"{self.hasher.name}$") or _parse(stored)[0].params() != self.hasher.params()
+
+    def verify(self, password, stored):
+        """(matches, new hash to store or None). The new hash is set when the
+        stored one is legacy sha256 or from an older algorithm/cost. A hash
+        that doesn't parse, or asks for a cost outside the limits, never
+        matches."""
+        if _LEGACY_SHA256.match(stored):
+            legacy = hashlib.sha256(password.encode('utf-8')).hexdigest()
+            matches = hmac.compare_digest(legacy, stored)
+        else:
+            try:
+                hasher, salt, key = _parse(stored)
+            except (ValueError, KeyError):
+                return False, None
+            matches = hmac.compare_digest(self._derive(hasher, password, salt), key)
+        if matches and self.needs_rehash(stored):
+            return True, self.hash(password)
+        return matches, None
+
+    def close(self):
+        with self._pool_lock:
+            if self._pool is not None:
+                self._pool.shutdown()
+                self._pool = None
+
+
+_service = None
+_service_lock = threading.Lock()
+
+def get_password_service():
+    """Process-wide PasswordService"""
+    global _service
+    with _service_lock:
+        if _service is None:
+            _service = PasswordService.from_env()
+        return _service
@@ -0,0 +1,43 @@
+# precompute_matches.py - Top-k profiles for every stored conversation, offline
+#
+#   python precompute_matches.py --output precomputed_matches --top-k 20 --workers 4
+#
+# Safe to interrupt: run the same command again to resume from the last
+# finished block (--restart to take a fresh snapshot of the DB instead).
+# Serve the result by pointing GLOW_PRECOMPUTED_MATCHES at the output
+# directory; /api/dating-matches/conversation/<id> then reads from it.
+import os
+
+os.environ.setdefault("OPENBLAS_NUM_THREADS", "1")  # Parallelism comes from the process pool
+os.environ.setdefault("OMP_NUM_THREADS", "1")
+os.environ.setdefault("MKL_NUM_THREADS", "1")
+
+import argparse
+import time
+
+from precomputed_matches import precompute
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Precompute top-k matches for every stored conversation")
+    parser.add_argument('--db', default=os.getenv("DATING_DB_PATH", "dating_embeddings.db"))
+    parser.add_argument('--output', default=os.getenv("GLOW_PRECOMPUTED_MATCHES", "precomputed_matches"))
+    parser.add_argument('--top-k', type=int, default=20)
+    parser.add_argument('--block-size', type=int, default=512, help="conversations per work item")
+    parser.add_argument('--workers', type=int, default=None, help="processes (default: one per CPU)")
+    parser.add_argument('--restart', action='store_true', help="ignore an earlier partial run")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+
+    def progress(done, total):
+        print(f"\r⏳ {done}/{total} blocks, {time.perf_counter() - start:.0f}s", end='', flush=True)
+
+    meta = precompute(args.db, args.output, top_k=args.top_k, block_size=args.block_size,
+                      workers=args.workers, restart=args.restart, progress=progress)
+    print(f"\n✅ {meta['conversations']} conversations x {meta['profiles']} profiles -> {args.output} "
+          f"in {time.perf_counter() - start:.1f}s")
+
+
+if __name__ == '__main__':
+    main()
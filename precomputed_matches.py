@@ -0,0 +1,225 @@
+# precomputed_matches.py - Top-k profiles for every stored conversation, computed offline
+#
+# precompute() scores every girl_conversations embedding against every
+# guy_profiles embedding and writes the top k into a directory of .npy files:
+#
+#   meta.json            what was scored (counts, k, last ids) and the block size
+#   profiles.npy         unit-length profile matrix the workers share (memory-mapped)
+#   profile_ids.npy      guy_profiles id per profiles.npy row
+#   conversation_ids.npy girl_conversations ids, one output row each, ascending
+#   row_of.npy           conversation id -> output row (-1 if none), for O(1) lookups
+#   match_ids.npy        (conversations, k) profile ids, best first (-1 = no match)
+#   match_scores.npy     (conversations, k) cosine similarities
+#   done.npy             1 per finished block - the checkpoint
+#
+# Run it with precompute_matches.py; serve from it with PrecomputedMatches.
+import json
+import os
+import sqlite3
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+
+from embedding_codec import decode_embedding, normalize_rows
+from glow_logging import get_logger
+
+log = get_logger(__name__)
+
+PROFILE_TILE = 2048  # Profiles scored per step: tile x dims floats stays cache-sized
+FILES = ('meta.json', 'profiles.npy', 'profile_ids.npy', 'conversation_ids.npy', 'row_of.npy',
+         'match_ids.npy', 'match_scores.npy', 'done.npy')
+
+
+def _merge_top(ids, scores, new_ids, new_scores, k):
+    """Best k per row out of two (rows, n) candidate sets, best first"""
+    ids = np.concatenate([ids, new_ids], axis=1)
+    scores = np.concatenate([scores, new_scores], axis=1)
+    if scores.shape[1] > k:
+        keep = np.argpartition(scores, -k, axis=1)[:, -k:]
+        ids, scores = np.take_along_axis(ids, keep, axis=1), np.take_along_axis(scores, keep, axis=1)
+    order = np.argsort(-scores, axis=1)
+    return np.take_along_axis(ids, order, axis=1), np.take_along_axis(scores, order, axis=1)
+
+
+def _load_profiles(db_path):
+    """(ids, unit-length float32 matrix) of every guy profile, in id order"""
+    conn = sqlite3.connect(db_path)
+    try:
+        rows = conn.execute('SELECT id, embedding FROM guy_profiles WHERE embedding IS NOT NULL ORDER BY id').fetchall()
+    finally:
+        conn.close()
+    if not rows:
+        return np.empty(0, dtype=np.int64), np.empty((0, 0), dtype=np.float32)
+    vectors = [decode_embedding(row[1]) for row in rows]
+    # Keep the common size - rows a running reembed() hasn't reached can't be compared
+    dims = np.bincount([len(vector) for vector in vectors]).argmax()
+    keep = [i for i, vector in enumerate(vectors) if len(vector) == dims]
+    ids = np.array([rows[i][0] for i in keep], dtype=np.int64)
+    return ids, normalize_rows(np.vstack([vectors[i] for i in keep]).astype(np.float32))
+
+
+def _score_block(db_path, output_dir, block, start, stop):
+    """Worker: top-k for output rows [start, stop), written straight into the
+    memory-mapped output files. Returns the block number once flushed."""
+    meta = _read_meta(output_dir)
+    top_k = meta["top_k"]
+    profiles = np.load(os.path.join(output_dir, 'profiles.npy'), mmap_mode='r')
+    profile_ids = np.load(os.path.join(output_dir, 'profile_ids.npy'), mmap_mode='r')
+    conversation_ids = np.load(os.path.join(output_dir, 'conversation_ids.npy'), mmap_mode='r')[start:stop]
+
+    conn = sqlite3.connect(db_path)
+    try:
+        stored = dict(conn.execute(
+            'SELECT id, embedding FROM girl_conversations WHERE id BETWEEN ? AND ?',
+            (int(conversation_ids[0]), int(conversation_ids[-1]))
+        ).fetchall())
+    finally:
+        conn.close()
+
+    count = stop - start
+    dims = profiles.shape[1] if profiles.ndim == 2 else 0
+    queries = np.zeros((count, dims), dtype=np.float32)
+    valid = np.zeros(count, dtype=bool)
+    for row, conversation_id in enumerate(conversation_ids):
+        blob = stored.get(int(conversation_id))
+        vector = decode_embedding(blob) if blob is not None else None
+        if vector is not None and len(vector) == dims:
+            queries[row] = vector
+            valid[row] = True
+    queries = normalize_rows(queries)
+
+    best_ids = np.full((count, 0), -1, dtype=np.int64)
+    best_scores = np.empty((count, 0), dtype=np.float32)
+    for tile_start in range(0, len(profile_ids), PROFILE_TILE):
+        tile = np.asarray(profiles[tile_start:tile_start + PROFILE_TILE])
+        scores = queries @ tile.T
+        tile_ids = np.broadcast_to(np.asarray(profile_ids[tile_start:tile_start + len(tile)]), scores.shape)
+        best_ids, best_scores = _merge_top(best_ids, best_scores, tile_ids, scores, top_k)
+
+    match_ids = np.load(os.path.join(output_dir, 'match_ids.npy'), mmap_mode='r+')
+    match_scores = np.load(os.path.join(output_dir, 'match_scores.npy'), mmap_mode='r+')
+    found = best_ids.shape[1]
+    match_ids[start:stop] = -1
+    match_scores[start:stop] = 0
+    match_ids[start:stop, :found] = np.where(valid[:, None], best_ids, -1)
+    match_scores[start:stop, :found] = np.where(valid[:, None], best_scores, 0)
+    match_ids.flush()
+    match_scores.flush()
+    return block
+
+
+def _read_meta(output_dir):
+    with open(os.path.join(output_dir, 'meta.json')) as f:
+        return json.load(f)
+
+
+def _prepare(db_path, output_dir, top_k, block_size):
+    """Snapshot conversations and profiles into fresh output files"""
+    os.makedirs(output_dir, exist_ok=True)
+    # Unlink rather than overwrite: a server may still have the old files mapped
+    for name in FILES:
+        if os.path.exists(os.path.join(output_dir, name)):
+            os.remove(os.path.join(output_dir, name))
+    profile_ids, profiles = _load_profiles(db_path)
+    conn = sqlite3.connect(db_path)
+    try:
+        conversation_ids = np.array(
+            [row[0] for row in conn.execute('SELECT id FROM girl_conversations WHERE embedding IS NOT NULL ORDER BY id')],
+            dtype=np.int64
+        )
+    finally:
+        conn.close()
+
+    np.save(os.path.join(output_dir, 'profiles.npy'), profiles)
+    np.save(os.path.join(output_dir, 'profile_ids.npy'), profile_ids)
+    np.save(os.path.join(output_dir, 'conversation_ids.npy'), conversation_ids)
+    row_of = np.full(int(conversation_ids[-1]) + 1 if len(conversation_ids) else 0, -1, dtype=np.int32)
+    row_of[conversation_ids] = np.arange(len(conversation_ids), dtype=np.int32)
+    np.save(os.path.join(output_dir, 'row_of.npy'), row_of)
+
+    shape = (len(conversation_ids), top_k)
+    np.lib.format.open_memmap(os.path.join(output_dir, 'match_ids.npy'), mode='w+', dtype=np.int64, shape=shape)[:] = -1
+    np.lib.format.open_memmap(os.path.join(output_dir, 'match_scores.npy'), mode='w+', dtype=np.float32, shape=shape)
+    blocks = (len(conversation_ids) + block_size - 1) // block_size
+    np.lib.format.open_memmap(os.path.join(output_dir, 'done.npy'), mode='w+', dtype=np.uint8, shape=(blocks,))
+
+    meta = {
+        "conversations": len(conversation_ids),
+        "profiles": len(profile_ids),
+        "last_profile_id": int(profile_ids[-1]) if len(profile_ids) else 0,
+        "top_k": top_k,
+        "block_size": block_size,
+        "created_at": time.time(),
+        "finished_at": None
+    }
+    # meta.json last: its presence means the files above are complete
+    with open(os.path.join(output_dir, 'meta.json'), 'w') as f:
+        json.dump(meta, f)
+    return meta
+
+
+def precompute(db_path, output_dir, top_k=20, block_size=512, workers=None, restart=False, progress=None):
+    """Fill output_dir with every conversation's top_k profiles.
+
+    Conversations go to a process pool `block_size` at a time; each worker
+    scores its block against the shared memory-mapped profile matrix
+    PROFILE_TILE profiles at a time, keeping a running top-k. Finished
+    blocks are recorded in done.npy, so an interrupted run picks up where it
+    stopped - unless restart=True, or top_k/block_size changed, which start
+    over from a fresh snapshot of the DB. Returns the meta dict.
+    """
+    meta_path = os.path.join(output_dir, 'meta.json')
+    meta = _read_meta(output_dir) if os.path.exists(meta_path) and not restart else None
+    if meta is None or meta["top_k"] != top_k or meta["block_size"] != block_size:
+        meta = _prepare(db_path, output_dir, top_k, block_size)
+
+    done = np.load(os.path.join(output_dir, 'done.npy'), mmap_mode='r+')
+    todo = [block for block in range(len(done)) if not done[block]]
+    log.info("precompute_start", conversations=meta["conversations"], profiles=meta["profiles"],
+             blocks=len(done), remaining=len(todo))
+
+    total = meta["conversations"]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [
+            pool.submit(_score_block, db_path, output_dir, block,
+                        block * block_size, min(total, (block + 1) * block_size))
+            for block in todo
+        ]
+        for future in as_completed(futures):
+            block = future.result()
+            done[block] = 1
+            done.flush()  # Checkpoint: this block survives a crash from here on
+            if progress:
+                progress(int(done.sum()), len(done))
+
+    meta["finished_at"] = time.time()
+    with open(meta_path, 'w') as f:
+        json.dump(meta, f)
+    return meta
+
+
+class PrecomputedMatches:
+    """Read side of precompute(): matches for a stored conversation are two
+    array lookups in memory-mapped files, whatever the number of rows"""
+
+    def __init__(self, output_dir):
+        self.meta = _read_meta(output_dir)
+        self.top_k = self.meta["top_k"]
+        self._row_of = np.load(os.path.join(output_dir, 'row_of.npy'), mmap_mode='r')
+        self._ids = np.load(os.path.join(output_dir, 'match_ids.npy'), mmap_mode='r')
+        self._scores = np.load(os.path.join(output_dir, 'match_scores.npy'), mmap_mode='r')
+        self._done = np.load(os.path.join(output_dir, 'done.npy'), mmap_mode='r')
+        self._block_size = self.meta["block_size"]
+
+    def get(self, conversation_id, k=None):
+        """(profile ids, scores) best first, or None if the conversation wasn't
+        precomputed (newer than the run, or its block isn't done yet)"""
+        if not 0 <= conversation_id < len(self._row_of):
+            return None
+        row = int(self._row_of[conversation_id])
+        if row < 0 or not self._done[row // self._block_size]:
+            return None
+        ids = np.asarray(self._ids[row, :k or self.top_k])
+        keep = ids >= 0
+        return ids[keep], np.asarray(self._scores[row, :k or self.top_k])[keep]
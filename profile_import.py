@@ -0,0 +1,73 @@
+# profile_import.py - Bulk import of guy profiles from JSONL or CSV
+#
+# Usage: python profile_import.py profiles.jsonl [--chunk-size 4096]
+#            [--batch-size 512] [--concurrency 4]
+#
+# Each profile needs a name and a description (the text that gets embedded).
+# JSONL lines look like seed_profiles.jsonl: {"name", "description", "profile"}.
+# CSV files need name and description columns; a "profile" column holding JSON
+# is used as-is, otherwise every other column becomes a profile field.
+#
+# Embeddings go through EmbeddingMatcher.get_embeddings, which honours
+# OPENAI_BASE_URL - point it at fake_embeddings_server.py to try an import
+# offline.
+import argparse
+import csv
+import json
+import time
+
+
+def _parse_csv_value(value):
+    """CSV cells are strings; recover numbers and lists where they're JSON"""
+    try:
+        return json.loads(value)
+    except ValueError:
+        return value
+
+
+def read_profiles(path):
+    """Yield {"name", "description", "profile"} dicts from a .jsonl or .csv file"""
+    with open(path, newline='', encoding='utf-8') as f:
+        if path.endswith('.csv'):
+            for row in csv.DictReader(f):
+                name = row.pop('name')
+                description = row.pop('description')
+                if 'profile' in row:
+                    profile = json.loads(row['profile'])
+                else:
+                    profile = {key: _parse_csv_value(value) for key, value in row.items() if value != ''}
+                yield {"name": name, "description": description, "profile": profile}
+        else:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Import guy profiles with embeddings")
+    parser.add_argument('path', help="profiles as .jsonl or .csv")
+    parser.add_argument('--chunk-size', type=int, default=4096, help="rows per insert transaction")
+    parser.add_argument('--batch-size', type=int, default=512, help="texts per embeddings request")
+    parser.add_argument('--concurrency', type=int, default=4, help="embeddings requests in flight")
+    args = parser.parse_args()
+
+    from embedding_service import get_matcher
+    matcher = get_matcher()
+
+    start = time.perf_counter()
+    result = matcher.import_profiles(
+        read_profiles(args.path),
+        chunk_size=args.chunk_size,
+        batch_size=args.batch_size,
+        concurrency=args.concurrency
+    )
+    elapsed = time.perf_counter() - start
+
+    print(f"✅ Imported {result['imported']} profiles in {elapsed:.1f}s "
+          f"({result['imported'] / elapsed if elapsed else 0:.0f}/s)")
+    if result['failed']:
+        print(f"❌ {result['failed']} profiles could not be embedded and were skipped")
+
+
+if __name__ == '__main__':
+    main()
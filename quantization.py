@@ -0,0 +1,54 @@
+# quantization.py - Smaller in-memory embeddings (float16 / int8)
+import numpy as np
+
+STORAGE_MODES = ('float32', 'float16', 'int8')
+SCORE_CHUNK = 256  # Rows widened to float32 at a time; small enough to stay in cache
+
+
+def quantize(vectors, mode):
+    """(data, scales) for unit-length float32 rows.
+
+    int8 uses one scale per vector (its largest magnitude maps to 127), which
+    keeps each row's relative precision regardless of its value range. The
+    other modes need no scales.
+    """
+    vectors = np.asarray(vectors, dtype=np.float32)
+    if mode == 'float32':
+        return np.ascontiguousarray(vectors), None
+    if mode == 'float16':
+        return np.ascontiguousarray(vectors, dtype=np.float16), None
+    if mode == 'int8':
+        scales = np.abs(vectors).max(axis=1, initial=0.0) / 127
+        scales[scales == 0] = 1.0
+        data = np.rint(vectors / scales[:, None]).astype(np.int8)
+        return np.ascontiguousarray(data), scales.astype(np.float32)
+    raise ValueError(f"Unknown storage mode {mode!r}, expected one of {STORAGE_MODES}")
+
+
+def dequantize(data, scales):
+    """Back to float32 (approximately, for the lossy modes)"""
+    vectors = data.astype(np.float32)
+    if scales is not None:
+        vectors *= scales[:, None]
+    return vectors
+
+
+def quantized_scores(data, scales, query):
+    """Dot products of every row with a float32 query - or with each column
+    of a (dims, n) matrix of queries, giving (rows, n) scores.
+
+    Narrow rows are widened a chunk at a time into one reused buffer, so
+    scoring never materialises a float32 copy of the whole matrix.
+    """
+    if data.dtype == np.float32:
+        return data @ query
+    scores = np.empty((len(data),) + query.shape[1:], dtype=np.float32)
+    buffer = np.empty((min(SCORE_CHUNK, len(data)), data.shape[1]), dtype=np.float32)
+    for start in range(0, len(data), SCORE_CHUNK):
+        chunk = data[start:start + SCORE_CHUNK]
+        widened = buffer[:len(chunk)]
+        np.copyto(widened, chunk, casting='unsafe')
+        np.dot(widened, query, out=scores[start:start + len(chunk)])
+    if scales is not None:
+        scores *= scales.reshape((-1,) + (1,) * (scores.ndim - 1))
+    return scores
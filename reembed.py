@@ -0,0 +1,55 @@
+# reembed.py - Re-embed stored profiles and conversations at a new size
+#
+#   python reembed.py --dimensions 512
+#
+# Then set GLOW_EMBEDDING_DIMENSIONS=512 so new text is embedded to match.
+# Ranking overlap with exact search is reported before and after; pick
+# GLOW_COARSE_DIMENSIONS the same way with --measure-only.
+import argparse
+import time
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Re-embed stored vectors at a new dimension")
+    parser.add_argument('--dimensions', type=int, default=None, help="target size (default: model default)")
+    parser.add_argument('--chunk-size', type=int, default=4096, help="rows per update transaction")
+    parser.add_argument('--batch-size', type=int, default=512, help="texts per embeddings request")
+    parser.add_argument('--concurrency', type=int, default=4, help="embeddings requests in flight")
+    parser.add_argument('--sample', type=int, default=100, help="conversations used to measure ranking")
+    parser.add_argument('--measure-only', action='store_true', help="only report ranking overlap")
+    args = parser.parse_args()
+
+    from embedding_service import get_matcher
+    matcher = get_matcher()
+
+    def report(label):
+        quality = matcher.ranking_quality(sample_size=args.sample)
+        if quality["overlap"] is None:
+            print(f"📏 {label}: no stored conversations to measure with")
+        else:
+            print(f"📏 {label}: top-6 overlap with exact search {quality['overlap']:.3f} "
+                  f"over {quality['queries']} conversations")
+
+    report("current")
+    if args.measure_only:
+        return
+
+    start = time.perf_counter()
+    result = matcher.reembed(
+        args.dimensions,
+        chunk_size=args.chunk_size,
+        batch_size=args.batch_size,
+        concurrency=args.concurrency
+    )
+    elapsed = time.perf_counter() - start
+
+    for table, counts in result.items():
+        print(f"✅ {table}: re-embedded {counts['updated']} rows")
+        if counts['failed']:
+            print(f"❌ {table}: {counts['failed']} rows could not be embedded and kept their old vector")
+    print(f"⏱️ {elapsed:.1f}s, {matcher.profile_index.bytes_per_profile} bytes per profile in memory")
+    report("after re-embedding")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,131 @@
+# response_cache.py - Reuse Glow's replies for turns that are all alike
+import random
+import re
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+from embedding_cache import normalize_text
+from metrics import RESPONSE_CACHE_LOOKUPS, RESPONSE_CACHE_SIZE
+
+PLACEHOLDERS = ('name', 'username', 'email')
+
+
+def normalize_input(text):
+    """normalize_text, minus punctuation and emoji - "Hey!!" and "hey" match"""
+    return re.sub(r'[^\w\s]', '', normalize_text(text)).strip()
+
+
+class ResponseCache:
+    """Pools of past replies keyed by what the reply actually depended on:
+    (step before, step after, validation outcome, normalized input).
+
+    A key only serves hits once it holds `variants` different replies, and
+    then a random one, so the persona doesn't repeat itself word for word.
+    Replies are stored with the user's name/username/email swapped for
+    placeholders and filled back in on the way out; replies that contain a
+    secret (password, code, a value that was rejected), in any case, are
+    never stored. Variants expire after `ttl` seconds and the least recently
+    used keys go beyond `max_keys`.
+
+    With `embed` (text -> vector), a miss on a key with free-text input falls
+    back to the most similar cached input in the same state, if its cosine
+    similarity is at least `similarity`.
+    """
+
+    def __init__(self, variants=3, ttl=24 * 3600, max_keys=5000, embed=None, similarity=0.92):
+        self.variants = variants
+        self.ttl = ttl
+        self.max_keys = max_keys
+        self.embed = embed
+        self.similarity = similarity
+        self._pools = OrderedDict()  # key -> [(stored_at, reply)]
+        self._vectors = {}           # key -> unit vector of its input (semantic lookups)
+        self._lock = threading.Lock()
+
+    def get(self, key, data):
+        """A cached reply for key, personalised with data, or None"""
+        now = time.time()
+        result = "hit"
+        with self._lock:
+            pool = self._live_pool(key, now)
+        if len(pool) < self.variants and self.embed and key[-1]:
+            # Embed outside the lock - it may be an API call
+            query = self._embed(key[-1])
+            with self._lock:
+                pool = self._similar_pool(key, query, now) if query is not None else []
+            result = "semantic_hit"
+        if len(pool) < self.variants:
+            RESPONSE_CACHE_LOOKUPS.labels("miss").inc()
+            return None
+        RESPONSE_CACHE_LOOKUPS.labels(result).inc()
+        _, reply = random.choice(pool)
+        return self._fill(reply, data)
+
+    def put(self, key, reply, data, secrets=()):
+        """Remember a freshly generated reply for key"""
+        folded = reply.casefold()
+        if any(secret and secret.casefold() in folded for secret in secrets):
+            return
+        template = self._templatize(reply, data)
+        vector = self._embed(key[-1]) if self.embed and key[-1] and key not in self._vectors else None
+        with self._lock:
+            pool = self._live_pool(key, time.time())
+            if template not in (stored for _, stored in pool):
+                pool.append((time.time(), template))
+                del pool[:-self.variants]
+            self._pools[key] = pool
+            self._pools.move_to_end(key)
+            if vector is not None:
+                self._vectors[key] = vector
+            while len(self._pools) > self.max_keys:
+                evicted, _ = self._pools.popitem(last=False)
+                self._vectors.pop(evicted, None)
+            RESPONSE_CACHE_SIZE.set(len(self._pools))
+
+    def __len__(self):
+        return len(self._pools)
+
+    def _live_pool(self, key, now):
+        """Unexpired variants for key (caller holds the lock)"""
+        pool = [entry for entry in self._pools.get(key, ()) if now - entry[0] < self.ttl]
+        if key in self._pools:
+            self._pools[key] = pool
+            self._pools.move_to_end(key)
+        return pool
+
+    def _similar_pool(self, key, query, now):
+        """Pool of the closest cached input in the same state (caller holds the lock)"""
+        state = key[:-1]
+        candidates = [other for other in self._vectors if other[:-1] == state and other != key]
+        if not candidates:
+            return []
+        scores = np.vstack([self._vectors[other] for other in candidates]) @ query
+        best = int(np.argmax(scores))
+        if scores[best] < self.similarity:
+            return []
+        return self._live_pool(candidates[best], now)
+
+    def _embed(self, text):
+        vector = self.embed(text)
+        if vector is None:
+            return None
+        vector = np.asarray(vector, dtype=np.float32)
+        return vector / (np.linalg.norm(vector) or 1.0)
+
+    @staticmethod
+    def _templatize(reply, data):
+        # Longest first, so an email isn't half-replaced by a username inside it
+        values = sorted(((data.get(field), field) for field in PLACEHOLDERS if data.get(field)),
+                        key=lambda item: -len(item[0]))
+        for value, field in values:
+            reply = re.sub(r'(?<!\w)' + re.escape(value) + r'(?!\w)', '{' + field + '}', reply, flags=re.IGNORECASE)
+        return reply
+
+    @staticmethod
+    def _fill(template, data):
+        for field in PLACEHOLDERS:
+            template = template.replace('{' + field + '}', data.get(field) or '')
+        return template
@@ -0,0 +1,141 @@
+# session_pool.py - One GlowAgent per chat session, with bounded memory
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+from session_store import MemorySessionStore, SessionConflict
+
+
+class _Session:
+    """A live GlowAgent plus the lock that serializes its turns"""
+
+    def __init__(self, agent):
+        self.agent = agent
+        self.lock = threading.Lock()
+        self.last_used = time.monotonic()
+        self.version = 0  # Store version the agent's state matches; None = unknown
+        self.discarded = False
+
+
+class GlowSessionPool:
+    """Session-keyed registry of GlowAgents with LRU and idle-TTL eviction.
+
+    Each session gets its own agent (signup state + conversation memory) and
+    its own lock, so turns for the same session run one at a time while
+    different sessions run in parallel. The pool never holds more than
+    ``max_sessions`` agents; the least recently used one is dropped first.
+
+    The agents are only a cache: the source of truth is ``store`` (see
+    session_store.py), which every turn loads from and saves back to. With a
+    shared store any worker process can serve any turn of a session.
+    """
+
+    def __init__(self, agent_factory, store=None, max_sessions=1000, idle_ttl=1800):
+        self.agent_factory = agent_factory
+        self.store = store if store is not None else MemorySessionStore(ttl=idle_ttl)
+        self.max_sessions = max_sessions
+        self.idle_ttl = idle_ttl
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        with self._lock:
+            return len(self._sessions)
+
+    def __contains__(self, session_id):
+        with self._lock:
+            return session_id in self._sessions
+
+    def _evict_expired(self, now):
+        """Drop sessions idle for longer than idle_ttl (oldest are at the front)"""
+        while self._sessions:
+            session_id, session = next(iter(self._sessions.items()))
+            if now - session.last_used <= self.idle_ttl:
+                break
+            self._sessions.pop(session_id)
+
+    def _lookup(self, session_id, now):
+        session = self._sessions.get(session_id)
+        if session is not None:
+            session.last_used = now
+            self._sessions.move_to_end(session_id)
+        return session
+
+    def _get_or_create(self, session_id):
+        now = time.monotonic()
+        with self._lock:
+            self._evict_expired(now)
+            session = self._lookup(session_id, now)
+            if session is not None:
+                return session
+
+        # Build the agent outside the pool lock so other sessions aren't blocked
+        new_session = _Session(self.agent_factory())
+
+        with self._lock:
+            # Another request for the same session may have won the race
+            session = self._lookup(session_id, now)
+            if session is not None:
+                return session
+
+            while len(self._sessions) >= self.max_sessions:
+                self._sessions.popitem(last=False)
+
+            self._sessions[session_id] = new_session
+            return new_session
+
+    @contextmanager
+    def session(self, session_id):
+        """Hold the session's lock and yield its GlowAgent, loaded with the
+        latest saved state; the state is saved back when the block exits.
+
+        If another worker saved the session in the meantime, the save raises
+        SessionConflict and this turn's changes are dropped (the next turn
+        reloads). An evicted session only loses its slot in the pool; a
+        request that is still holding the agent finishes normally.
+
+        GeneratorExit (the caller is a generator that was closed, e.g. a
+        streaming client hung up) still saves: by then the turn has finished.
+        Any other exception drops the turn.
+        """
+        session = self._get_or_create(session_id)
+        with session.lock:
+            version, state = self.store.load(session_id)
+            if version != session.version:
+                # Saved by another worker since we last served it (or we lost track)
+                session.agent = self.agent_factory()
+                if state is not None:
+                    session.agent.load_state(state)
+                session.version = version
+
+            try:
+                yield session.agent
+            except GeneratorExit:
+                try:
+                    self._save(session, session_id, version)
+                except SessionConflict:
+                    pass  # Nobody is left to tell; the next turn reloads
+                raise
+            except BaseException:
+                session.version = None  # Half-finished turn - reload next time
+                raise
+            self._save(session, session_id, version)
+
+    def _save(self, session, session_id, version):
+        session.last_used = time.monotonic()
+        if session.discarded:
+            return
+        try:
+            session.version = self.store.save(session_id, session.agent.dump_state(), version)
+        except SessionConflict:
+            session.version = None
+            raise
+
+    def discard(self, session_id):
+        """Forget a session (e.g. once signup is complete)"""
+        with self._lock:
+            session = self._sessions.pop(session_id, None)
+        if session is not None:
+            session.discarded = True
+        self.store.delete(session_id)
@@ -0,0 +1,158 @@
+# session_store.py - Chat session state that outlives one worker process
+import json
+import os
+import threading
+import time
+import zlib
+
+from sqlite_pool import SQLitePool
+
+COMPRESS_ABOVE = 512  # bytes of JSON; smaller states aren't worth a zlib call
+
+
+class SessionConflict(Exception):
+    """Another request saved the session after this one loaded it"""
+
+
+def encode_state(state):
+    """Compact bytes for a JSON-able state: a 1-byte tag, then JSON
+    (zlib-compressed once it's big enough to benefit)"""
+    raw = json.dumps(state, separators=(',', ':'), ensure_ascii=False).encode('utf-8')
+    if len(raw) > COMPRESS_ABOVE:
+        return b'z' + zlib.compress(raw, 1)
+    return b'j' + raw
+
+
+def decode_state(blob):
+    tag, body = blob[:1], blob[1:]
+    if tag == b'z':
+        body = zlib.decompress(body)
+    return json.loads(body)
+
+
+class MemorySessionStore:
+    """Sessions in this process only - fine for one worker or local development"""
+
+    def __init__(self, ttl=1800, purge_every=500):
+        self.ttl = ttl
+        self.purge_every = purge_every
+        self._sessions = {}  # id -> (version, blob, expires_at)
+        self._saves = 0
+        self._lock = threading.Lock()
+
+    def load(self, session_id):
+        """(version, state); (0, None) for a new or expired session"""
+        with self._lock:
+            entry = self._sessions.get(session_id)
+        if entry is None or entry[2] < time.time():
+            return 0, None
+        return entry[0], decode_state(entry[1])
+
+    def save(self, session_id, state, expected_version):
+        """Store state if nobody saved since expected_version; returns the new version"""
+        blob = encode_state(state)
+        now = time.time()
+        with self._lock:
+            entry = self._sessions.get(session_id)
+            current = entry[0] if entry is not None and entry[2] >= now else 0
+            if current != expected_version:
+                raise SessionConflict(session_id)
+            self._sessions[session_id] = (current + 1, blob, now + self.ttl)
+            self._saves += 1
+        if self._saves % self.purge_every == 0:
+            self.purge_expired()
+        return current + 1
+
+    def delete(self, session_id):
+        with self._lock:
+            self._sessions.pop(session_id, None)
+
+    def purge_expired(self):
+        now = time.time()
+        with self._lock:
+            expired = [session_id for session_id, entry in self._sessions.items() if entry[2] < now]
+            for session_id in expired:
+                del self._sessions[session_id]
+        return len(expired)
+
+
+class SQLiteSessionStore:
+    """Sessions in a SQLite file shared by every worker on the machine.
+
+    Saves are compare-and-swap on a version column, so two workers handling
+    the same session at once can't silently overwrite each other - the later
+    save raises SessionConflict. Expired rows are purged every
+    `purge_every` saves.
+    """
+
+    def __init__(self, db_path, ttl=1800, purge_every=500):
+        self.ttl = ttl
+        self.purge_every = purge_every
+        self.db = SQLitePool(db_path, name="sessions")
+        self._saves = 0
+        with self.db.transaction() as conn:
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS glow_sessions (
+                    id TEXT PRIMARY KEY,
+                    version INTEGER NOT NULL,
+                    state BLOB NOT NULL,    -- encode_state()
+                    expires_at REAL NOT NULL
+                )
+            ''')
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_glow_sessions_expires ON glow_sessions(expires_at)')
+
+    def load(self, session_id):
+        with self.db.connection() as conn:
+            row = conn.execute(
+                'SELECT version, state FROM glow_sessions WHERE id = ? AND expires_at >= ?',
+                (session_id, time.time())
+            ).fetchone()
+        if row is None:
+            return 0, None
+        return row[0], decode_state(row[1])
+
+    def save(self, session_id, state, expected_version):
+        blob = encode_state(state)
+        now = time.time()
+        with self.db.transaction() as conn:
+            if expected_version:
+                updated = conn.execute(
+                    'UPDATE glow_sessions SET version = version + 1, state = ?, expires_at = ? '
+                    'WHERE id = ? AND version = ? AND expires_at >= ?',
+                    (blob, now + self.ttl, session_id, expected_version, now)
+                ).rowcount
+            else:
+                # New session, or replacing an expired one
+                updated = conn.execute(
+                    'INSERT INTO glow_sessions (id, version, state, expires_at) VALUES (?, 1, ?, ?) '
+                    'ON CONFLICT(id) DO UPDATE SET version = 1, state = excluded.state, '
+                    'expires_at = excluded.expires_at WHERE glow_sessions.expires_at < ?',
+                    (session_id, blob, now + self.ttl, now)
+                ).rowcount
+            if not updated:
+                raise SessionConflict(session_id)
+
+        self._saves += 1
+        if self._saves % self.purge_every == 0:
+            self.purge_expired()
+        return expected_version + 1
+
+    def delete(self, session_id):
+        with self.db.transaction() as conn:
+            conn.execute('DELETE FROM glow_sessions WHERE id = ?', (session_id,))
+
+    def purge_expired(self):
+        with self.db.transaction() as conn:
+            return conn.execute('DELETE FROM glow_sessions WHERE expires_at < ?', (time.time(),)).rowcount
+
+
+def make_session_store(ttl=1800):
+    """Store picked by GLOW_SESSION_STORE: "memory" (default) or "sqlite"
+    (file at GLOW_SESSION_DB). Use sqlite whenever more than one worker
+    process serves /chat."""
+    kind = os.getenv("GLOW_SESSION_STORE", "memory")
+    if kind == "sqlite":
+        return SQLiteSessionStore(os.getenv("GLOW_SESSION_DB", "glow_sessions.db"), ttl=ttl)
+    if kind == "memory":
+        return MemorySessionStore(ttl=ttl)
+    raise ValueError(f"Unknown GLOW_SESSION_STORE {kind!r}, expected 'memory' or 'sqlite'")
@@ -1,29 +1,37 @@
 # tools.py - Glow's toolkit
-import hashlib
-import random
+import contextvars
 import re
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
-from database import SessionLocal, User, VerificationCode
+from availability_index import get_availability_index, normalize
+from database import SessionLocal, User
 from langchain.tools import tool
-import smtplib
-import ssl
 from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
 import os
 from dotenv import load_dotenv
+from email_queue import get_dispatcher
+from passwords import get_password_service
+from glow_logging import get_logger
+from verification_codes import get_code_store
+
+log = get_logger(__name__)
+
+# signup_state of the chat turn being handled (set by GlowAgent.chat), for
+# what tools must read server-side rather than through the model
+current_signup = contextvars.ContextVar("current_signup", default=None)
 
 @tool
 def check_username_available(username: str) -> str:
     """Check if a username is available"""
-    db = SessionLocal()
-    try:
-        existing_user = db.query(User).filter(User.username == username).first()
-        if existing_user:
-            return "taken"
-        else:
-            return "available"
-    finally:
-        db.close()
+    # Case-insensitive, and usually answered from memory (see availability_index.py)
+    if get_availability_index().username_taken(username):
+        return "taken"
+    else:
+        return "available"
+
+def email_registered(email: str) -> bool:
+    """Whether an account already uses this email (case-insensitive)"""
+    return get_availability_index().email_taken(email)
 
 @tool 
 def validate_email_format(email: str) -> str:
@@ -51,34 +59,20 @@ def generate_and_send_verification_code(email: str) -> str:
     # Clean the email parameter to remove any problematic characters
     email = email.replace('\xa0', '').replace('\u00a0', '').strip()
     
-    # Step 1: Generate the secret code
-    code = str(random.randint(100000, 999999))
+    # Step 1 + 2: Generate the secret code and store it (hashed, replacing older codes)
+    code = get_code_store().issue(email)
     
-    # Step 2: Store code in database (same as before)
-    db = SessionLocal()
-    try:
-        # Remove old codes for this email
-        db.query(VerificationCode).filter(VerificationCode.email == email).delete()
-        
-        # Add new code
-        new_code = VerificationCode(email=email, code=code)
-        db.add(new_code)
-        db.commit()
-        
-        # Step 3: NOW SEND THE REAL EMAIL! 
-        success = send_verification_email(email, code)
-        
-        if success:
-            print(f"✅ Real email sent to {email}")
-            return "sent"
-        else:
-            print(f"❌ Failed to send email to {email}")
-            return "failed"
-            
-    finally:
-        db.close()
+    # Step 3: Hand the email to the background sender - SMTP happens off this request
+    if queue_verification_email(email, code):
+        log.info("verification_code_queued", email_domain=email.rpartition('@')[2])
+        return "sent"
+    else:
+        log.warning("verification_code_failed", email_domain=email.rpartition('@')[2])
+        return "failed"
 
-def send_verification_email(to_email: str, code: str) -> bool:
+def queue_verification_email(to_email: str, code: str) -> bool:
+    """Queue the code email; False if it can't be sent at all. Whether it
+    actually went out shows up later in verification_email_status()."""
     try:
         load_dotenv()
         
@@ -93,7 +87,7 @@ def send_verification_email(to_email: str, code: str) -> bool:
             sender_password = sender_password.replace('\xa0', '').replace('\u00a0', '').strip()
         
         if not sender_email or not sender_password:
-            print("Missing email credentials!")
+            log.error("missing_email_credentials")
             return False
         
         # Create a simple MIME text message with explicit UTF-8 encoding
@@ -109,68 +103,87 @@ def send_verification_email(to_email: str, code: str) -> bool:
         msg['To'] = to_email
         msg['Subject'] = "your glow code is here bestie"
         
-        # Send email
-        context = ssl.create_default_context()
-        context.check_hostname = False
-        context.verify_mode = ssl.CERT_NONE
-        
-        with smtplib.SMTP("smtp.gmail.com", 587) as server:
-            server.starttls(context=context)
-            server.login(sender_email, sender_password)
-            # Get the message as bytes with explicit UTF-8 encoding
-            message_bytes = msg.as_bytes()
-            server.sendmail(sender_email, to_email, message_bytes)
-        
-        print("Email sent successfully!")
+        # The final status goes on the code's row, so every worker can see it
+        get_dispatcher().submit(to_email, msg,
+                                on_done=lambda status: get_code_store().record_delivery(to_email, code, status))
         return True
         
     except Exception as e:
-        print(f"Email error: {e}")
+        log.error("email_error", error=str(e))
         return False
 
+def verification_email_status(email: str):
+    """Delivery status of the latest code email to this address: "queued",
+    "sending", "retrying", "sent" or "failed" (None if it has no code).
+    Final statuses come from the verification_codes row, whichever worker
+    sent it; the in-between ones only from the worker that is sending."""
+    email = email.replace('\xa0', '').strip()
+    stored = get_code_store().delivery_status(email)
+    if stored in ("sent", "failed"):
+        return stored
+    return get_dispatcher().status_for(email) or stored
+
 
 @tool
 def verify_code(email: str, entered_code: str) -> str:
     """Check if the verification code is correct"""
-    db = SessionLocal()
-    try:
-        code_record = db.query(VerificationCode).filter(
-            VerificationCode.email == email,
-            VerificationCode.code == entered_code,
-            VerificationCode.used == False
-        ).first()
-        
-        if code_record:
-            # Mark as used
-            code_record.used = True
-            db.commit()
-            return "correct"
-        else:
-            return "incorrect"
-    finally:
-        db.close()
+    # Marks it used if so - and expired codes are incorrect
+    if get_code_store().verify(email, entered_code):
+        return "correct"
+    else:
+        return "incorrect"
 
 @tool
-def save_user_to_database(name: str, username: str, password: str, email: str) -> str:
-    """Save the completed user signup to database"""
+def save_user_to_database(name: str, username: str, email: str) -> str:
+    """Save the completed user signup to database (the password they gave is already on file)"""
+    # The password comes from this session's signup state, never from the model -
+    # the chat hashed it (like putting it in a secret code) as soon as it was typed
+    signup = current_signup.get()
+    password_hash = signup["data"].get("password_hash") if signup else None
+    if not password_hash:
+        log.warning("user_save_without_password")
+        return "missing_password"
     db = SessionLocal()
     try:
-        # Hash the password (like putting it in a secret code)
-        password_hash = hashlib.sha256(password.encode()).hexdigest()
-        
         new_user = User(
             name=name,
             username=username, 
             password_hash=password_hash,
             email=email,
+            username_key=normalize(username),
+            email_key=normalize(email),
             verified=True
         )
         db.add(new_user)
-        db.commit()
+        try:
+            db.commit()
+        except IntegrityError:
+            # Someone else got the username or email since it was checked
+            db.rollback()
+            log.warning("user_save_conflict")
+            return "already_taken"
+        get_availability_index().add_user(username, email)
         return "saved_successfully"
     finally:
         db.close()
 
+def check_user_password(username: str, password: str) -> bool:
+    """Whether password is this user's. Hashes from an older algorithm or
+    cost (including the original unsalted sha256) are replaced on success."""
+    db = SessionLocal()
+    try:
+        user = db.query(User).filter(User.username == username).first()
+        if user is None or not user.password_hash:
+            return False
+        matches, upgraded = get_password_service().verify(password, user.password_hash)
+        if upgraded:
+            user.password_hash = upgraded
+            db.commit()
+            log.info("password_hash_upgraded")
+        return matches
+    finally:
+        db.close()
+
 # List of all Glow's tools
 glow_tools = [
     check_username_available,
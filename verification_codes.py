@@ -0,0 +1,198 @@
+# verification_codes.py - Issue and check email verification codes
+import hashlib
+import hmac
+import os
+import secrets
+import threading
+import time
+from datetime import datetime, timedelta
+
+from database import SessionLocal, VerificationCode
+from glow_logging import get_logger
+
+log = get_logger(__name__)
+
+
+def _clean_email(email):
+    return email.replace('\xa0', '').strip()
+
+
+class VerificationCodeStore:
+    """6-digit codes in the verification_codes table.
+
+    Only an HMAC of (email, code) is stored - with six digits a plain hash
+    would be reversed in a second, so the key (GLOW_CODE_SECRET) has to
+    stay out of the DB. Without a key each process makes up its own, which
+    only works with a single worker: a code issued by one worker (or before
+    a restart) is wrong everywhere else. Codes expire after `ttl` seconds
+    and are single-use. Both lookups go through the (email, code_hash) index, and every
+    `purge_interval` seconds a background purge deletes expired and used
+    rows in batches of `purge_batch`, so the table stays about as big as
+    the last `ttl` of signups.
+
+    With `cache`, codes issued by this process are also kept in memory
+    until they expire, and a wrong code for one of them is turned away
+    without a query. Only for single-process deployments: a code issued by
+    another worker would make the cached one look wrong.
+    """
+
+    def __init__(self, secret=None, ttl=600, purge_interval=300, purge_batch=1000, cache=False):
+        if not secret:
+            # Random, never a built-in default - anyone could forge codes with that
+            log.warning("code_secret_missing", hint="set GLOW_CODE_SECRET; codes only verify in this process")
+            secret = secrets.token_hex(32)
+        self.secret = secret.encode('utf-8')
+        self.ttl = ttl
+        self.purge_interval = purge_interval
+        self.purge_batch = purge_batch
+        self.cache = cache
+        self._hot = {}  # email -> (code hash, expires at), codes this process issued
+        self._purged_at = time.monotonic()
+        self._purging = threading.Lock()
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            secret=os.getenv("GLOW_CODE_SECRET"),
+            ttl=int(os.getenv("GLOW_CODE_TTL", 600)),
+            cache=os.getenv("GLOW_CODE_CACHE", "0").lower() in ("1", "true", "yes", "on")
+        )
+
+    def hash_code(self, email, code):
+        message = f"{email.casefold()}:{code}".encode('utf-8')
+        return hmac.new(self.secret, message, hashlib.sha256).hexdigest()
+
+    def issue(self, email):
+        """New code for email, replacing any earlier one; returns the code"""
+        email = _clean_email(email)
+        code = f"{secrets.randbelow(900000) + 100000}"
+        code_hash = self.hash_code(email, code)
+        now = datetime.utcnow()
+        expires_at = now + timedelta(seconds=self.ttl)
+
+        db = SessionLocal()
+        try:
+            db.query(VerificationCode).filter(VerificationCode.email == email).delete(synchronize_session=False)
+            db.add(VerificationCode(email=email, code_hash=code_hash, created_at=now, expires_at=expires_at))
+            db.commit()
+        finally:
+            db.close()
+
+        if self.cache:
+            self._hot[email] = (code_hash, time.time() + self.ttl)
+        self._maybe_purge()
+        return code
+
+    def verify(self, email, code):
+        """True (and the code is used up) if code is email's live code"""
+        email = _clean_email(email)
+        code_hash = self.hash_code(email, code.strip())
+
+        hot = self._hot.get(email) if self.cache else None
+        if hot is not None and (hot[1] < time.time() or not hmac.compare_digest(hot[0], code_hash)):
+            return False
+
+        now = datetime.utcnow()
+        db = SessionLocal()
+        try:
+            # One conditional UPDATE: checks and uses up the code atomically
+            matched = db.query(VerificationCode).filter(
+                VerificationCode.email == email,
+                VerificationCode.code_hash == code_hash,
+                VerificationCode.used == False,
+                VerificationCode.expires_at > now
+            ).update({"used": True, "expires_at": now}, synchronize_session=False)
+            db.commit()
+        finally:
+            db.close()
+
+        if matched:
+            self._hot.pop(email, None)
+        return bool(matched)
+
+    def record_delivery(self, email, code, status):
+        """Note how sending this code's email ended ("sent" or "failed"), for
+        whichever worker handles the user's next turn. A newer code for the
+        same address is left alone."""
+        email = _clean_email(email)
+        db = SessionLocal()
+        try:
+            db.query(VerificationCode).filter(
+                VerificationCode.email == email,
+                VerificationCode.code_hash == self.hash_code(email, code)
+            ).update({"email_status": status}, synchronize_session=False)
+            db.commit()
+        finally:
+            db.close()
+
+    def delivery_status(self, email):
+        """"sent" or "failed" once the latest code's email is done, "queued"
+        until then, None if email has no code"""
+        db = SessionLocal()
+        try:
+            row = db.query(VerificationCode.email_status).filter(
+                VerificationCode.email == _clean_email(email)
+            ).order_by(VerificationCode.id.desc()).first()
+        finally:
+            db.close()
+        if row is None:
+            return None
+        return row[0] or "queued"
+
+    def purge(self):
+        """Delete expired and used codes in batches; returns how many"""
+        now = datetime.utcnow()
+        deleted = 0
+        db = SessionLocal()
+        try:
+            # Rows from before codes expired: treat them as expired at creation
+            db.query(VerificationCode).filter(VerificationCode.expires_at == None).update(
+                {"expires_at": VerificationCode.created_at}, synchronize_session=False)
+            db.commit()
+            while True:
+                ids = [row_id for row_id, in db.query(VerificationCode.id).filter(
+                    VerificationCode.expires_at < now).limit(self.purge_batch)]
+                if not ids:
+                    break
+                db.query(VerificationCode).filter(VerificationCode.id.in_(ids)).delete(synchronize_session=False)
+                db.commit()  # Short transactions, so signups aren't blocked behind the purge
+                deleted += len(ids)
+        finally:
+            db.close()
+
+        expired = [email for email, (_, expires_at) in list(self._hot.items()) if expires_at < time.time()]
+        for email in expired:
+            self._hot.pop(email, None)
+        if deleted:
+            log.info("verification_codes_purged", rows=deleted)
+        return deleted
+
+    def _maybe_purge(self):
+        """Start a background purge if one is due and none is running"""
+        if time.monotonic() - self._purged_at < self.purge_interval:
+            return
+        if not self._purging.acquire(blocking=False):
+            return
+        self._purged_at = time.monotonic()
+
+        def run():
+            try:
+                self.purge()
+            except Exception:
+                log.exception("verification_code_purge_failed")
+            finally:
+                self._purging.release()
+
+        threading.Thread(target=run, name="code-purge", daemon=True).start()
+
+
+_store = None
+_store_lock = threading.Lock()
+
+def get_code_store():
+    """Process-wide VerificationCodeStore"""
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = VerificationCodeStore.from_env()
+        return _store
@@ -0,0 +1,79 @@
+# write_behind.py - Batch inserts off the request path
+import atexit
+import queue
+import threading
+
+from glow_logging import get_logger
+
+log = get_logger(__name__)
+
+
+class WriteBehindQueue:
+    """Queue rows for one INSERT statement and group-commit them from a
+    background thread.
+
+    Callers return as soon as the row is queued. The writer takes whatever has
+    piled up (up to batch_size rows) and commits it in a single transaction,
+    so a burst of requests costs one fsync instead of one each. Pending rows
+    are flushed on close(), which also runs at interpreter shutdown.
+    """
+
+    _STOP = object()
+
+    def __init__(self, db, sql, batch_size=500, flush_interval=0.5, max_pending=10000):
+        self.db = db  # SQLitePool
+        self.sql = sql
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        # Bounded so a stuck disk turns into back-pressure, not unbounded memory
+        self._queue = queue.Queue(maxsize=max_pending)
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name="write-behind", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def put(self, row):
+        if self._closed:
+            raise RuntimeError("WriteBehindQueue is closed")
+        self._queue.put(row)
+
+    def flush(self):
+        """Block until every row queued so far has been committed"""
+        self._queue.join()
+
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(self._STOP)
+        self._thread.join()
+
+    def _take_batch(self):
+        """Wait for a first row, then grab whatever else is already queued"""
+        batch = []
+        try:
+            batch.append(self._queue.get(timeout=self.flush_interval))
+            while len(batch) < self.batch_size:
+                batch.append(self._queue.get_nowait())
+        except queue.Empty:
+            pass
+        return batch
+
+    def _run(self):
+        stopping = False
+        while not stopping:
+            batch = self._take_batch()
+            rows = [row for row in batch if row is not self._STOP]
+            stopping = len(rows) != len(batch)
+            try:
+                if rows:
+                    with self.db.transaction() as conn:
+                        conn.executemany(self.sql, rows)
+            except Exception as e:
+                # Anything - a DB error or a row that won't bind - costs this
+                # batch only: the thread must live on, or put() blocks once
+                # the queue fills and flush()/close() never return
+                log.error("write_behind_error", dropped=len(rows), error_type=type(e).__name__, error=str(e))
+            finally:
+                for _ in batch:
+                    self._queue.task_done()